@@ -0,0 +1,241 @@
+"""体力(AP)识别、苹果使用规划与等待自然回复的调度"""
+import datetime
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from Vision import Roi
+
+logger = logging.getLogger("FGOBattle")
+
+APPLE_TYPES = ("gold", "silver", "bronze", "quartz")
+# 每回复 1 点体力所需时间(秒)
+AP_REGEN_SECONDS = 300
+# 青铜果实固定回复 10 点体力
+BRONZE_APPLE_AP = 10
+
+
+@dataclass
+class ApStatus:
+    """体力回复界面中读取到的状态"""
+    current: int
+    maximum: int
+    apples: Dict[str, int] = field(default_factory=dict)
+
+    def apple_value(self, apple_type: str) -> int:
+        """一个苹果能回复的体力"""
+        if apple_type in ("gold", "quartz"):
+            return self.maximum
+        if apple_type == "silver":
+            return self.maximum // 2
+        if apple_type == "bronze":
+            return BRONZE_APPLE_AP
+        return 0
+
+
+@dataclass
+class RecoveryDialogLayout:
+    """体力回复界面的识别区域与点击位置(基准分辨率 1280x720)"""
+    ap_roi: Roi = (520, 560, 240, 40)
+    count_rois: Dict[str, Roi] = field(default_factory=lambda: {
+        "gold": (560, 280, 200, 40),
+        "silver": (560, 380, 200, 40),
+        "bronze": (560, 480, 200, 40),
+        "quartz": (560, 580, 200, 40),
+    })
+    apple_positions: Dict[str, Tuple[int, int]] = field(default_factory=lambda: {
+        "gold": (375, 300),
+        "silver": (375, 400),
+        "bronze": (375, 500),
+        "quartz": (375, 600),
+    })
+    confirm_position: Tuple[int, int] = (550, 350)
+
+
+@dataclass
+class RecoveryDecision:
+    """一次体力不足时的处理决定"""
+    action: str                      # "none" | "apple" | "wait"
+    apple_type: Optional[str] = None
+    wait_seconds: int = 0
+    runs_possible: int = 0
+    reason: str = ""
+
+
+class ApPlanner:
+    """根据体力与苹果库存决定吃苹果、等待自然回复还是退出
+
+    apple_order -- 苹果使用顺序
+    limits -- 每种苹果的使用上限，0 或缺省表示不限
+    total_limit -- 所有苹果合计的使用上限，0 表示不限
+    max_wait_seconds -- 等待自然回复的时间不超过该值时，优先等待而不吃苹果
+    """
+
+    def __init__(
+        self,
+        quest_ap: int,
+        apple_order: List[str],
+        limits: Optional[Dict[str, int]] = None,
+        total_limit: int = 0,
+        max_wait_seconds: int = 0,
+        auto_apple: bool = True,
+    ):
+        self.quest_ap = max(1, quest_ap)
+        self.apple_order = [a for a in apple_order if a in APPLE_TYPES]
+        self.limits = limits or {}
+        self.total_limit = total_limit
+        self.max_wait_seconds = max_wait_seconds
+        self.auto_apple = auto_apple
+
+    def usable_apples(self, status: ApStatus, used: Dict[str, int]) -> Dict[str, int]:
+        """在库存与上限约束下，每种苹果最多还能吃多少个"""
+        usable = {}
+        total_left = None if self.total_limit <= 0 else max(0, self.total_limit - sum(used.values()))
+        for apple_type in self.apple_order:
+            count = status.apples.get(apple_type, 0)
+            limit = self.limits.get(apple_type, 0)
+            if limit > 0:
+                count = min(count, max(0, limit - used.get(apple_type, 0)))
+            if total_left is not None:
+                count = min(count, total_left)
+                total_left -= count
+            usable[apple_type] = count
+        return usable
+
+    def runs_possible(self, status: ApStatus, used: Dict[str, int]) -> int:
+        """当前体力加上可用苹果还能出击的次数(不计等待期间的自然回复)"""
+        ap = status.current
+        if self.auto_apple:
+            for apple_type, count in self.usable_apples(status, used).items():
+                ap += count * status.apple_value(apple_type)
+        return ap // self.quest_ap
+
+    def seconds_until_enough(self, status: ApStatus) -> int:
+        """自然回复到足够出击一次所需的时间"""
+        deficit = self.quest_ap - status.current
+        return max(0, deficit) * AP_REGEN_SECONDS
+
+    def decide(self, status: ApStatus, used: Dict[str, int]) -> RecoveryDecision:
+        runs = self.runs_possible(status, used)
+        wait_seconds = self.seconds_until_enough(status)
+
+        if status.current >= self.quest_ap:
+            return RecoveryDecision("none", runs_possible=runs, reason="体力充足，无需回复")
+
+        # 等待时间足够短时，等自然回复比消耗苹果划算
+        if wait_seconds <= self.max_wait_seconds:
+            return RecoveryDecision("wait", wait_seconds=wait_seconds, runs_possible=runs,
+                                    reason=f"{math.ceil(wait_seconds / 60)} 分钟后体力即可回复")
+
+        if self.auto_apple:
+            for apple_type, count in self.usable_apples(status, used).items():
+                if count > 0 and status.apple_value(apple_type) > 0:
+                    return RecoveryDecision("apple", apple_type=apple_type, runs_possible=runs)
+
+        reason = "自动吃苹果未开启" if not self.auto_apple else "可用苹果不足或已达使用上限"
+        return RecoveryDecision("wait", wait_seconds=wait_seconds, runs_possible=runs, reason=reason)
+
+
+class SessionScheduler:
+    """记录下一次应当启动的时间，避免反复轮询体力界面
+
+    任务入口按 [Battle] schedule_mode 读取该文件，未到时间时等待或跳过本次出击；
+    外部调度器也可以读取 next_session_at 决定何时启动任务。
+    """
+
+    def __init__(self, path="fgo_schedule.json"):
+        self.path = Path(path)
+
+    def schedule(self, wait_seconds: int, reason: str = "") -> datetime.datetime:
+        next_time = datetime.datetime.now() + datetime.timedelta(seconds=wait_seconds)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({
+                "next_session_at": next_time.isoformat(timespec="seconds"),
+                "reason": reason,
+            }, f, ensure_ascii=False, indent=4)
+        logger.info(f"下一次出击时间: {next_time:%Y-%m-%d %H:%M:%S} ({reason})")
+        return next_time
+
+    def next_session_at(self) -> Optional[datetime.datetime]:
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return datetime.datetime.fromisoformat(json.load(f)["next_session_at"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取调度文件失败: {e}")
+            return None
+
+    def seconds_remaining(self) -> float:
+        """距下一次出击时间的秒数，没有记录或已到时间时为 0"""
+        next_time = self.next_session_at()
+        if next_time is None:
+            return 0.0
+        return max(0.0, (next_time - datetime.datetime.now()).total_seconds())
+
+    def wait(self, should_stop: Callable[[], bool], poll: float = 1.0) -> bool:
+        """等待到下一次出击时间，should_stop 返回 True 时提前结束，返回是否等到了出击时间"""
+        remaining = self.seconds_remaining()
+        while remaining > 0:
+            if should_stop():
+                return False
+            time.sleep(min(poll, remaining))
+            remaining = self.seconds_remaining()
+        return True
+
+
+class ApRecovery:
+    """体力回复界面：一次截图读取体力与苹果库存，并按规划执行"""
+
+    def __init__(self, context, ocr, planner: ApPlanner, layout: Optional[RecoveryDialogLayout] = None):
+        self.context = context
+        self.ocr = ocr
+        self.planner = planner
+        self.layout = layout or RecoveryDialogLayout()
+
+    @classmethod
+    def from_config(cls, context, ocr, config) -> "ApRecovery":
+        apple_type = config.get('Battle', 'apple_type', fallback='gold')
+        apple_order = [a.strip() for a in config.get('Battle', 'apple_order', fallback=apple_type).split(',') if a.strip()]
+        limits = {a: config.getint('Battle', f'apple_limit_{a}', fallback=0) for a in APPLE_TYPES}
+        planner = ApPlanner(
+            quest_ap=config.getint('Battle', 'quest_ap', fallback=40),
+            apple_order=apple_order,
+            limits=limits,
+            total_limit=config.getint('Battle', 'apple_limit', fallback=0),
+            max_wait_seconds=int(config.getfloat('Battle', 'regen_wait_max_minutes', fallback=0) * 60),
+            auto_apple=config.getboolean('Battle', 'auto_apple', fallback=False),
+        )
+        return cls(context, ocr, planner)
+
+    def read_status(self, image: np.ndarray) -> Optional[ApStatus]:
+        """从同一张截图中读取当前/最大体力和各类苹果数量"""
+        # 体力与各类苹果数量一次识别
+        apple_types = list(self.layout.count_rois)
+        rois = [self.layout.ap_roi] + [self.layout.count_rois[apple_type] for apple_type in apple_types]
+        numbers = self.ocr.read_numbers_batch(image, rois)
+        if len(numbers[0]) < 2:
+            logger.warning("无法识别当前体力")
+            return None
+        fraction = numbers[0][0], numbers[0][1]
+
+        apples = {}
+        for apple_type, counts in zip(apple_types, numbers[1:]):
+            apples[apple_type] = counts[0] if counts else 0
+        status = ApStatus(current=fraction[0], maximum=fraction[1], apples=apples)
+        logger.info(f"当前体力 {status.current}/{status.maximum}，苹果库存 {apples}")
+        return status
+
+    def use_apple(self, apple_type: str):
+        """点击苹果并确认"""
+        controller = self.context.tasker.controller
+        x, y = self.layout.apple_positions[apple_type]
+        controller.post_click(x, y).wait()
+        x, y = self.layout.confirm_position
+        controller.post_click(x, y).wait()
@@ -1,29 +1,33 @@
 from maa.agent.agent_server import AgentServer
 from maa.custom_action import CustomAction
 from maa.context import Context
-from BattleData import BattleData
+from RetryPolicy import OPERATION_FAILED, FatalError, RetryExhausted, is_transient, load_policy
 import json
 import os
 import time
 import logging
 import configparser
 import datetime
-import numpy as np
+import functools
 from typing import Dict, List, Optional, Any, Tuple
 
-# 配置日志
+# 各个功能模块(以及它们依赖的 cv2、sqlite3)在用到的方法中才导入，导入 Battle 只注册自定义操作；
+# 连接建立后由 warmup() 在后台预先导入
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 配置日志，日志文件由 setup_log_file() 在 agent 启动时打开，导入时不创建文件
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("fgo_battle.log"),
-        logging.StreamHandler()
-    ]
+    format=LOG_FORMAT,
+    handlers=[logging.StreamHandler()]
 )
 logger = logging.getLogger("FGOBattle")
 
 # 全局变量
 SERVANT_INFO = None
+BATTLE_PLAN = None  # 编译后的作业，包含每回合的站位
+PLAN_TURN = 0  # 作业中下一个要执行的回合(跨波次累计)
 CURRENT_TURN = 0
 CURRENT_WAVE = 1
 MAX_WAVES = 3  # 默认3波敌人
@@ -32,6 +36,25 @@ BATTLE_LOGGER = None
 
 class FGOBattleConfig:
     """FGO战斗配置管理类"""
+    _shared = {}
+    
+    @classmethod
+    def shared(cls, config_file="fgo_config.ini"):
+        """各个自定义操作共用的配置
+
+        按当前工作目录下的绝对路径与修改时间缓存：文件未修改时不重复读取，修改后或工作目录改变后
+        (zygote 的子进程切换到 main.py 的工作目录)返回重新读取的配置。
+        """
+        path = os.path.abspath(config_file)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        cached = cls._shared.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = cls._shared[path] = (mtime, cls(path))
+        return cached[1]
+    
     def __init__(self, config_file="fgo_config.ini"):
         self.config = configparser.ConfigParser()
         try:
@@ -74,26 +97,106 @@ class FGOBattleConfig:
             'master_skill1_x': '780', 'master_skill2_x': '830', 'master_skill3_x': '880',
             # 技能目标位置
             'skill_target_y': '350',
-            'skill_target1_x': '230', 'skill_target2_x': '430', 'skill_target3_x': '630'
+            'skill_target1_x': '230', 'skill_target2_x': '430', 'skill_target3_x': '630',
+            # 宝具动画跳过
+            'np_skip_x': '1230', 'np_skip_y': '40'
         }
         
         # 时间配置
         self.config['Timing'] = {
             'skill_animation_wait': '1.5',
             'card_selection_wait': '0.3',
-            'np_animation_wait': '10.0',
+            'np_animation_wait': '10.0',  # 未学习过的宝具的默认动画时长
+            'np_card_time': '4.0',  # 普通卡攻击动画与回合切换的固定时长
+            'np_timing_path': 'np_timing.json',
+            'np_timing_alpha': '0.3',
+            'np_poll_interval': '0.25',
+            'np_poll_lead': '1.5',  # 提前多少秒开始轮询截图
+            'np_skip': 'False',  # 出现跳过提示时点击跳过宝具动画
             'wave_transition_wait': '3.0',
             'battle_result_wait': '5.0',
             'dialog_wait': '1.0'
         }
         
+        # 队伍选择
+        self.config['Team'] = {
+            'team_id': '',  # 指定队伍文件(resource/team/<team_id>.json)，留空则按 auto_select 自动选择或使用默认队伍
+            'quest_id': '',  # 自动选择时的关卡 questId
+            'enemy_hash': '',  # 可选，区分同一关卡的不同敌人配置
+            'auto_select': 'False',  # 不会切换游戏内的编队，只有各候选作业使用同一编队时才能开启
+            'history_days': '7',  # 使用最近几天的实测数据
+            'prior_turn_time': '20',  # 无实测数据时每回合的估计用时(秒)
+            'prior_fixed_time': '30',  # 无实测数据时每场的固定开销(秒)
+            'ucb_exploration': '0.5'  # 探索系数，越大越倾向尝试样本少的队伍
+        }
+        
+        # 关卡导航，路线图位于 resource/quest/<route_graph>.json
+        self.config['Quest'] = {
+            'route_graph': 'lostbelt',
+            'route_cache': 'fgo_route.json',
+            'chapter': 'lb1',
+            'node': '0',
+            'difficulty': '0',
+            'step_timeout': '8.0',  # 每一步等待目标画面锚点的超时
+            'blind_navigation': 'False',  # 允许在没有锚点模板的画面间按固定等待导航
+            'fallback_wait': '2.0'  # 开启 blind_navigation 时，没有锚点模板的画面的固定等待
+        }
+        
+        # 出击历史数据库
+        self.config['History'] = {
+            'enabled': 'True',
+            'db_path': 'fgo_history.db',
+            'device': ''  # 留空使用主机名，多设备时建议填写设备序列号
+        }
+        
         # 战斗配置
         self.config['Battle'] = {
             'auto_apple': 'False',
             'apple_type': 'gold',
+            'apple_order': 'gold',  # 苹果使用顺序，逗号分隔，如 bronze,silver,gold
             'max_battles': '0',  # 0表示无限战斗
             'auto_repeat': 'True',
-            'apple_limit': '0'   # 0表示无限苹果
+            'apple_limit': '0',  # 0表示无限苹果
+            'apple_limit_gold': '0',  # 各类苹果的使用上限，0表示不限
+            'apple_limit_silver': '0',
+            'apple_limit_bronze': '0',
+            'apple_limit_quartz': '0',
+            'quest_ap': '40',  # 关卡消耗体力
+            'regen_wait_max_minutes': '0',  # 自然回复所需时间不超过该值时，等待而不吃苹果
+            # 体力不足时记录在 fgo_schedule.json 的下一次出击时间未到时: wait 等到该时间再出击，
+            # skip 跳过本次出击(交给外部调度器按该文件再次启动)，off 不检查
+            'schedule_mode': 'wait',
+            'card_match_threshold': '0.75',  # 自动战斗识别卡面所属从者、克制标记的阈值
+            'read_crit_stars': 'True',  # 作业要求暴击时识别每张卡的暴击率并据此选卡
+            'repeat_timeout': '90',  # 结算到下一场战斗的最长等待(秒)
+            'repeat_overhead_target': '5.0',  # 每场非战斗开销的目标(秒)，报告中统计超出的场次
+            'chain_np_weight': '0.02',  # 出卡评分中 NP 获取的权重
+            'chain_star_weight': '0.05'  # 出卡评分中掉星的权重
+        }
+        
+        # 重试配置，<操作>_attempts / <操作>_deadline / <操作>_base_delay / <操作>_max_delay
+        # 可覆盖 click、skill、attack、turn、dialog 的默认策略
+        self.config['Retry'] = {
+            'skill_deadline': '8.0',
+            'attack_deadline': '10.0',
+            'skill_ready_brightness': '60'
+        }
+        
+        # 文字识别，model 为 resource/model/ocr 下的子目录，留空使用 configure.py 复制的默认模型
+        self.config['OCR'] = {
+            'model': '',
+            'batch': 'True',  # 同一张截图的多个区域拼接后一次识别
+            'cache_size': '512'  # 按区域图像哈希缓存的识别结果数量，0 表示不缓存
+        }
+        
+        # 启动登录流程，按画面状态推进，不使用固定等待
+        self.config['Login'] = {
+            'timeout': '180',  # 启动到主界面的最长等待(秒)
+            'poll_interval': '0.5',
+            'ocr_fallback': 'True',  # 锚点模板缺失或未命中时整屏 OCR 按关键字判断
+            'ocr_interval': '1.0',  # 整屏 OCR 的最小间隔(秒)
+            'click_cooldown': '1.5',  # 同一状态两次点击的最小间隔(秒)
+            'home_text': '召唤,编队'  # 主界面上的文字，逗号分隔，出现任一即视为到达主界面
         }
         
         # 助战配置
@@ -101,8 +204,14 @@ class FGOBattleConfig:
             'enable_support_selection': 'True',
             'servant': '',  # 留空表示不指定
             'craft_essence': '',  # 留空表示不指定
+            'skill': '',  # 技能等级模板名，留空表示不指定
+            'match_mode': 'any',  # any: 按 从者>礼装>技能 任一满足; all: 全部满足
+            'match_threshold': '0.8',
             'auto_refresh': 'True',
-            'max_refresh': '5'
+            'max_refresh': '5',
+            'max_scroll': '5',
+            'refresh_cooldown': '10',  # 刷新冷却(秒)
+            'refresh_max_wait': '3'  # 冷却剩余时间不超过该值时等待冷却后刷新，否则直接选择默认助战
         }
     
     def get(self, section, option, fallback=None):
@@ -125,11 +234,29 @@ class FGOBattleConfig:
 class BattleLogger:
     """战斗记录和统计"""
     
-    def __init__(self, log_file=None):
+    def __init__(self, log_file=None, history=None):
         self.start_time = datetime.datetime.now()
+        self.battle_start_time = self.start_time
         self.battle_count = 0
         self.apple_used = 0
+        self.apples_used = {}  # 按苹果类型统计
         self.drops = {}
+        self.quests = set()  # 本次运行出击过的关卡
+        self.battle_open = False  # 已开始但还没有记录结束的战斗
+        # 出击历史数据库(可选)，每场战斗结束时批量写入；掉率统计也以其中的掉落记录为准
+        self.history = history
+        self.drop_stats = None
+        if history:
+            from DropReader import DropStats
+            self.drop_stats = DropStats(history)
+        self.current_record = None
+        # 按作业统计每场战斗未能按作业打完的概率(暴击、技能成功率、伤害随机数)
+        self.current_team = None
+        self.battle_success_probability = 1.0
+        self.plan_risks = {}
+        # 每场连续出击的非战斗开销(结算到下一场战斗指令界面)
+        self.loop_overheads = []
+        self.overhead_target = None
         
         if log_file:
             self.log_file = log_file
@@ -140,9 +267,15 @@ class BattleLogger:
         with open(self.log_file, 'w') as f:
             f.write(f"=== FGO战斗日志 - 开始于 {self.start_time} ===\n")
     
-    def log_battle_start(self, quest_name):
+    def log_battle_start(self, quest_name, quest_id=None, team_id=None):
         """记录战斗开始"""
         self.battle_count += 1
+        self.battle_start_time = datetime.datetime.now()
+        self.current_team = team_id
+        self.battle_success_probability = 1.0
+        self.battle_open = True
+        if self.history:
+            self.current_record = self.history.begin(team_id, quest_id)
         message = f"[{datetime.datetime.now()}] 开始第 {self.battle_count} 次战斗 - {quest_name}"
         logger.info(message)
         
@@ -152,16 +285,52 @@ class BattleLogger:
     def log_apple_use(self, apple_type):
         """记录苹果使用"""
         self.apple_used += 1
-        message = f"[{datetime.datetime.now()}] 使用了 {apple_type} 苹果 (总计: {self.apple_used})"
+        self.apples_used[apple_type] = self.apples_used.get(apple_type, 0) + 1
+        message = f"[{datetime.datetime.now()}] 使用了 {apple_type} 苹果 (该类型: {self.apples_used[apple_type]}, 总计: {self.apple_used})"
         logger.info(message)
         
         with open(self.log_file, 'a') as f:
             f.write(message + "\n")
+        
+        if self.current_record:
+            self.current_record.add_apple(apple_type)
+        elif self.history:
+            self.history.record_apple(apple_type)
+    
+    def log_turn(self, turn_index, wave, started_at, duration):
+        """记录一个回合的耗时(写入历史数据库)"""
+        if self.current_record:
+            self.current_record.add_turn(turn_index, wave, started_at, duration)
     
-    def log_battle_end(self, turns, drops=None):
-        """记录战斗结束"""
+    def log_turn_risk(self, success_probability):
+        """记录一个回合按作业成功的概率"""
+        self.battle_success_probability *= success_probability
+    
+    def log_wait(self, kind, expected, actual, key=None):
+        """记录一次等待的预期与实际耗时(写入历史数据库)"""
+        if self.current_record:
+            self.current_record.add_wait(kind, expected, actual, key)
+    
+    def log_loop_overhead(self, seconds, target, started):
+        """记录一次连续出击的非战斗开销"""
+        self.overhead_target = target
+        if started:
+            self.loop_overheads.append(seconds)
+        level = logging.WARNING if seconds > target else logging.INFO
+        logger.log(level, f"非战斗开销 {seconds:.1f} 秒 (目标 {target:.1f} 秒)")
+    
+    def log_battle_end(self, turns, drops=None, quest_id=None, success=True):
+        """记录战斗结束，每场战斗只记录一次
+
+        drops 为 None 表示没有识别到掉落界面，此时不计入掉率统计
+        """
+        if not self.battle_open:
+            # 结算流程重试时会再次调用，同一场战斗不能重复计入日志、掉落与历史数据库
+            logger.debug(f"第 {self.battle_count} 次战斗已记录结束，忽略")
+            return
+        self.battle_open = False
         battle_time = datetime.datetime.now()
-        duration = battle_time - self.start_time
+        duration = battle_time - self.battle_start_time
         
         message = f"[{battle_time}] 完成第 {self.battle_count} 次战斗 - 用时: {duration.total_seconds():.1f}秒, 回合数: {turns}"
         logger.info(message)
@@ -175,6 +344,15 @@ class BattleLogger:
                     f.write(f"  - {item}: {count}\n")
                     # 更新总掉落统计
                     self.drops[item] = self.drops.get(item, 0) + count
+        
+        self.plan_risks.setdefault(self.current_team, []).append(1.0 - self.battle_success_probability)
+        
+        if drops is not None and quest_id is not None:
+            self.quests.add(quest_id)
+        
+        if self.current_record:
+            self.history.commit(self.current_record, success, turns, drops)
+            self.current_record = None
     
     def generate_report(self):
         """生成战斗统计报告"""
@@ -186,11 +364,31 @@ class BattleLogger:
         report += f"总用时: {hours:.2f}小时\n"
         report += f"平均每场用时: {(total_time.total_seconds() / max(1, self.battle_count)) / 60:.2f}分钟\n"
         report += f"使用苹果: {self.apple_used}\n"
+        for apple_type, count in self.apples_used.items():
+            report += f"  - {apple_type}: {count}\n"
         
         if self.drops:
             report += "总掉落物品:\n"
             for item, count in self.drops.items():
-                report += f"  - {item}: {count} (平均每场: {count/self.battle_count:.2f})\n"
+                report += f"  - {item}: {count} (平均每场: {count/max(1, self.battle_count):.2f})\n"
+        
+        if self.loop_overheads:
+            overheads = sorted(self.loop_overheads)
+            over = sum(1 for seconds in overheads if seconds > self.overhead_target)
+            report += (f"非战斗开销: 平均 {sum(overheads) / len(overheads):.1f} 秒, "
+                       f"最长 {overheads[-1]:.1f} 秒, 超过目标 {self.overhead_target:.1f} 秒的场次 {over}/{len(overheads)}\n")
+        
+        for team_id, risks in self.plan_risks.items():
+            report += f"作业 {team_id if team_id is not None else '未知'} 平均失败概率: {sum(risks) / len(risks):.1%} ({len(risks)} 场)\n"
+        
+        for quest_id in sorted(self.quests, key=str) if self.drop_stats else []:
+            rates = self.drop_stats.rates(quest_id)
+            if not rates:
+                continue
+            report += f"关卡 {quest_id} 累计掉率 ({rates[0].runs} 场):\n"
+            for rate in rates:
+                report += (f"  - {rate.item}: 每场 {rate.mean:.3f} [{rate.mean_ci[0]:.3f}, {rate.mean_ci[1]:.3f}], "
+                           f"掉落概率 {rate.chance:.1%} [{rate.chance_ci[0]:.1%}, {rate.chance_ci[1]:.1%}]\n")
         
         logger.info(report)
         
@@ -206,10 +404,9 @@ class ImageRecognition:
     @staticmethod
     def capture_screen(context):
         """获取当前屏幕截图"""
-        # 假设context提供了截图接口
-        # 实际实现可能需要根据MAA框架的API调整
+        import numpy as np
         try:
-            return context.controller.capture_screenshot()
+            return context.tasker.controller.post_screencap().wait().get()
         except Exception as e:
             logger.error(f"截图失败: {e}")
             # 返回空图像
@@ -218,6 +415,8 @@ class ImageRecognition:
     @staticmethod
     def find_template(image, template, threshold=0.8):
         """在图像中查找模板"""
+        import cv2
+        import numpy as np
         try:
             result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
             loc = np.where(result >= threshold)
@@ -231,6 +430,7 @@ class ImageRecognition:
     @staticmethod
     def check_battle_end(context):
         """检查战斗是否结束"""
+        import cv2
         try:
             screen = ImageRecognition.capture_screen(context)
             # 加载战斗结束画面的模板
@@ -247,6 +447,7 @@ class ImageRecognition:
     @staticmethod
     def check_wave_transition(context):
         """检查波次是否转换"""
+        import cv2
         try:
             screen = ImageRecognition.capture_screen(context)
             # 加载波次转换画面的模板
@@ -267,24 +468,124 @@ class ImageRecognition:
         pass
 
 
-def safe_execute(func):
-    """安全执行函数的装饰器，处理可能的异常"""
-    def wrapper(*args, **kwargs):
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                retry_count += 1
-                logger.warning(f"执行 {func.__name__} 失败 ({retry_count}/{max_retries}): {e}")
-                time.sleep(1)
-        
-        logger.error(f"执行 {func.__name__} 最终失败，放弃")
-        return False
+def safe_execute(func=None, *, policy="default", guard=None):
+    """安全执行函数的装饰器，按重试策略处理可能的异常
+
+    policy -- 重试策略名称，见 RetryPolicy.DEFAULT_POLICIES，可在配置 [Retry] 节覆盖
+    guard -- 实例方法名，每次重试前以相同参数调用并重新检查画面:
+             返回 True 继续重试，返回 False 表示操作已生效、不再重复执行，
+             抛出 FatalError 表示画面已不适合重试
+    不可重试的错误不会重试。最终失败时返回 OPERATION_FAILED，其布尔值为 False。
+    """
+    def decorator(func):
+        policy_cache = {}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            config = getattr(args[0], 'config', None) if args else None
+            # 同时保存配置对象，配置重新加载后旧对象的 id 不会被复用
+            cached = policy_cache.get(id(config))
+            if cached is None or cached[0] is not config:
+                cached = policy_cache[id(config)] = (config, load_policy(policy, config))
+            retry_policy = cached[1]
+
+            start = time.monotonic()
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if not is_transient(e):
+                        logger.error(f"执行 {func.__name__} 出现不可重试的错误: {e}")
+                        return OPERATION_FAILED
+                    if attempt >= retry_policy.max_attempts:
+                        logger.warning(f"执行 {func.__name__} 失败 ({attempt}/{retry_policy.max_attempts}): {e}")
+                        break
+
+                    delay = retry_policy.backoff(attempt)
+                    elapsed = time.monotonic() - start
+                    if retry_policy.deadline is not None and elapsed + delay > retry_policy.deadline:
+                        logger.warning(f"执行 {func.__name__} 失败且已超出时限 {retry_policy.deadline} 秒: {e}")
+                        break
+
+                    logger.warning(f"执行 {func.__name__} 失败 ({attempt}/{retry_policy.max_attempts}): {e}，{delay:.2f} 秒后重试")
+                    time.sleep(delay)
+
+                if guard:
+                    try:
+                        if not getattr(args[0], guard)(*args[1:], **kwargs):
+                            logger.info(f"画面状态表明 {func.__name__} 已生效，不再重复执行")
+                            return None
+                    except FatalError as e:
+                        logger.error(f"画面状态不适合重试 {func.__name__}: {e}")
+                        return OPERATION_FAILED
+
+            logger.error(f"执行 {func.__name__} 最终失败，放弃")
+            return OPERATION_FAILED
+
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def shared_classifier():
+    """各个自定义操作共用的画面状态识别，锚点模板只加载一次"""
+    from ScreenState import StateClassifier
+    return StateClassifier()
+
+
+def setup_log_file(filename="fgo_battle.log"):
+    """在当前工作目录打开日志文件，替换之前打开的日志文件
+
+    agent 启动时调用；zygote 的子进程切换工作目录后调用，日志写入任务的工作目录。
+    """
+    path = os.path.abspath(filename)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if not isinstance(handler, logging.FileHandler):
+            continue
+        if handler.baseFilename == path:
+            return
+        root.removeHandler(handler)
+        handler.close()
+    handler = logging.FileHandler(path, delay=True)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+
+
+def wait_for_schedule(context, config):
+    """任务开始前检查体力不足时记录的下一次出击时间，返回是否继续出击"""
+    from ApRecovery import SessionScheduler
     
-    return wrapper
+    mode = config.get('Battle', 'schedule_mode', fallback='wait').strip().lower()
+    if mode == 'off':
+        return True
+    scheduler = SessionScheduler()
+    if scheduler.seconds_remaining() <= 0:
+        return True
+    next_time = scheduler.next_session_at()
+    if mode == 'skip':
+        logger.info(f"未到下一次出击时间 {next_time:%Y-%m-%d %H:%M:%S}，跳过本次出击")
+        return False
+    logger.info(f"等待体力自然回复，{next_time:%Y-%m-%d %H:%M:%S} 开始出击")
+    if not scheduler.wait(lambda: context.tasker.stopping):
+        logger.info("任务已停止，取消等待")
+        return False
+    return True
+
+
+def warmup():
+    """预先完成第一次运行才需要的加载，在连接建立后由后台线程调用"""
+    started = time.perf_counter()
+    import BattleData, BattlePlan, PlanValidator  # noqa: F401
+    import ApRecovery, CardChain, DropReader, Login, NpTiming, OcrReader  # noqa: F401
+    import QuestNavigation, RepeatLoop, RunHistory, SupportScanner, TeamRanking  # noqa: F401
+    shared_classifier()
+    logger.debug(f"预加载完成，用时 {time.perf_counter() - started:.3f} 秒")
 
 
 @AgentServer.custom_action("InitBattleJson")
@@ -293,14 +594,25 @@ class InitBattleInfo(CustomAction):
     
     def __init__(self):
         super().__init__()
-        self.config = FGOBattleConfig()
+        self.config = FGOBattleConfig.shared()
     
     def run(
         self,
         context: Context,
         argv: CustomAction.RunArg,
     ) -> bool:
-        json_file_path = "../assets/resource/team/42200.json" # 假设1001.json在与BattleAction.py相同的目录下
+        # 配置文件修改后立即生效
+        self.config = FGOBattleConfig.shared()
+        if not wait_for_schedule(context, self.config):
+            return True
+        # 作业解析依赖 dataclasses_json，导入较慢，启动后由 warmup() 在后台预先导入
+        from BattleData import BattleData
+        from BattlePlan import BattlePlan
+        from PlanValidator import validate_plan
+        from RunHistory import RunHistory
+        
+        history = RunHistory.from_config(self.config)
+        json_file_path = self.select_team_file(history)
         
         # 检查文件是否存在
         if not os.path.exists(json_file_path):
@@ -313,16 +625,28 @@ class InitBattleInfo(CustomAction):
             
             # 解析JSON字符串并存储到实例变量
             self.battle_data = BattleData.from_json(json_data_string)
+            
+            # 作业与队伍不一致时在出击前失败，避免浪费体力
+            if not validate_plan(self.battle_data, MAX_WAVES):
+                logger.error(f"作业 {json_file_path} 检查未通过，停止出击")
+                self.battle_data = None
+                return False
 
-            global SERVANT_INFO, BATTLE_LOGGER
+            global SERVANT_INFO, BATTLE_PLAN, PLAN_TURN, BATTLE_LOGGER
             SERVANT_INFO = self.battle_data
-            # 初始化战斗日志
-            BATTLE_LOGGER = BattleLogger()
+            BATTLE_PLAN = BattlePlan.compile(self.battle_data)
+            PLAN_TURN = 0
+            # 初始化战斗日志；数据库连接各次运行共用，只有换了数据库时才关闭旧的连接
+            if BATTLE_LOGGER and BATTLE_LOGGER.history and BATTLE_LOGGER.history is not history:
+                BATTLE_LOGGER.history.close()
+            BATTLE_LOGGER = BattleLogger(history=history)
 
             logger.info("JSON data parsed and stored successfully!")
             logger.info(f"ID: {self.battle_data.id}")
             logger.info(f"Username: {self.battle_data.username}")
             logger.info(f"Quest ID: {self.battle_data.questId}")
+            logger.info(f"作业共 {len(BATTLE_PLAN.turns)} 回合，要求暴击 {BATTLE_PLAN.crit_cards} 张，"
+                        f"不计暴击的失败概率 {1 - BATTLE_PLAN.success_probability:.1%}")
             
             # 访问更深层的数据，例如第一个在场从者(onFieldSvts)的ID
             if hasattr(self.battle_data, 'data') and hasattr(self.battle_data.data, 'result') and \
@@ -343,6 +667,25 @@ class InitBattleInfo(CustomAction):
         # 初始化完成后开始第一回合
         context.run_action("StartTurn")
         return True
+    
+    def select_team_file(self, history):
+        """确定本次使用的队伍文件: 指定的 team_id > 按关卡实测效率自动选择 > 默认队伍"""
+        from TeamRanking import TeamRanking
+        from Vision import resource_dir
+        
+        team_dir = resource_dir() / "team"
+        team_id = self.config.get('Team', 'team_id', fallback='')
+        if team_id:
+            return str(team_dir / f"{team_id}.json")
+        
+        quest_id = self.config.getint('Team', 'quest_id', fallback=0)
+        if quest_id and self.config.getboolean('Team', 'auto_select', fallback=False):
+            enemy_hash = self.config.get('Team', 'enemy_hash', fallback='') or None
+            plan = TeamRanking.from_config(self.config, history).select(quest_id, enemy_hash)
+            if plan:
+                return str(plan.path)
+        
+        return str(team_dir / "42200.json")
 
 
 @AgentServer.custom_action("StartTurn")
@@ -350,7 +693,29 @@ class StartTurn(CustomAction):
     def __init__(self):
         super().__init__()
         self.ctx = None
-        self.config = FGOBattleConfig()
+        self.config = None
+        
+        # 本回合选择的宝具 (svtId, tdId)，由攻击阶段填写
+        self.turn_np_keys = []
+        # 本回合作业要求的暴击全部成立的概率，由攻击阶段填写
+        self.turn_crit_probability = 1.0
+        # 本回合已完成的技能数与是否已开始选卡，重试时据此跳过已生效的操作
+        self.turn_skills_done = 0
+        self.turn_attack_started = False
+        # 本次体力回复是否已经点击过苹果，点击之后不能重试
+        self.apple_clicked = False
+        
+        # 战斗常量
+        self.MAX_CARDS_PER_TURN = 3
+        
+        self._refresh_config()
+    
+    def _refresh_config(self):
+        """加载依赖配置的成员；配置文件修改或工作目录改变后，下一次运行时重新加载"""
+        config = FGOBattleConfig.shared()
+        if config is self.config:
+            return
+        self.config = config
         
         # 从配置中加载位置信息
         self._load_positions()
@@ -362,9 +727,65 @@ class StartTurn(CustomAction):
         self.WAVE_TRANSITION_WAIT = self.config.getfloat('Timing', 'wave_transition_wait', 3.0)
         self.BATTLE_RESULT_WAIT = self.config.getfloat('Timing', 'battle_result_wait', 5.0)
         self.DIALOG_WAIT = self.config.getfloat('Timing', 'dialog_wait', 1.0)
-        
-        # 战斗常量
-        self.MAX_CARDS_PER_TURN = 3
+        # 每场连续出击的非战斗开销目标(秒)
+        self.REPEAT_OVERHEAD_TARGET = self.config.getfloat('Battle', 'repeat_overhead_target', 5.0)
+        
+        self.SKILL_READY_BRIGHTNESS = self.config.getfloat('Retry', 'skill_ready_brightness', 60.0)
+        
+        # 助战扫描器，首次选择助战时创建
+        self.support_scanner = None
+        # 掉落识别器，首次识别时加载物品图标索引
+        self.drop_reader = None
+        # 自动战斗的选卡识别与组合评分
+        self.card_reader = None
+        self.card_reader_svt_ids = ()
+        # 按配置创建的延迟成员在下次使用时重新创建
+        for name in ('np_timing', 'animation_watcher', 'chain_weights'):
+            self.__dict__.pop(name, None)
+    
+    # 以下成员在第一次使用时才创建，注册自定义操作时不加载模板与文件
+    
+    @functools.cached_property
+    def state_classifier(self):
+        """画面状态识别，用于重试前确认操作是否已生效"""
+        return shared_classifier()
+    
+    @functools.cached_property
+    def np_timing(self):
+        """宝具动画时长模型，按从者学习实际等待时间"""
+        from NpTiming import NpTimingModel
+        return NpTimingModel(
+            path=self.config.get('Timing', 'np_timing_path', fallback='np_timing.json'),
+            alpha=self.config.getfloat('Timing', 'np_timing_alpha', 0.3),
+            default=self.NP_ANIMATION_WAIT,
+            card_time=self.config.getfloat('Timing', 'np_card_time', 4.0)
+        )
+    
+    @functools.cached_property
+    def animation_watcher(self):
+        """攻击动画结束检测：按预计时长休眠后轮询画面状态和帧差"""
+        from NpTiming import AnimationWatcher
+        skip_position = None
+        if self.config.getboolean('Timing', 'np_skip', False):
+            skip_position = (self.config.getint('Positions', 'np_skip_x', 1230),
+                             self.config.getint('Positions', 'np_skip_y', 40))
+        return AnimationWatcher(
+            capture=lambda: ImageRecognition.capture_screen(self.ctx),
+            classifier=self.state_classifier,
+            click=self._click,
+            interval=self.config.getfloat('Timing', 'np_poll_interval', 0.25),
+            lead=self.config.getfloat('Timing', 'np_poll_lead', 1.5),
+            skip_position=skip_position
+        )
+    
+    @functools.cached_property
+    def chain_weights(self):
+        """自动战斗中出卡组合的评分权重"""
+        from CardChain import ChainWeights
+        return ChainWeights(
+            np_gain=self.config.getfloat('Battle', 'chain_np_weight', 0.02),
+            stars=self.config.getfloat('Battle', 'chain_star_weight', 0.05)
+        )
     
     def _load_positions(self):
         """从配置中加载位置信息"""
@@ -449,7 +870,31 @@ class StartTurn(CustomAction):
         argv: CustomAction.RunArg,
     ) -> bool:
         self.ctx = context
-        global CURRENT_TURN, CURRENT_WAVE, BATTLE_LOGGER
+        self._refresh_config()
+        
+        # 回合与连续出击都在这里循环，不再递归调用 run_action("StartTurn")
+        try:
+            while True:
+                outcome = self.play_turn()
+                if outcome is OPERATION_FAILED:
+                    return False
+                if outcome:
+                    continue
+                # 战斗结束：结算 → 连续出击 → 体力 → 助战 → 下一场
+                if self.handle_battle_results() is not True:
+                    return True
+        finally:
+            self._close_unfinished_battle()
+    
+    def _close_unfinished_battle(self):
+        """没有到达结算画面就退出的战斗(执行失败、全灭、结算超时、异常)记为失败"""
+        if BATTLE_LOGGER and BATTLE_LOGGER.battle_open:
+            logger.warning(f"第 {BATTLE_LOGGER.battle_count} 次战斗没有正常结算，记为失败")
+            BATTLE_LOGGER.log_battle_end(CURRENT_TURN, None, getattr(SERVANT_INFO, 'questId', None), success=False)
+    
+    def play_turn(self):
+        """执行一个回合，返回 True 表示战斗继续，False 表示战斗已结束，执行失败时返回 OPERATION_FAILED"""
+        global CURRENT_TURN, CURRENT_WAVE, PLAN_TURN, BATTLE_LOGGER
         
         logger.info(f"开始执行第 {CURRENT_WAVE} 波, 第 {CURRENT_TURN} 回合")
         
@@ -459,51 +904,79 @@ class StartTurn(CustomAction):
             if hasattr(SERVANT_INFO, 'data') and hasattr(SERVANT_INFO.data, 'result') and \
                hasattr(SERVANT_INFO.data.result, 'quest'):
                 quest_name = getattr(SERVANT_INFO.data.result.quest, 'name', "Unknown")
-            BATTLE_LOGGER.log_battle_start(quest_name)
+            BATTLE_LOGGER.log_battle_start(quest_name,
+                                           quest_id=getattr(SERVANT_INFO, 'questId', None),
+                                           team_id=getattr(SERVANT_INFO, 'id', None))
         
         # 判断是否有特定回合的战斗数据
-        if self.handle_battle_turn(CURRENT_TURN):
+        turn_started = time.time()
+        self.turn_skills_done = 0
+        self.turn_attack_started = False
+        turn_result = self.handle_battle_turn(PLAN_TURN)
+        if turn_result is OPERATION_FAILED:
+            # 回合执行失败时不能转入自动战斗，否则会打乱后续回合的配置
+            logger.error(f"第 {CURRENT_TURN} 回合执行失败，停止战斗")
+            return OPERATION_FAILED
+        elif turn_result:
+            if BATTLE_LOGGER:
+                BATTLE_LOGGER.log_turn(CURRENT_TURN, CURRENT_WAVE, turn_started, time.time() - turn_started)
             CURRENT_TURN += 1
-            # 设置定时器检查下一回合的开始
-            self.wait_for_next_turn()
-            return True
+            PLAN_TURN += 1
+            # 等待动画结束并判断下一回合、下一波次或战斗结束
+            return self.wait_for_next_turn()
         else:
-            logger.info(f"没有找到回合 {CURRENT_TURN} 的战斗数据，切换到自动战斗模式")
-            self.auto_battle_mode()
-            return True
+            logger.info(f"没有找到回合 {PLAN_TURN} 的战斗数据，切换到自动战斗模式")
+            return self.auto_battle_mode()
 
-    @safe_execute
+    @safe_execute(policy="turn", guard="_turn_retry_guard")
     def handle_battle_turn(self, turn_index):
         """处理特定回合的战斗流程"""
-        global SERVANT_INFO
-        turn_battle_data = None
-        
-        # 访问回合数据
-        if SERVANT_INFO and hasattr(SERVANT_INFO, 'data') and hasattr(SERVANT_INFO.data, 'result'):
-            turns = SERVANT_INFO.data.result.turns
-            if 0 <= turn_index < len(turns):
-                turn_battle_data = turns[turn_index]
+        turn_battle_data = BATTLE_PLAN.turn(turn_index) if BATTLE_PLAN else None
         
         if turn_battle_data:
             logger.info(f"===== 执行第 {CURRENT_WAVE}/{MAX_WAVES} 波, 第 {turn_index+1} 回合 =====")
             # 1. 技能阶段
-            self.skill_phase(turn_battle_data)
+            if self.skill_phase(turn_battle_data) is OPERATION_FAILED:
+                raise RetryExhausted("技能阶段执行失败")
             
             # 2. 等待技能动画完成
             time.sleep(self.SKILL_ANIMATION_WAIT)
             
             # 3. 攻击阶段
-            self.attack_phase(turn_battle_data)
+            self.turn_crit_probability = 1.0
+            if self.attack_phase(turn_battle_data) is OPERATION_FAILED:
+                raise RetryExhausted("攻击阶段执行失败")
+            # 宝具所属从者按换人后的站位计算
+            self.turn_np_keys = list(turn_battle_data.np_keys)
+            
+            success_probability = turn_battle_data.success_probability * self.turn_crit_probability
+            if success_probability < 1.0:
+                logger.warning(f"第 {turn_index+1} 回合按作业成功的概率为 {success_probability:.1%}")
+            if BATTLE_LOGGER:
+                BATTLE_LOGGER.log_turn_risk(success_probability)
             return True
         else:
             return False
 
     def wait_for_next_turn(self):
-        """等待并检查下一回合或下一波次是否开始"""
+        """等待并检查下一回合或下一波次是否开始，返回战斗是否继续"""
+        from ScreenState import ScreenState
         global CURRENT_TURN, CURRENT_WAVE, MAX_WAVES
         
-        # 等待战斗动画完成
-        time.sleep(self.NP_ANIMATION_WAIT)
+        # 等待战斗动画完成：按学习到的宝具时长等待，再以画面确认
+        np_keys, self.turn_np_keys = self.turn_np_keys, []
+        expected = self.np_timing.expected(np_keys)
+        result = self.animation_watcher.wait(expected, timeout=max(expected, self.NP_ANIMATION_WAIT) * 2)
+        if result.confirmed and not result.skipped:
+            self.np_timing.update(np_keys, result.duration)
+        if BATTLE_LOGGER:
+            key = ",".join(f"{svt_id}:{td_id}" for svt_id, td_id in np_keys) or None
+            BATTLE_LOGGER.log_wait("np_animation", expected, result.duration, key)
+        
+        # 动画结束时已经识别到结算画面
+        if result.state in (ScreenState.BATTLE_RESULT, ScreenState.DROP_RESULT):
+            logger.info("战斗已结束!")
+            return False
         
         # 检查是否进入新的波次
         if ImageRecognition.check_wave_transition(self.ctx):
@@ -514,85 +987,89 @@ class StartTurn(CustomAction):
             
             if CURRENT_WAVE <= MAX_WAVES:
                 # 开始新波次的第一回合
-                self.ctx.run_action("StartTurn")
-            else:
-                logger.info("所有波次已完成")
-                self.handle_battle_results()
+                return True
+            logger.info("所有波次已完成")
+            return False
         
         # 检查战斗是否结束
-        elif self.check_battle_finished():
+        if self.check_battle_finished():
             logger.info("战斗已结束!")
-            self.handle_battle_results()
-        else:
-            # 开始下一回合
-            self.ctx.run_action("StartTurn")
+            return False
+        # 开始下一回合
+        return True
     
     def check_battle_finished(self):
         """检查战斗是否结束"""
         # 使用图像识别检查战斗结束标志
         return ImageRecognition.check_battle_end(self.ctx)
     
-    @safe_execute
+    @safe_execute(policy="dialog")
     def handle_battle_results(self):
-        """处理战斗结果界面"""
-        global BATTLE_LOGGER, CURRENT_TURN
-        
-        # 点击几次屏幕以跳过结算画面
-        for _ in range(5):
-            self.ctx.controller.post_click(self.BATTLE_FINISHED_CHECK["x"], 
-                                          self.BATTLE_FINISHED_CHECK["y"]).wait()
-            time.sleep(self.DIALOG_WAIT)
-        
-        # 检测掉落物品(这里简化处理)
-        drops = self.detect_battle_drops()
-        
-        # 记录战斗结束
+        """结算 → 连续出击 → 体力回复 → 助战 → 下一场战斗，返回是否已进入下一场战斗"""
+        from RepeatLoop import RepeatLayout, RepeatLoop
+        loop = RepeatLoop(
+            capture=lambda: ImageRecognition.capture_screen(self.ctx),
+            classifier=self.state_classifier,
+            click=self._click,
+            read_drops=self.detect_battle_drops,
+            on_results_done=self._log_battle_results,
+            should_continue=self._should_repeat,
+            restore_ap=self.check_and_restore_ap,
+            select_support=self.select_support_servant,
+            layout=RepeatLayout(advance=(self.BATTLE_FINISHED_CHECK["x"], self.BATTLE_FINISHED_CHECK["y"])),
+            timeout=self.config.getfloat('Battle', 'repeat_timeout', 90.0),
+            blind_wait=self.DIALOG_WAIT
+        )
+        result = loop.run()
         if BATTLE_LOGGER:
-            BATTLE_LOGGER.log_battle_end(CURRENT_TURN, drops)
-        
+            BATTLE_LOGGER.log_loop_overhead(result.overhead, self.REPEAT_OVERHEAD_TARGET, result.started)
+        if result.started:
+            self._reset_battle_counters()
+        return result.started
+    
+    def _log_battle_results(self, drops):
+        """离开结算画面时记录战斗结束"""
+        if BATTLE_LOGGER:
+            quest_id = getattr(SERVANT_INFO, 'questId', None)
+            BATTLE_LOGGER.log_battle_end(CURRENT_TURN, drops, quest_id)
         logger.info("战斗结算完成")
-        
-        # 处理战斗后的选项(继续/退出)
-        self.handle_post_battle_options()
     
-    def detect_battle_drops(self):
-        """检测战斗掉落物品"""
-        # 实际应用中可以使用图像识别检测掉落物
-        # 这里简化返回空字典
-        return {}
+    def _should_repeat(self):
+        """是否继续下一场：开启了连续出击且未达到最大战斗次数"""
+        if not self.config.getboolean('Battle', 'auto_repeat', fallback=True):
+            return False
+        max_battles = self.config.getint('Battle', 'max_battles', fallback=0)
+        if max_battles > 0 and BATTLE_LOGGER and BATTLE_LOGGER.battle_count >= max_battles:
+            logger.info(f"已达到设定的最大战斗次数: {max_battles}")
+            return False
+        return True
+    
+    def _reset_battle_counters(self):
+        """新的一场战斗从第一波第一回合开始"""
+        global CURRENT_TURN, CURRENT_WAVE, PLAN_TURN
+        CURRENT_TURN = 0
+        CURRENT_WAVE = 1
+        PLAN_TURN = 0
     
-    @safe_execute
+    def detect_battle_drops(self, screen=None):
+        """检测战斗掉落物品，返回 {物品名: 数量}，无法识别时返回 None"""
+        from DropReader import DropReader
+        from OcrReader import OcrReader
+        if screen is None:
+            screen = ImageRecognition.capture_screen(self.ctx)
+        if self.drop_reader is None:
+            self.drop_reader = DropReader()
+        drops = self.drop_reader.read(screen, OcrReader.from_config(self.ctx, self.config))
+        if drops is None:
+            logger.warning("没有物品图标，跳过掉落识别，本场不计入掉率")
+        else:
+            logger.info(f"识别到掉落: {drops}")
+        return drops
+    
+    @safe_execute(policy="dialog")
     def handle_post_battle_options(self):
-        """处理战斗后的选项"""
-        # 检查是否出现了连续出击询问
-        if self.check_continue_quest_dialog():
-            logger.info("检测到连续出击询问")
-            if self.config.getboolean('Battle', 'auto_repeat', fallback=True):
-                self.select_continue_quest()
-                # 重置回合和波次计数
-                global CURRENT_TURN, CURRENT_WAVE
-                CURRENT_TURN = 0
-                CURRENT_WAVE = 1
-                
-                # 检查AP是否足够
-                if self.check_ap_recovery_dialog():
-                    if self.check_and_restore_ap():
-                        # AP恢复后继续
-                        time.sleep(2)
-                        # 选择助战
-                        self.select_support_servant()
-                        # 开始新的战斗
-                        self.ctx.run_action("StartTurn")
-                    else:
-                        # 不恢复AP则退出
-                        self.select_quit_quest()
-                else:
-                    # 选择助战
-                    self.select_support_servant()
-                    # 开始新的战斗
-                    self.ctx.run_action("StartTurn")
-            else:
-                self.select_quit_quest()
+        """处理战斗后的选项，返回是否已开始下一场战斗"""
+        return self.handle_battle_results() is True
     
     def check_continue_quest_dialog(self):
         """检查是否出现了连续出击询问"""
@@ -603,140 +1080,187 @@ class StartTurn(CustomAction):
     def select_continue_quest(self):
         """选择继续出击"""
         # 点击"是"按钮
-        self.ctx.controller.post_click(350, 450).wait()
+        self._click(350, 450)
         time.sleep(self.DIALOG_WAIT)
     
     def select_quit_quest(self):
         """选择退出战斗"""
         # 点击"否"按钮
-        self.ctx.controller.post_click(550, 450).wait()
+        self._click(550, 450)
         time.sleep(self.DIALOG_WAIT)
     
     def check_ap_recovery_dialog(self):
         """检查是否出现了AP不足提示"""
-        # 实际应用中使用图像识别检测
-        # 这里简化返回False
-        return False
+        from ScreenState import ScreenState
+        _, state = self._current_state()
+        return state == ScreenState.AP_RECOVERY
     
-    @safe_execute
-    def check_and_restore_ap(self):
-        """检查并恢复AP(体力)"""
-        if not self.config.getboolean('Battle', 'auto_apple', fallback=False):
-            logger.info("自动吃苹果功能未开启，如果体力不足将退出")
-            return False
-        
-        # 检查是否达到苹果使用上限
-        apple_limit = self.config.getint('Battle', 'apple_limit', fallback=0)
-        if apple_limit > 0 and BATTLE_LOGGER and BATTLE_LOGGER.apple_used >= apple_limit:
-            logger.info(f"已达到苹果使用上限: {apple_limit}")
-            return False
-        
-        apple_type = self.config.get('Battle', 'apple_type', fallback='gold')
-        apple_positions = {
-            'gold': {'x': 375, 'y': 300},
-            'silver': {'x': 375, 'y': 400},
-            'bronze': {'x': 375, 'y': 500},
-            'quartz': {'x': 375, 'y': 600}
-        }
+    def _ap_retry_guard(self, required=True):
+        """点击苹果之后出错时不重试，否则可能再使用一个苹果"""
+        if self.apple_clicked:
+            raise FatalError("已点击苹果，无法确认是否已经使用")
+        return True
+    
+    @safe_execute(policy="dialog", guard="_ap_retry_guard")
+    def check_and_restore_ap(self, required=True):
+        """检查并恢复AP(体力)，返回是否可以继续出击
+
+        在体力回复界面一次截图读取体力与苹果库存，按苹果顺序与各类上限决定吃苹果；
+        自然回复更划算或苹果不可用时，记录下一次出击时间并退出。
+        required 为 False 表示无法确认是否弹出了体力回复界面，此时读不到体力视为没有弹出。
+        """
+        from ApRecovery import ApRecovery, SessionScheduler
+        from OcrReader import OcrReader
+        
+        self.apple_clicked = False
+        recovery = ApRecovery.from_config(self.ctx, OcrReader.from_config(self.ctx, self.config), self.config)
+        screen = ImageRecognition.capture_screen(self.ctx)
+        status = recovery.read_status(screen)
+        if status is None:
+            return not required
+        
+        used = BATTLE_LOGGER.apples_used if BATTLE_LOGGER else {}
+        decision = recovery.planner.decide(status, used)
+        logger.info(f"按当前体力与苹果预计还可出击 {decision.runs_possible} 次")
+        
+        if decision.action == "none":
+            return True
         
-        if apple_type in apple_positions:
-            # 点击对应的苹果
-            pos = apple_positions[apple_type]
-            logger.info(f"使用{apple_type}苹果回复体力")
-            self.ctx.controller.post_click(pos['x'], pos['y']).wait()
-            time.sleep(self.DIALOG_WAIT)
-            
-            # 点击确认按钮
-            self.ctx.controller.post_click(550, 350).wait()
+        if decision.action == "apple":
+            logger.info(f"使用{decision.apple_type}苹果回复体力")
+            self.apple_clicked = True
+            recovery.use_apple(decision.apple_type)
             time.sleep(2 * self.DIALOG_WAIT)
             
             # 记录苹果使用
             if BATTLE_LOGGER:
-                BATTLE_LOGGER.log_apple_use(apple_type)
-            
+                BATTLE_LOGGER.log_apple_use(decision.apple_type)
             return True
-        else:
-            logger.error(f"未知的苹果类型: {apple_type}")
-            return False
+        
+        logger.info(f"不使用苹果: {decision.reason}")
+        SessionScheduler().schedule(decision.wait_seconds, decision.reason)
+        return False
     
-    @safe_execute
+    @safe_execute(policy="dialog")
     def select_support_servant(self):
         """选择助战从者"""
         if not self.config.getboolean('Support', 'enable_support_selection', fallback=True):
             # 如果没有启用助战选择，直接选第一个
             logger.info("助战选择功能未启用，选择默认助战")
-            self.ctx.controller.post_click(450, 300).wait()
+            self._click(450, 300)
             time.sleep(self.DIALOG_WAIT * 2)  # 等待助战加载
             return True
         
-        # 配置中指定的助战从者和礼装
-        target_servant = self.config.get('Support', 'servant', fallback=None)
-        target_craft_essence = self.config.get('Support', 'craft_essence', fallback=None)
-        
-        # 滑动查找次数
-        max_scroll = self.config.getint('Support', 'max_refresh', fallback=5)
-        auto_refresh = self.config.getboolean('Support', 'auto_refresh', fallback=True)
-        scroll_count = 0
-        
-        while scroll_count < max_scroll:
-            # 使用图像识别查找目标从者/礼装
-            if target_servant and self._find_support_servant(target_servant):
-                logger.info(f"找到目标从者: {target_servant}")
-                time.sleep(self.DIALOG_WAIT)
-                return True
-            elif target_craft_essence and self._find_support_craft_essence(target_craft_essence):
-                logger.info(f"找到目标礼装: {target_craft_essence}")
-                time.sleep(self.DIALOG_WAIT)
-                return True
-            
-            # 向下滑动查找更多助战
-            if scroll_count < max_scroll - 1:
-                self._scroll_support_list()
-                scroll_count += 1
-                time.sleep(self.DIALOG_WAIT)
-            else:
-                # 如果达到最大滑动次数且启用了自动刷新
-                if auto_refresh:
-                    logger.info("刷新助战列表")
-                    self._refresh_support_list()
-                    time.sleep(3 * self.DIALOG_WAIT)  # 等待刷新完成
-                    scroll_count = 0  # 重置计数
-                else:
-                    break
-        
-        # 如果找不到指定助战，选择第一个
-        logger.info("未找到指定助战，选择第一个")
-        self.ctx.controller.post_click(450, 300).wait()
-        time.sleep(2 * self.DIALOG_WAIT)
+        self.get_support_scanner().select()
+        time.sleep(self.DIALOG_WAIT)
         return True
     
-    def _find_support_servant(self, servant_name):
-        """查找指定助战从者"""
-        # 实际应用中使用OCR或图像识别匹配从者名称
-        # 这里简化返回False，表示未找到
+    def get_support_scanner(self):
+        """助战扫描器在多次出击间复用，以保留刷新冷却计时"""
+        from SupportScanner import SupportScanner
+        capture = lambda: ImageRecognition.capture_screen(self.ctx)
+        if self.support_scanner is None:
+            self.support_scanner = SupportScanner(self.ctx, self.config, capture)
+        else:
+            self.support_scanner.ctx = self.ctx
+            self.support_scanner.capture = capture
+        return self.support_scanner
+    
+    def _click(self, x, y):
+        """点击屏幕坐标并等待完成"""
+        self.ctx.tasker.controller.post_click(x, y).wait()
+    
+    def _current_state(self):
+        """截图并识别当前画面状态，返回 (截图, 状态)"""
+        screen = ImageRecognition.capture_screen(self.ctx)
+        return screen, self.state_classifier.classify(screen)
+    
+    def _current_field(self):
+        """作业执行到当前回合后的站位，没有作业时为 None"""
+        return BATTLE_PLAN.field_after(PLAN_TURN - 1) if BATTLE_PLAN else None
+    
+    def _np_keys(self, svt_indexes):
+        """场上位置 -> 宝具时长模型使用的 (svtId, tdId)"""
+        field = self._current_field()
+        return field.np_keys(svt_indexes) if field else []
+    
+    def _click_skill_target(self, player_target):
+        """在技能选择目标界面点击目标从者，返回是否点击"""
+        if player_target != -1 and 0 <= player_target < len(self.SKILL_TARGET_POSITIONS):
+            target_pos = self.SKILL_TARGET_POSITIONS[player_target]
+            self._click(target_pos["x"], target_pos["y"])
+            return True
         return False
     
-    def _find_support_craft_essence(self, ce_name):
-        """查找指定助战礼装"""
-        # 实际应用中使用OCR或图像识别匹配礼装名称
-        # 这里简化返回False，表示未找到
+    def _skill_retry_guard(self, svt_index, skill_index, player_target, enemy_target):
+        """从者技能重试前检查画面，避免同一技能被释放两次"""
+        from ScreenState import ScreenState
+        from Vision import mean_brightness
+        screen, state = self._current_state()
+        if state == ScreenState.SKILL_TARGET:
+            # 技能已点开，只差选择目标
+            self._click_skill_target(player_target)
+            return False
+        if state != ScreenState.BATTLE_COMMAND:
+            # 无法确认画面(包括锚点模板缺失)时不重试，重复释放技能比中止战斗代价更大
+            raise FatalError(f"当前画面为 {state}")
+        
+        if not (0 <= svt_index < len(self.SKILL_POSITIONS) and 0 <= skill_index < len(self.SKILL_POSITIONS[svt_index])):
+            return True
+        # 技能进入冷却后图标会变暗
+        skill_pos = self.SKILL_POSITIONS[svt_index][skill_index]
+        roi = (skill_pos["x"] - 20, skill_pos["y"] - 20, 40, 40)
+        return mean_brightness(screen, roi) >= self.SKILL_READY_BRIGHTNESS
+    
+    def _master_skill_retry_guard(self, skill_index, player_target, enemy_target, swap=None):
+        """御主技能重试前检查画面"""
+        from ScreenState import ScreenState
+        _, state = self._current_state()
+        if swap and state not in (ScreenState.BATTLE_COMMAND, ScreenState.MASTER_SKILL_MENU):
+            # 无法确认换人是否已经完成，重试可能把从者换回去
+            raise FatalError(f"换人技能执行中断，当前画面为 {state}")
+        if state == ScreenState.SKILL_TARGET:
+            self._click_skill_target(player_target)
+            return False
+        if state not in (ScreenState.BATTLE_COMMAND, ScreenState.MASTER_SKILL_MENU):
+            raise FatalError(f"当前画面为 {state}")
+        if state == ScreenState.MASTER_SKILL_MENU:
+            # 菜单已展开，再次点击御主按钮会把它收起，先收起菜单再重试
+            self._click(self.MASTER_SKILL_BUTTON["x"], self.MASTER_SKILL_BUTTON["y"])
+        return True
+    
+    def _attack_retry_guard(self, *args, **kwargs):
+        """选卡重试前检查画面，已选的卡再次点击会被取消，不能从头重试"""
+        from ScreenState import ScreenState
+        _, state = self._current_state()
+        if state == ScreenState.CARD_SELECT:
+            raise FatalError("已在选卡界面，部分指令卡可能已被选中")
+        if state == ScreenState.BATTLE_COMMAND:
+            return True
+        if state == ScreenState.UNKNOWN:
+            raise FatalError("无法确认画面，指令卡可能已被选中")
+        # 已经进入战斗动画或结算，说明指令已经下达
         return False
     
-    def _scroll_support_list(self):
-        """滑动助战列表"""
-        # 模拟从下向上滑动操作
-        self.ctx.controller.post_swipe(640, 600, 640, 200, 500).wait()  # 起点x,y，终点x,y，持续时间(ms)
+    def _skill_phase_retry_guard(self, turn_data):
+        """技能阶段重试前确认仍在指令界面，重试时从未完成的技能继续"""
+        from ScreenState import ScreenState
+        _, state = self._current_state()
+        if state != ScreenState.BATTLE_COMMAND:
+            raise FatalError(f"技能阶段中断，当前画面为 {state}")
+        return True
     
-    def _refresh_support_list(self):
-        """刷新助战列表"""
-        # 点击刷新按钮
-        self.ctx.controller.post_click(750, 200).wait()
-        time.sleep(self.DIALOG_WAIT)
-        
-        # 点击确认按钮
-        self.ctx.controller.post_click(550, 450).wait()
+    def _turn_retry_guard(self, turn_index):
+        """回合重试前检查：已开始选卡时不能从头重试，技能阶段会跳过已完成的技能"""
+        if self.turn_attack_started:
+            raise FatalError("攻击阶段已开始，无法从头重试本回合")
+        return self._skill_phase_retry_guard(None)
     
-    @safe_execute
+    def _swap_retry_guard(self, servant_out_index, servant_in_index):
+        """换人无法从画面确认是否已完成，重试可能把从者换回去"""
+        raise FatalError("换人执行中断")
+    
+    @safe_execute(policy="skill", guard="_skill_phase_retry_guard")
     def skill_phase(self, turn_data):
         """技能阶段处理"""
         if not hasattr(turn_data, 'skills') or not turn_data.skills:
@@ -745,6 +1269,9 @@ class StartTurn(CustomAction):
             
         logger.info(f"开始执行技能阶段，共 {len(turn_data.skills)} 个技能")
         for index, skill in enumerate(turn_data.skills):
+            if index < self.turn_skills_done:
+                # 重试时跳过已经释放的技能
+                continue
             if not hasattr(skill, 'svt') or not hasattr(skill, 'skill') or not hasattr(skill, 'options'):
                 logger.warning(f"技能 #{index+1} 数据格式不正确")
                 continue
@@ -758,16 +1285,20 @@ class StartTurn(CustomAction):
             if skill_owner is not None:
                 # 从者技能
                 logger.info(f"使用从者 {skill_owner+1} 的第 {skill_index+1} 个技能")
-                self.use_svt_skill(skill_owner, skill_index, player_target, enemy_target)
+                result = self.use_svt_skill(skill_owner, skill_index, player_target, enemy_target)
             else:
-                # 御主技能
+                # 御主技能，换人技能带有编译时确定的交换位置
                 logger.info(f"使用御主的第 {skill_index+1} 个技能")
-                self.use_master_skill(skill_index, player_target, enemy_target)
+                result = self.use_master_skill(skill_index, player_target, enemy_target, swap=skill.swap)
+            
+            if result is OPERATION_FAILED:
+                raise RetryExhausted(f"技能 #{index+1} 执行失败")
+            self.turn_skills_done = index + 1
             
             # 等待技能动画
             time.sleep(self.SKILL_ANIMATION_WAIT)
     
-    @safe_execute
+    @safe_execute(policy="skill", guard="_skill_retry_guard")
     def use_svt_skill(self, svt_index, skill_index, player_target, enemy_target):
         """使用从者技能"""
         # 先选择敌人目标(如果有)
@@ -778,24 +1309,23 @@ class StartTurn(CustomAction):
         # 获取技能按钮位置
         if 0 <= svt_index < len(self.SKILL_POSITIONS) and 0 <= skill_index < len(self.SKILL_POSITIONS[svt_index]):
             skill_pos = self.SKILL_POSITIONS[svt_index][skill_index]
-            self.ctx.controller.post_click(skill_pos["x"], skill_pos["y"]).wait()
+            self._click(skill_pos["x"], skill_pos["y"])
             time.sleep(0.5)  # 等待技能按钮动画
             
             # 如果需要选择从者目标
             if player_target != -1 and 0 <= player_target < len(self.SKILL_TARGET_POSITIONS):
                 target_pos = self.SKILL_TARGET_POSITIONS[player_target]
                 time.sleep(0.3)
-                self.ctx.controller.post_click(target_pos["x"], target_pos["y"]).wait()
+                self._click(target_pos["x"], target_pos["y"])
                 time.sleep(0.3)
         else:
             logger.error(f"错误: 从者索引 {svt_index+1} 或技能索引 {skill_index+1} 超出范围")
     
-    @safe_execute
-    def use_master_skill(self, skill_index, player_target, enemy_target):
-        """使用御主技能"""
+    @safe_execute(policy="skill", guard="_master_skill_retry_guard")
+    def use_master_skill(self, skill_index, player_target, enemy_target, swap=None):
+        """使用御主技能，swap 为换人技能的 (在场位置, 替补位置)"""
         # 先点击御主技能按钮打开菜单
-        self.ctx.controller.post_click(self.MASTER_SKILL_BUTTON["x"], 
-                                      self.MASTER_SKILL_BUTTON["y"]).wait()
+        self._click(self.MASTER_SKILL_BUTTON["x"], self.MASTER_SKILL_BUTTON["y"])
         time.sleep(0.5)
         
         # 选择敌人目标(如果有)
@@ -806,23 +1336,23 @@ class StartTurn(CustomAction):
         # 选择具体的御主技能
         if 0 <= skill_index < len(self.MASTER_SKILLS):
             skill_pos = self.MASTER_SKILLS[skill_index]
-            self.ctx.controller.post_click(skill_pos["x"], skill_pos["y"]).wait()
+            self._click(skill_pos["x"], skill_pos["y"])
             time.sleep(0.5)
             
-            # 特殊处理：换人礼装(第3个技能)
-            if skill_index == 2 and player_target != -1 and hasattr(player_target, 'swap'):
-                # 假设player_target是一个包含swap属性的对象，指定要交换的从者
-                self.perform_servant_swap(player_target.swap[0], player_target.swap[1])
+            # 特殊处理：换人礼装(第3个技能)，替补位置在换人界面中排在 3-5
+            if swap:
+                if self.perform_servant_swap(swap[0], swap[1] + 3) is not True:
+                    raise FatalError("换人失败")
             # 普通技能目标选择
             elif player_target != -1 and 0 <= player_target < len(self.SKILL_TARGET_POSITIONS):
                 target_pos = self.SKILL_TARGET_POSITIONS[player_target]
                 time.sleep(0.3)
-                self.ctx.controller.post_click(target_pos["x"], target_pos["y"]).wait()
+                self._click(target_pos["x"], target_pos["y"])
                 time.sleep(0.3)
         else:
             logger.error(f"错误: 御主技能索引 {skill_index+1} 超出范围")
     
-    @safe_execute
+    @safe_execute(policy="dialog", guard="_swap_retry_guard")
     def perform_servant_swap(self, servant_out_index, servant_in_index):
         """执行换人礼装功能"""
         logger.info(f"执行换人礼装: 将前排从者{servant_out_index+1}换成后排从者{servant_in_index+1}")
@@ -847,7 +1377,7 @@ class StartTurn(CustomAction):
         # 1. 点击前排要换出的从者
         if 0 <= servant_out_index < len(front_positions):
             pos = front_positions[servant_out_index]
-            self.ctx.controller.post_click(pos["x"], pos["y"]).wait()
+            self._click(pos["x"], pos["y"])
             time.sleep(0.5)
         else:
             logger.error("错误: 无效的前排从者索引")
@@ -857,66 +1387,75 @@ class StartTurn(CustomAction):
         servant_in_adjusted = servant_in_index - 3  # 调整为后排索引(0-2)
         if 0 <= servant_in_adjusted < len(back_positions):
             pos = back_positions[servant_in_adjusted]
-            self.ctx.controller.post_click(pos["x"], pos["y"]).wait()
+            self._click(pos["x"], pos["y"])
             time.sleep(0.5)
         else:
             logger.error("错误: 无效的后排从者索引")
             return False
         
         # 3. 点击确认按钮
-        self.ctx.controller.post_click(confirm_button["x"], confirm_button["y"]).wait()
+        self._click(confirm_button["x"], confirm_button["y"])
         time.sleep(3)  # 等待换人动画
         
         return True
     
-    @safe_execute
+    @safe_execute(policy="attack", guard="_attack_retry_guard")
     def attack_phase(self, turn_data):
         """攻击阶段处理"""
-        if not hasattr(turn_data, 'attacks') or not hasattr(turn_data.attacks, 'attacks'):
+        from CardChain import assign_cards
+        from OcrReader import OcrReader
+        attack_list = getattr(turn_data, 'attack', None)
+        if attack_list is None or not attack_list.attacks:
             logger.warning("回合没有攻击操作或数据格式不正确")
             return
-            
-        attack_list = turn_data.attacks
         
         # 点击攻击按钮，进入选卡界面
         logger.info("点击攻击按钮，进入选卡阶段")
-        self.ctx.controller.post_click(self.ATTACK_BUTTON["x"], self.ATTACK_BUTTON["y"]).wait()
+        self.turn_attack_started = True
+        self._click(self.ATTACK_BUTTON["x"], self.ATTACK_BUTTON["y"])
         time.sleep(1.5)  # 等待进入选卡界面
         
         # 如果有指定敌人目标，先选择
-        if hasattr(attack_list, 'enemy_target') and attack_list.enemy_target != -1:
-            self.select_enemy(attack_list.enemy_target)
+        enemy_target = attack_list.options.enemyTarget if attack_list.options else -1
+        if enemy_target != -1:
+            self.select_enemy(enemy_target)
             time.sleep(0.3)
         
-        # 根据配置选择指令卡
-        card_count = 0
-        logger.info(f"开始选择指令卡，共 {len(attack_list.attacks)} 张配置卡")
+        # 根据配置选择指令卡：同一张截图识别卡面所属从者、卡色和暴击率，再对应到画面位置
+        attacks = attack_list.attacks[:self.MAX_CARDS_PER_TURN]
+        if len(attack_list.attacks) > self.MAX_CARDS_PER_TURN:
+            logger.info(f"已选择 {self.MAX_CARDS_PER_TURN} 张卡，忽略剩余配置")
+        logger.info(f"开始选择指令卡，共 {len(attacks)} 张配置卡")
+        
+        needs_crit = any(attack.critical and not attack.isTD for attack in attacks)
+        screen = ImageRecognition.capture_screen(self.ctx)
+        ocr = OcrReader.from_config(self.ctx, self.config) if needs_crit and self.config.getboolean('Battle', 'read_crit_stars', True) else None
+        cards = self.get_card_reader().read(screen, ocr)
+        assignment = assign_cards(attacks, cards)
+        self.turn_crit_probability = assignment.crit_probability if ocr is not None else 1.0
+        if ocr is not None:
+            unknown = f"，{assignment.unknown_crits} 张暴击率未识别不计入" if assignment.unknown_crits else ""
+            logger.info(f"作业要求的暴击全部成立的概率: {assignment.crit_probability:.1%}{unknown}")
         
-        for index, attack in enumerate(attack_list.attacks):
-            if card_count >= self.MAX_CARDS_PER_TURN:
-                logger.info(f"已选择 {self.MAX_CARDS_PER_TURN} 张卡，忽略剩余配置")
-                break
-                
-            if not hasattr(attack, 'isTD') or not hasattr(attack, 'svt') or not hasattr(attack, 'card'):
-                logger.warning(f"攻击 #{index+1} 数据格式不正确")
-                continue
-                
+        card_count = 0
+        used_cards = set()
+        for attack, position in zip(attacks, assignment.positions):
             if attack.isTD:
                 # 选择宝具卡
                 if 0 <= attack.svt < len(self.NOBLE_PHANTASM_CARDS):
                     logger.info(f"选择从者 {attack.svt+1} 的宝具卡")
                     np_card = self.NOBLE_PHANTASM_CARDS[attack.svt]
-                    self.ctx.controller.post_click(np_card["x"], np_card["y"]).wait()
+                    self._click(np_card["x"], np_card["y"])
                 else:
                     logger.error(f"错误: 宝具卡从者索引 {attack.svt+1} 超出范围")
-            else:
+            elif position is not None:
                 # 选择普通指令卡
-                if 0 <= attack.card < len(self.CARDS):
-                    logger.info(f"选择第 {attack.card+1} 张普通指令卡")
-                    card = self.CARDS[attack.card]
-                    self.ctx.controller.post_click(card["x"], card["y"]).wait()
-                else:
-                    logger.error(f"错误: 指令卡索引 {attack.card+1} 超出范围")
+                logger.info(f"选择第 {position+1} 张普通指令卡 (从者 {attack.svt+1}, {attack.cardType})")
+                card = self.CARDS[position]
+                self._click(card["x"], card["y"])
+                used_cards.add(position)
+            else:
+                logger.error(f"错误: 找不到从者 {attack.svt+1} 的指令卡")
             
             card_count += 1
             time.sleep(self.CARD_SELECT_DELAY)
@@ -926,82 +1465,70 @@ class StartTurn(CustomAction):
         if remaining_cards > 0:
             logger.info(f"已配置卡牌不足3张，随机选择剩余 {remaining_cards} 张卡")
             
-            # 为了避免重复选择，从第一张卡开始尝试
+            # 跳过已经选择的卡，避免再次点击把它取消
             for card_idx in range(len(self.CARDS)):
                 if card_count >= self.MAX_CARDS_PER_TURN:
                     break
-                    
-                # 实际应用中应检测卡片是否可点击，这里简化处理
+                if card_idx in used_cards:
+                    continue
+                
                 card = self.CARDS[card_idx]
                 logger.info(f"随机选择第 {card_idx+1} 张指令卡")
-                self.ctx.controller.post_click(card["x"], card["y"]).wait()
+                self._click(card["x"], card["y"])
                 card_count += 1
                 time.sleep(self.CARD_SELECT_DELAY)
         
         logger.info("指令卡选择完毕，等待战斗动画")
     
-    @safe_execute
+    @safe_execute(policy="click")
     def select_enemy(self, enemy_index=-1):
         """选择敌人目标"""
         # 如果指定了敌人索引且在有效范围内
         if enemy_index != -1 and 0 <= enemy_index < len(self.ENEMY_POSITIONS):
             enemy_pos = self.ENEMY_POSITIONS[enemy_index]
             logger.info(f"选择第 {enemy_index+1} 个敌人")
-            self.ctx.controller.post_click(enemy_pos["x"], enemy_pos["y"]).wait()
+            self._click(enemy_pos["x"], enemy_pos["y"])
     
-    @safe_execute
+    @safe_execute(policy="attack", guard="_attack_retry_guard")
     def auto_battle_mode(self):
         """智能自动战斗模式"""
+        from CardChain import best_chain
         logger.info("进入智能自动战斗模式")
         
-        # 检查是否有宝具可用
-        available_np = self.check_available_noble_phantasms()
-        
         # 第一步：使用有效的技能
         self.use_effective_skills()
         
         # 第二步：进入攻击阶段
-        self.ctx.controller.post_click(self.ATTACK_BUTTON["x"], self.ATTACK_BUTTON["y"]).wait()
+        self._click(self.ATTACK_BUTTON["x"], self.ATTACK_BUTTON["y"])
         time.sleep(1.5)
         
-        # 第三步：选择指令卡
-        # 优先使用宝具，然后是克制卡，最后是普通卡
-        cards_selected = 0
-        
-        # 选择可用的宝具
-        for svt_idx, is_available in enumerate(available_np):
-            if is_available and cards_selected < self.MAX_CARDS_PER_TURN:
-                np_card = self.NOBLE_PHANTASM_CARDS[svt_idx]
-                self.ctx.controller.post_click(np_card["x"], np_card["y"]).wait()
-                cards_selected += 1
-                time.sleep(0.3)
-        
-        # 识别并选择克制卡和高星卡
-        advantage_cards = self.identify_advantage_cards()
-        for card_idx in advantage_cards:
-            if cards_selected < self.MAX_CARDS_PER_TURN:
-                card = self.CARDS[card_idx]
-                self.ctx.controller.post_click(card["x"], card["y"]).wait()
-                cards_selected += 1
-                time.sleep(0.3)
-        
-        # 如果还需要卡，随机选择剩余卡牌
-        for card_idx in range(len(self.CARDS)):
-            if cards_selected < self.MAX_CARDS_PER_TURN:
-                card = self.CARDS[card_idx]
-                self.ctx.controller.post_click(card["x"], card["y"]).wait()
-                cards_selected += 1
-                time.sleep(0.3)
+        # 第三步：识别指令卡，在所有出卡组合中选择得分最高的一组
+        screen = ImageRecognition.capture_screen(self.ctx)
+        reader = self.get_card_reader()
+        available_np = self.check_available_noble_phantasms(screen)
+        chain = best_chain(reader.read(screen), reader.read_np_colors(screen, available_np), self.chain_weights)
+        
+        np_selected = []
+        for kind, index in chain:
+            if kind == "np":
+                position = self.NOBLE_PHANTASM_CARDS[index]
+                np_selected.append(index)
+                logger.info(f"选择从者 {index+1} 的宝具卡")
+            else:
+                position = self.CARDS[index]
+                logger.info(f"选择第 {index+1} 张普通指令卡")
+            self._click(position["x"], position["y"])
+            time.sleep(self.CARD_SELECT_DELAY)
+        self.turn_np_keys = self._np_keys(np_selected)
         
         # 等待战斗动画完成后，检查战斗状态
-        time.sleep(self.NP_ANIMATION_WAIT)
-        self.wait_for_next_turn()
+        return self.wait_for_next_turn()
     
-    def check_available_noble_phantasms(self):
-        """检查哪些从者的宝具可用"""
-        # 实际应用中使用图像识别检测宝具卡是否可用
-        # 这里简化返回所有从者都可用宝具
-        return [True, True, True]
+    def check_available_noble_phantasms(self, screen):
+        """检查哪些从者的宝具可用(需要选卡界面的截图)"""
+        available = self.get_card_reader().read_np_available(screen)
+        logger.info(f"可用宝具: {[index + 1 for index, ok in enumerate(available) if ok] or '无'}")
+        return available
     
     def use_effective_skills(self):
         """智能使用有效的技能"""
@@ -1009,11 +1536,19 @@ class StartTurn(CustomAction):
         # 实际应用中应根据当前从者状态和敌人情况决定使用哪些技能
         pass
     
-    def identify_advantage_cards(self):
-        """识别克制卡和高星卡"""
-        # 实际应用中使用图像识别识别卡牌类型和克制关系
-        # 这里简化返回前几张卡是克制卡
-        return [0, 1, 2]
+    def get_card_reader(self):
+        """选卡识别器按当前站位创建，换队伍或换人后重新加载卡面模板"""
+        from CardChain import CardLayout, CardReader
+        field = self._current_field()
+        svt_ids = tuple(field.svt_ids()) if field else ()
+        if self.card_reader is None or self.card_reader_svt_ids != svt_ids:
+            layout = CardLayout(
+                card_centers=[(card["x"], card["y"]) for card in self.CARDS],
+                np_centers=[(card["x"], card["y"]) for card in self.NOBLE_PHANTASM_CARDS]
+            )
+            self.card_reader = CardReader(layout, svt_ids, self.config.getfloat('Battle', 'card_match_threshold', 0.75))
+            self.card_reader_svt_ids = svt_ids
+        return self.card_reader
     
     def main_loop(self):
         """主循环控制逻辑"""
@@ -1022,41 +1557,29 @@ class StartTurn(CustomAction):
             BATTLE_LOGGER = BattleLogger()
         
         try:
+            # 1. 选择关卡
+            quest_name = self.select_quest()
+            if not quest_name:
+                logger.info("无法选择关卡，退出")
+                return
+            
+            # 2. 选择助战
+            if not self.select_support_servant():
+                logger.info("无法选择助战，退出")
+                return
+            
             while True:
-                # 1. 选择关卡
-                quest_name = self.select_quest()
-                if not quest_name:
-                    logger.info("无法选择关卡，退出")
-                    break
-                    
-                # 2. 选择助战
-                if not self.select_support_servant():
-                    logger.info("无法选择助战，退出")
-                    break
-                
                 # 3. 开始战斗并记录
                 BATTLE_LOGGER.log_battle_start(quest_name)
                 
                 # 4. 执行战斗流程
-                battle_success = self.execute_battle()
-                
-                # 5. 处理战斗结果
-                if battle_success:
-                    drops = self.detect_battle_drops()
-                    BATTLE_LOGGER.log_battle_end(CURRENT_TURN, drops)
-                    
-                    # 检查是否继续下一场战斗
-                    if not self.handle_post_battle_options():
-                        logger.info("战斗循环中断")
-                        break
-                else:
+                if not self.execute_battle():
                     logger.warning("战斗异常，退出循环")
                     break
-                    
-                # 6. 检查是否达到最大战斗次数
-                max_battles = self.config.getint('Battle', 'max_battles', fallback=0)
-                if max_battles > 0 and BATTLE_LOGGER.battle_count >= max_battles:
-                    logger.info(f"已达到设定的最大战斗次数: {max_battles}")
+                
+                # 5. 结算并通过连续出击直接进入下一场战斗(掉落、次数上限在其中处理)
+                if not self.handle_post_battle_options():
+                    logger.info("战斗循环中断")
                     break
         except KeyboardInterrupt:
             logger.info("用户中断，停止脚本")
@@ -1071,10 +1594,17 @@ class StartTurn(CustomAction):
                 logger.info(f"战斗报告已保存至: {BATTLE_LOGGER.log_file}")
     
     def select_quest(self):
-        """选择关卡"""
-        # 实际应用中应实现选择关卡的逻辑
-        # 这里简化返回一个默认关卡名
-        return "默认关卡"
+        """按配置导航到关卡，成功时返回关卡名称"""
+        from QuestNavigation import FGOLostbeltQuest
+        chapter = self.config.get('Quest', 'chapter', fallback='lb1')
+        node = self.config.getint('Quest', 'node', 0)
+        difficulty = self.config.getint('Quest', 'difficulty', 0)
+        quest_selector = FGOLostbeltQuest(self.ctx, self.config, lambda: ImageRecognition.capture_screen(self.ctx),
+                                          restore_ap=self.check_and_restore_ap, classifier=self.state_classifier)
+        ap_recovery = self.config.getboolean('Battle', 'auto_apple', False)
+        if not quest_selector.complete_quest_selection(chapter, node, difficulty, ap_recovery):
+            return None
+        return f"{chapter} #{node + 1}"
     
     def execute_battle(self):
         """执行战斗流程"""
@@ -1086,6 +1616,7 @@ class StartTurn(CustomAction):
 # 添加脚本入口点
 if __name__ == "__main__":
     # 直接启动时的初始化逻辑
+    setup_log_file()
     config = FGOBattleConfig()
     battle = StartTurn()
     battle.main_loop()
@@ -1100,80 +1631,26 @@ class SupportServantSelector:
         # 加载等待时间
         self.DIALOG_WAIT = self.config.getfloat('Timing', 'dialog_wait', fallback=1.0)
     
-    @safe_execute
+    @safe_execute(policy="dialog")
     def select_support(self):
         """选择助战从者"""
         if not self.config.getboolean('Support', 'enable_support_selection', fallback=True):
             # 如果没有启用助战选择，直接选第一个
             self.logger.info("助战选择功能未启用，选择默认助战")
-            self.ctx.controller.post_click(450, 300).wait()
+            self.ctx.tasker.controller.post_click(450, 300).wait()
             time.sleep(self.DIALOG_WAIT * 2)  # 等待助战加载
             return True
         
-        # 配置中指定的助战从者和礼装
-        target_servant = self.config.get('Support', 'servant', fallback=None)
-        target_craft_essence = self.config.get('Support', 'craft_essence', fallback=None)
-        target_skill = self.config.get('Support', 'skill', fallback=None)
-        
-        # 优先级：从者 > 礼装 > 技能
-        if not target_servant and not target_craft_essence and not target_skill:
-            # 没有指定任何筛选条件，选择第一个
-            self.logger.info("未指定助战筛选条件，选择第一个")
-            self.ctx.controller.post_click(450, 300).wait()
-            time.sleep(self.DIALOG_WAIT * 2)
-            return True
-        
-        # 滑动查找次数
-        max_scroll = self.config.getint('Support', 'max_refresh', fallback=5)
-        auto_refresh = self.config.getboolean('Support', 'auto_refresh', fallback=True)
-        scroll_count = 0
-        
         # 先使用职阶筛选(如果配置了)
         class_filter = self.config.get('Support', 'class_filter', fallback=None)
         if class_filter:
             self._apply_class_filter(class_filter)
         
-        while scroll_count < max_scroll:
-            found = False
-            
-            # 按优先级查找
-            if target_servant:
-                found = self._find_target_servant(target_servant)
-                if found:
-                    self.logger.info(f"找到目标从者: {target_servant}")
-                    return True
-            
-            if not found and target_craft_essence:
-                found = self._find_target_ce(target_craft_essence)
-                if found:
-                    self.logger.info(f"找到目标礼装: {target_craft_essence}")
-                    return True
-            
-            if not found and target_skill:
-                found = self._find_target_skill(target_skill)
-                if found:
-                    self.logger.info(f"找到目标技能: {target_skill}")
-                    return True
-            
-            # 没找到，滚动或刷新
-            if scroll_count < max_scroll - 1:
-                self._scroll_support_list()
-                scroll_count += 1
-                time.sleep(self.DIALOG_WAIT)
-            else:
-                # 达到最大滚动次数，考虑刷新
-                if auto_refresh:
-                    self.logger.info("刷新助战列表")
-                    self._refresh_support_list()
-                    time.sleep(3 * self.DIALOG_WAIT)
-                    scroll_count = 0  # 重置计数
-                else:
-                    break
-        
-        # 如果经过所有尝试仍未找到，选择第一个
-        self.logger.info("未找到指定助战，选择第一个")
-        self.ctx.controller.post_click(450, 300).wait()
-        time.sleep(2 * self.DIALOG_WAIT)
+        # 按 从者 > 礼装 > 技能 的优先级批量匹配每一页
+        from SupportScanner import SupportScanner
+        scanner = SupportScanner(self.ctx, self.config, lambda: ImageRecognition.capture_screen(self.ctx))
+        scanner.select()
+        time.sleep(self.DIALOG_WAIT)
         return True
     
     def _apply_class_filter(self, class_name):
@@ -1193,44 +1670,12 @@ class SupportServantSelector:
         if class_name in class_positions:
             pos = class_positions[class_name]
             self.logger.info(f"应用{class_name}职阶筛选")
-            self.ctx.controller.post_click(pos["x"], pos["y"]).wait()
+            self.ctx.tasker.controller.post_click(pos["x"], pos["y"]).wait()
             time.sleep(self.DIALOG_WAIT)
             return True
         else:
             self.logger.warning(f"未知的职阶名称: {class_name}")
             return False
-    
-    def _find_target_servant(self, servant_name):
-        """查找特定从者"""
-        # 实际实现中使用OCR或图像识别识别从者名称
-        # 这里仅作示例，返回False表示未找到
-        return False
-    
-    def _find_target_ce(self, ce_name):
-        """查找特定礼装"""
-        # 实际实现中使用OCR或图像识别识别礼装名称
-        # 这里仅作示例，返回False表示未找到
-        return False
-    
-    def _find_target_skill(self, skill_name):
-        """查找特定技能"""
-        # 实际实现中使用OCR或图像识别识别技能图标
-        # 这里仅作示例，返回False表示未找到
-        return False
-    
-    def _scroll_support_list(self):
-        """滚动助战列表"""
-        # 从下向上滑动
-        self.ctx.controller.post_swipe(640, 600, 640, 200, 500).wait()
-    
-    def _refresh_support_list(self):
-        """刷新助战列表"""
-        # 点击刷新按钮
-        self.ctx.controller.post_click(750, 200).wait()
-        time.sleep(self.DIALOG_WAIT)
-        
-        # 点击确认按钮
-        self.ctx.controller.post_click(550, 450).wait()
 
 
 # 使用示例
@@ -1240,38 +1685,81 @@ class StartLostbeltQuest(CustomAction):
     
     def __init__(self):
         super().__init__()
-        self.config = FGOBattleConfig()
+        self.config = FGOBattleConfig.shared()
     
     def run(
         self,
         context: Context,
         argv: CustomAction.RunArg,
     ) -> bool:
+        self.config = FGOBattleConfig.shared()
+        if not wait_for_schedule(context, self.config):
+            return True
         # 获取参数
         try:
-            # 解析参数
-            chapter = argv.get("chapter", "lb1")
-            node = int(argv.get("node", 0))
-            difficulty = int(argv.get("difficulty", 0))
-            ap_recovery = argv.get("ap_recovery", "false").lower() == "true"
+            # 解析参数，custom_action_param 为 JSON 字符串，未指定的项使用配置
+            params = json.loads(argv.custom_action_param or "{}") or {}
+            chapter = params.get("chapter", self.config.get('Quest', 'chapter', fallback='lb1'))
+            node = int(params.get("node", self.config.getint('Quest', 'node', 0)))
+            difficulty = int(params.get("difficulty", self.config.getint('Quest', 'difficulty', 0)))
+            ap_recovery = str(params.get("ap_recovery", "false")).lower() == "true"
             
-            # 创建关卡选择器
-            quest_selector = FGOLostbeltQuest(context, self.config)
+            # 创建关卡选择器，体力回复沿用战斗流程中的逻辑
+            from QuestNavigation import FGOLostbeltQuest
+            turn = StartTurn()
+            turn.ctx = context
+            quest_selector = FGOLostbeltQuest(context, self.config, lambda: ImageRecognition.capture_screen(context),
+                                              restore_ap=turn.check_and_restore_ap, classifier=turn.state_classifier)
             
             # 执行关卡选择流程
             success = quest_selector.complete_quest_selection(
                 chapter, node, difficulty, ap_recovery
             )
             
-            if success:
-                # 选择成功后开始战斗
-                context.run_action("StartTurn")
-                return True
-            else:
+            if not success:
+                return False
+            # 导航停在助战选择画面，选好助战后再开始战斗
+            if turn.select_support_servant() is not True:
+                logger.error("助战选择失败，停止出击")
                 return False
+            context.run_action("StartTurn")
+            return True
             
         except Exception as e:
             logger.error(f"启动白纸化地球关卡出击时出错: {e}")
             import traceback
             traceback.print_exc()
-            return False
\ No newline at end of file
+            return False
+
+
+@AgentServer.custom_action("FGOLogin")
+class FGOLogin(CustomAction):
+    """启动游戏后处理标题、资料更新、广告与公告，到达主界面后立即结束"""
+    
+    def __init__(self):
+        super().__init__()
+        self.config = FGOBattleConfig.shared()
+    
+    def run(
+        self,
+        context: Context,
+        argv: CustomAction.RunArg,
+    ) -> bool:
+        self.config = FGOBattleConfig.shared()
+        try:
+            from Login import LoginFlow
+            flow = LoginFlow.from_config(
+                context, self.config,
+                capture=lambda: ImageRecognition.capture_screen(context),
+                click=lambda x, y: context.tasker.controller.post_click(x, y).wait(),
+            )
+            # custom_action_param 可以覆盖超时，例如 {"timeout": 300}
+            params = json.loads(argv.custom_action_param or "{}") or {}
+            if "timeout" in params:
+                flow.timeout = float(params["timeout"])
+            return flow.run().success
+        except Exception as e:
+            logger.error(f"登录流程出错: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
@@ -4,6 +4,10 @@ from dataclasses import dataclass, field
 from typing import List, Optional, Any, Dict, Union
 from dataclasses_json import dataclass_json, config
 
+# 带有换人技能(第 3 个御主技能)的魔术礼装
+ORDER_CHANGE_MYSTIC_CODES = {20, 210}
+ORDER_CHANGE_SKILL = 2
+
 # ================================
 # 1. 基础动作定义 (修正了继承问题)
 # ================================
@@ -42,6 +46,11 @@ class SkillAction(BaseAction):
     skill: int
     svt: Optional[int] = None
     options: Optional[ActionOptions] = None
+    # 换人技能交换的 (在场位置, 替补位置)，解析时从 delegate.replaceMemberIndexes 填入
+    swap: Optional[List[int]] = None
+
+    def is_order_change(self, mystic_code_id: int) -> bool:
+        return self.svt is None and self.skill == ORDER_CHANGE_SKILL and mystic_code_id in ORDER_CHANGE_MYSTIC_CODES
 
 # ================================
 # 2. Turn 定义 (保持不变)
@@ -110,7 +119,7 @@ class OnFieldSvt:
 class Team:
     mysticCode: MysticCode
     onFieldSvts: List[OnFieldSvt]
-    backupSvts: List[Optional[Any]]
+    backupSvts: List[Optional[OnFieldSvt]]
     name: Optional[str] = None
 
 # ================================
@@ -145,24 +154,30 @@ class Result:
         current_turn_attacks: List[AttackAction] = []
         current_turn_number = 1
         
+        # 换人技能按使用顺序依次对应 replaceMemberIndexes 中的一项
+        mystic_code_id = self.team.mysticCode.mysticCodeId if self.team.mysticCode else 0
+        replace_indexes = list((self.delegate or {}).get('replaceMemberIndexes') or [])
+        
         for action_raw_dict in self.actions:
             action_type = action_raw_dict.get('type')
             
             if action_type == 'skill':
-                if current_turn_attacks:
-                    parsed_turns.append(Turn(
-                        turn_number=current_turn_number,
-                        skills=current_turn_skills,
-                        attacks=current_turn_attacks
-                    ))
-                    current_turn_number += 1
-                    current_turn_skills = []
-                    current_turn_attacks = []
-                
-                current_turn_skills.append(SkillAction.from_dict(action_raw_dict))
+                skill_action = SkillAction.from_dict(action_raw_dict)
+                if skill_action.swap is None and skill_action.is_order_change(mystic_code_id) and replace_indexes:
+                    skill_action.swap = list(replace_indexes.pop(0))
+                current_turn_skills.append(skill_action)
                 
             elif action_type == 'attack':
+                # 每次攻击结束一个回合，连续两次攻击之间没有技能也是两个回合
                 current_turn_attacks.append(AttackAction.from_dict(action_raw_dict))
+                parsed_turns.append(Turn(
+                    turn_number=current_turn_number,
+                    skills=current_turn_skills,
+                    attacks=current_turn_attacks
+                ))
+                current_turn_number += 1
+                current_turn_skills = []
+                current_turn_attacks = []
 
         if current_turn_skills or current_turn_attacks:
             parsed_turns.append(Turn(
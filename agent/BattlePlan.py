@@ -0,0 +1,132 @@
+"""把作业编译成按回合执行的计划，并静态推算每回合场上从者的站位"""
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from BattleData import AttackAction, OnFieldSvt, SkillAction
+
+logger = logging.getLogger("FGOBattle")
+
+NpKey = Tuple[int, int]  # (svtId, tdId)
+
+
+def roll_probability(options) -> float:
+    """一次操作达到作业中 random/threshold 要求的概率
+
+    threshold 为技能成功率(千分比)；random 为作业模拟时的伤害随机数(900-1099)，
+    实际伤害随机数均匀分布，要求高于 900 时才有打不死的可能。
+    """
+    if options is None:
+        return 1.0
+    probability = min(max(options.threshold, 0), 1000) / 1000.0
+    if options.random > 900:
+        probability *= min(max((1100 - options.random) / 200.0, 0.0), 1.0)
+    return probability
+
+
+@dataclass(frozen=True)
+class FieldState:
+    """某一时刻的站位：三个在场位置和三个替补位置上的从者"""
+    slots: Tuple[Optional[OnFieldSvt], ...]
+    backups: Tuple[Optional[OnFieldSvt], ...]
+
+    @classmethod
+    def from_team(cls, team) -> "FieldState":
+        slots = list(team.onFieldSvts or [])[:3]
+        backups = list(team.backupSvts or [])[:3]
+        return cls(tuple(slots + [None] * (3 - len(slots))), tuple(backups + [None] * (3 - len(backups))))
+
+    def servant(self, slot: int) -> Optional[OnFieldSvt]:
+        return self.slots[slot] if 0 <= slot < len(self.slots) else None
+
+    def swap(self, front: int, back: int) -> "FieldState":
+        """换人：在场位置 front 与替补位置 back 互换，返回新的站位"""
+        slots, backups = list(self.slots), list(self.backups)
+        slots[front], backups[back] = backups[back], slots[front]
+        return FieldState(tuple(slots), tuple(backups))
+
+    def np_key(self, slot: int) -> Optional[NpKey]:
+        svt = self.servant(slot)
+        return (svt.svtId, svt.tdId) if svt else None
+
+    def np_keys(self, slots: Sequence[int]) -> List[NpKey]:
+        return [key for key in (self.np_key(slot) for slot in slots) if key]
+
+    def svt_ids(self) -> List[int]:
+        return [svt.svtId if svt else 0 for svt in self.slots]
+
+
+@dataclass
+class CompiledTurn:
+    """一个回合的操作，以及攻击时的站位"""
+    number: int
+    skills: List[SkillAction]
+    attacks: List[AttackAction]
+    field: FieldState
+    np_keys: List[NpKey] = field(default_factory=list)
+
+    @property
+    def attack(self) -> Optional[AttackAction]:
+        return self.attacks[0] if self.attacks else None
+
+    @property
+    def crit_cards(self) -> int:
+        """作业要求暴击的指令卡数量"""
+        return sum(1 for action in self.attacks for attack in action.attacks if attack.critical and not attack.isTD)
+
+    @property
+    def success_probability(self) -> float:
+        """不考虑暴击时，本回合技能成功率与伤害随机数都满足作业的概率"""
+        probability = 1.0
+        for action in list(self.skills) + list(self.attacks):
+            probability *= roll_probability(action.options)
+        return probability
+
+
+class BattlePlan:
+    """编译后的作业
+
+    换人技能在编译时就确定了交换的位置，因此每回合的站位、宝具所属从者都能提前算出，
+    执行时不需要额外截图确认。
+    """
+
+    def __init__(self, turns: List[CompiledTurn], initial: FieldState):
+        self.turns = turns
+        self.initial = initial
+
+    @classmethod
+    def compile(cls, battle_data) -> "BattlePlan":
+        result = battle_data.data.result
+        state = initial = FieldState.from_team(result.team)
+        mystic_code_id = result.team.mysticCode.mysticCodeId if result.team.mysticCode else 0
+
+        turns = []
+        for turn in result.turns:
+            for skill in turn.skills:
+                if skill.is_order_change(mystic_code_id) and skill.swap:
+                    front, back = skill.swap
+                    if 0 <= front < 3 and 0 <= back < 3:
+                        state = state.swap(front, back)
+            np_slots = [attack.svt for action in turn.attacks for attack in action.attacks if attack.isTD]
+            turns.append(CompiledTurn(turn.turn_number, turn.skills, turn.attacks, state, state.np_keys(np_slots)))
+        return cls(turns, initial)
+
+    @property
+    def success_probability(self) -> float:
+        probability = 1.0
+        for turn in self.turns:
+            probability *= turn.success_probability
+        return probability
+
+    @property
+    def crit_cards(self) -> int:
+        return sum(turn.crit_cards for turn in self.turns)
+
+    def turn(self, index: int) -> Optional[CompiledTurn]:
+        return self.turns[index] if 0 <= index < len(self.turns) else None
+
+    def field_after(self, index: int) -> FieldState:
+        """执行完第 index 个回合(从 0 开始)后的站位，超出作业范围时为最后的站位"""
+        if not self.turns or index < 0:
+            return self.initial
+        return self.turns[min(index, len(self.turns) - 1)].field
@@ -0,0 +1,289 @@
+"""指令卡组合选择：识别卡色、所属从者和克制标记，在所有出卡组合中选出最优解"""
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from Vision import Roi, crop, load_template, match_in_roi, normalize_frame, to_gray
+
+logger = logging.getLogger("FGOBattle")
+
+BUSTER, ARTS, QUICK = 0, 1, 2
+COLOR_NAMES = ("buster", "arts", "quick")
+
+FACE_CARDS = 5
+NP_CARDS = 3
+ITEM_COUNT = FACE_CARDS + NP_CARDS  # 0-4 为普通指令卡，5-7 为三个从者的宝具卡
+
+# 所有 8P3 出卡顺序，只计算一次
+PERMUTATIONS = np.array(list(itertools.permutations(range(ITEM_COUNT), 3)), dtype=np.intp)
+
+# 卡色在三个位置上的伤害倍率
+CARD_DAMAGE = np.array([[1.5, 1.8, 2.1],
+                        [1.0, 1.2, 1.4],
+                        [0.8, 0.96, 1.12]])
+# 卡色在三个位置上的 NP 获取与掉星系数
+CARD_NP = np.array([[0.0, 0.0, 0.0],
+                    [3.0, 4.5, 6.0],
+                    [1.0, 1.5, 2.0]])
+CARD_STARS = np.array([[0.1, 0.15, 0.2],
+                       [0.0, 0.0, 0.0],
+                       [0.8, 1.3, 1.8]])
+
+
+@dataclass
+class Card:
+    """识别出的一张卡"""
+    color: int
+    owner: int = -1  # 所属从者在场上的位置，-1 表示未识别
+    multiplier: float = 1.0  # 克制 2.0 / 被克制 0.5
+    crit: Optional[float] = None  # 暴击概率(0-1)，None 表示没有识别出暴击率
+
+    @property
+    def known_crit(self) -> float:
+        """用于比较与打分的暴击率，未识别时按 0 计"""
+        return self.crit if self.crit is not None else 0.0
+
+
+@dataclass
+class ChainWeights:
+    """各项收益折算成分数的权重"""
+    damage: float = 1.0
+    np_gain: float = 0.02
+    stars: float = 0.05
+    np_damage: float = 6.0  # 宝具卡相对于普通卡的伤害折算
+
+
+def chain_scores(face: Sequence[Card], np_colors: Sequence[Optional[int]],
+                 weights: Optional[ChainWeights] = None) -> np.ndarray:
+    """对 PERMUTATIONS 中每一种出卡顺序打分，不可用的组合为 -inf
+
+    face 为 5 张普通指令卡，np_colors[i] 为第 i 个从者宝具卡的颜色，宝具不可用时为 None。
+    """
+    weights = weights or ChainWeights()
+
+    color = np.zeros(ITEM_COUNT, dtype=np.intp)
+    owner = np.full(ITEM_COUNT, -1, dtype=np.intp)
+    mult = np.ones(ITEM_COUNT)
+    crit = np.zeros(ITEM_COUNT)
+    available = np.zeros(ITEM_COUNT, dtype=bool)
+    for i, card in enumerate(face[:FACE_CARDS]):
+        color[i], owner[i], mult[i], crit[i] = card.color, card.owner, card.multiplier, card.known_crit
+        available[i] = True
+    for i, np_color in enumerate(np_colors[:NP_CARDS]):
+        if np_color is not None:
+            color[FACE_CARDS + i], owner[FACE_CARDS + i] = np_color, i
+            available[FACE_CARDS + i] = True
+    is_np = np.arange(ITEM_COUNT) >= FACE_CARDS
+    # 宝具卡的克制倍率取同一从者普通卡的值
+    for i in range(NP_CARDS):
+        same_owner = (owner[:FACE_CARDS] == i)
+        if same_owner.any():
+            mult[FACE_CARDS + i] = mult[:FACE_CARDS][same_owner].max()
+
+    c = color[PERMUTATIONS]
+    o = owner[PERMUTATIONS]
+    m = mult[PERMUTATIONS]
+    n = is_np[PERMUTATIONS]
+    position = np.arange(3)
+
+    first_buster = (c[:, :1] == BUSTER)
+    first_arts = (c[:, :1] == ARTS)
+    first_quick = (c[:, :1] == QUICK)
+    color_chain = (c == c[:, :1]).all(axis=1)
+    brave_chain = (o >= 0).all(axis=1) & (o == o[:, :1]).all(axis=1)
+
+    face_damage = CARD_DAMAGE[c, position] + 0.5 * first_buster
+    face_damage = face_damage + 0.2 * (color_chain & (c[:, 0] == BUSTER))[:, None]
+    face_damage *= 1.0 + crit[PERMUTATIONS]
+    damage = np.where(n, weights.np_damage, face_damage) * m
+    extra = np.where(brave_chain, np.where(color_chain, 3.5, 2.0) * m[:, 0], 0.0)
+    total_damage = damage.sum(axis=1) + extra
+
+    np_gain = (CARD_NP[c, position] + first_arts).sum(axis=1) + 20.0 * (color_chain & (c[:, 0] == ARTS))
+    stars = (CARD_STARS[c, position] + 0.2 * first_quick).sum(axis=1) * 10 + 10.0 * (color_chain & (c[:, 0] == QUICK))
+
+    scores = (weights.damage * total_damage + weights.np_gain * np_gain + weights.stars * stars)
+    # 宝具是可选的组合成员，按 np_damage 折算的伤害与普通卡一起比较
+    valid = available[PERMUTATIONS].all(axis=1)
+    return np.where(valid, scores, -np.inf)
+
+
+def best_chain(face: Sequence[Card], np_colors: Sequence[Optional[int]],
+               weights: Optional[ChainWeights] = None) -> List[Tuple[str, int]]:
+    """返回得分最高的出卡顺序，元素为 ("np", 从者位置) 或 ("card", 指令卡位置)"""
+    scores = chain_scores(face, np_colors, weights)
+    best = PERMUTATIONS[int(np.argmax(scores))]
+    return [("np", int(i) - FACE_CARDS) if i >= FACE_CARDS else ("card", int(i)) for i in best]
+
+
+COLOR_INDEX = {name: index for index, name in enumerate(COLOR_NAMES)}
+
+
+@dataclass
+class CardAssignment:
+    """作业中的指令卡对应到画面上的位置"""
+    positions: List[Optional[int]]  # 与作业中的攻击一一对应，宝具卡为 None
+    crit_probability: float  # 作业要求暴击的卡全部暴击的概率(不含暴击率未识别的卡)
+    unknown_crits: int = 0  # 要求暴击但暴击率未识别的卡数
+
+    @property
+    def failure_probability(self) -> float:
+        return 1.0 - self.crit_probability
+
+
+def assign_cards(attacks, cards: Sequence[Card]) -> CardAssignment:
+    """按作业选择画面上的指令卡
+
+    作业中的卡以 (从者, 卡色, 是否暴击) 描述，发牌是随机的，因此在识别出的卡中
+    找同一从者、同一卡色的卡；要求暴击的卡优先选暴击率最高的一张，其余卡选暴击率
+    最低的，把星星留给需要暴击的卡。无法识别所属从者时按作业中的位置选择。
+    暴击率未识别的卡不计入暴击概率(未知不等于不会暴击)，只计数。
+    """
+    used = set()
+    positions: List[Optional[int]] = []
+    crit_probability = 1.0
+    unknown_crits = 0
+    # 先为要求暴击的卡挑选，避免高暴击率的卡被普通卡占用
+    order = sorted(range(len(attacks)), key=lambda i: not attacks[i].critical)
+    chosen = {}
+    for i in order:
+        attack = attacks[i]
+        if attack.isTD:
+            continue
+        color = COLOR_INDEX.get(attack.cardType)
+        candidates = [j for j, card in enumerate(cards) if j not in used and card.owner == attack.svt]
+        same_color = [j for j in candidates if cards[j].color == color]
+        candidates = same_color or candidates
+        if candidates:
+            pick = max(candidates, key=lambda j: cards[j].known_crit) if attack.critical \
+                else min(candidates, key=lambda j: cards[j].known_crit)
+        elif 0 <= attack.card < len(cards) and attack.card not in used:
+            pick = attack.card
+        else:
+            pick = next((j for j in range(len(cards)) if j not in used), None)
+        if pick is None:
+            continue
+        used.add(pick)
+        chosen[i] = pick
+        if attack.critical:
+            if cards[pick].crit is None:
+                unknown_crits += 1
+            else:
+                crit_probability *= cards[pick].crit
+    for i in range(len(attacks)):
+        positions.append(chosen.get(i))
+    return CardAssignment(positions, crit_probability, unknown_crits)
+
+
+@dataclass
+class CardLayout:
+    """选卡界面布局(基准分辨率 1280x720)"""
+    card_centers: List[Tuple[int, int]]
+    np_centers: List[Tuple[int, int]]
+    card_size: Tuple[int, int] = (120, 140)
+    face_roi: Roi = (20, 10, 80, 70)  # 卡面头像，相对于卡片左上角
+    color_roi: Roi = (10, 90, 100, 45)  # 卡片下部的颜色区域
+    marker_roi: Roi = (30, -40, 60, 45)  # 卡片上方的克制/被克制标记
+    crit_roi: Roi = (0, 0, 60, 28)  # 卡片左上角的暴击率，例如 "30%"
+
+    def card_box(self, center: Tuple[int, int]) -> Roi:
+        w, h = self.card_size
+        return center[0] - w // 2, center[1] - h // 2, w, h
+
+
+class CardReader:
+    """从选卡界面截图识别卡色、所属从者与克制标记
+
+    所属从者通过 cards/<svtId>.png 卡面模板匹配(svt_ids 为当前三个在场位置的从者)，模板缺失时视为未识别，
+    此时不会计算 Brave Chain。
+    """
+
+    # 各卡色在 HSV 中的色相中心(OpenCV 0-180)
+    HUES = np.array([0.0, 110.0, 60.0])
+    # 可用的宝具卡中高饱和度像素的最低占比
+    NP_SATURATED_RATIO = 0.3
+
+    def __init__(self, layout: CardLayout, svt_ids: Sequence[int] = (), threshold: float = 0.75):
+        self.layout = layout
+        self.threshold = threshold
+        self.face_templates = [load_template(f"cards/{svt_id}.png") if svt_id else None for svt_id in svt_ids]
+        self.weak_template = load_template("cards/weak.png")
+        self.resist_template = load_template("cards/resist.png")
+
+    def _color(self, image: np.ndarray, roi: Roi) -> int:
+        region = crop(image, roi)
+        if region.size == 0 or region.ndim != 3:
+            return BUSTER
+        hsv = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)
+        saturated = hsv[..., 1] > 80
+        hue = hsv[..., 0][saturated] if saturated.any() else hsv[..., 0].ravel()
+        # 色相是环形的，红色同时落在 0 和 180 附近
+        distance = np.abs(hue[:, None].astype(np.float32) - self.HUES[None, :])
+        distance = np.minimum(distance, 180.0 - distance)
+        return int(np.bincount(distance.argmin(axis=1), minlength=3).argmax())
+
+    def _offset(self, box: Roi, roi: Roi) -> Roi:
+        return box[0] + roi[0], box[1] + roi[1], roi[2], roi[3]
+
+    def _owner(self, gray: np.ndarray, roi: Roi) -> int:
+        best, best_score = -1, self.threshold
+        for index, template in enumerate(self.face_templates):
+            if template is None:
+                continue
+            score, _ = match_in_roi(gray, template, roi)
+            if score >= best_score:
+                best, best_score = index, score
+        return best
+
+    def _multiplier(self, gray: np.ndarray, roi: Roi) -> float:
+        if self.weak_template is not None and match_in_roi(gray, self.weak_template, roi)[0] >= self.threshold:
+            return 2.0
+        if self.resist_template is not None and match_in_roi(gray, self.resist_template, roi)[0] >= self.threshold:
+            return 0.5
+        return 1.0
+
+    def read(self, image: np.ndarray, ocr=None) -> List[Card]:
+        """识别 5 张普通指令卡，传入 ocr 时同时读取每张卡分配到的暴击率"""
+        frame = normalize_frame(image)
+        gray = to_gray(frame)
+        boxes = [self.layout.card_box(center) for center in self.layout.card_centers]
+        crits: List[Optional[float]] = [None] * len(boxes)
+        if ocr is not None:
+            # 5 张卡的暴击率一次识别，识别失败的保持 None
+            percents = ocr.read_number_batch(frame, [self._offset(box, self.layout.crit_roi) for box in boxes])
+            crits = [min(percent, 100) / 100.0 if percent is not None else None for percent in percents]
+        cards = []
+        for box, crit in zip(boxes, crits):
+            cards.append(Card(
+                color=self._color(frame, self._offset(box, self.layout.color_roi)),
+                owner=self._owner(gray, self._offset(box, self.layout.face_roi)),
+                multiplier=self._multiplier(gray, self._offset(box, self.layout.marker_roi)),
+                crit=crit,
+            ))
+        return cards
+
+    def read_np_available(self, image: np.ndarray) -> List[bool]:
+        """宝具卡是否可用：NP 不足时宝具卡显示为灰色，卡片下部几乎没有高饱和度的像素"""
+        frame = normalize_frame(image)
+        available = []
+        for center in self.layout.np_centers:
+            region = crop(frame, self._offset(self.layout.card_box(center), self.layout.color_roi))
+            if region.size == 0 or region.ndim != 3:
+                available.append(False)
+                continue
+            saturated = cv2.cvtColor(region, cv2.COLOR_BGR2HSV)[..., 1] > 80
+            available.append(bool(saturated.mean() >= self.NP_SATURATED_RATIO))
+        return available
+
+    def read_np_colors(self, image: np.ndarray, available: Sequence[bool]) -> List[Optional[int]]:
+        """识别可用宝具卡的颜色，不可用的为 None"""
+        frame = normalize_frame(image)
+        colors = []
+        for center, is_available in zip(self.layout.np_centers, available):
+            box = self.layout.card_box(center)
+            colors.append(self._color(frame, self._offset(box, self.layout.color_roi)) if is_available else None)
+        return colors
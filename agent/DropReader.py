@@ -0,0 +1,157 @@
+"""掉落识别与掉率统计"""
+import logging
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from Vision import Roi, normalize_frame, normalize_patches, resource_dir, stack_rois
+
+logger = logging.getLogger("FGOBattle")
+
+
+@dataclass
+class DropLayout:
+    """掉落结算界面的物品格子布局(基准分辨率 1280x720)"""
+    origin: Tuple[int, int] = (245, 180)
+    columns: int = 7
+    rows: int = 3
+    pitch: Tuple[int, int] = (115, 125)
+    icon_size: Tuple[int, int] = (84, 84)
+    # 数量文字相对于格子左上角的区域
+    count_roi: Roi = (10, 84, 84, 28)
+
+    def slots(self) -> List[Roi]:
+        x0, y0 = self.origin
+        dx, dy = self.pitch
+        w, h = self.icon_size
+        return [(x0 + c * dx, y0 + r * dy, w, h) for r in range(self.rows) for c in range(self.columns)]
+
+
+class ItemIconIndex:
+    """预加载的物品图标索引，所有图标被缩放到统一尺寸并预先归一化"""
+
+    def __init__(self, names: List[str], icons: np.ndarray):
+        self.names = names
+        self.vectors = normalize_patches(icons) if len(icons) else np.zeros((0, 0), np.float32)
+
+    @classmethod
+    def load(cls, icon_size: Tuple[int, int], directory: Optional[Path] = None) -> "ItemIconIndex":
+        """从 resource/image/items 加载所有图标，文件名即物品名"""
+        directory = directory or resource_dir() / "image" / "items"
+        names, icons = [], []
+        for path in sorted(directory.glob("*.png")) if directory.exists() else []:
+            image = cv2.imdecode(np.fromfile(str(path), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                logger.warning(f"物品图标无法解码: {path}")
+                continue
+            names.append(path.stem)
+            icons.append(cv2.resize(image, icon_size, interpolation=cv2.INTER_AREA))
+        logger.info(f"已加载 {len(names)} 个物品图标")
+        return cls(names, np.stack(icons) if icons else np.zeros((0, icon_size[1], icon_size[0]), np.uint8))
+
+    def match(self, patches: np.ndarray, threshold: float) -> List[Optional[str]]:
+        """为每个格子返回最相似的物品名，低于阈值时为 None"""
+        if not self.names:
+            return [None] * len(patches)
+        scores = normalize_patches(patches) @ self.vectors.T
+        best = scores.argmax(axis=1)
+        return [self.names[i] if scores[n, i] >= threshold else None for n, i in enumerate(best)]
+
+
+class DropReader:
+    """从一张掉落结算截图中识别物品及数量"""
+
+    def __init__(self, layout: Optional[DropLayout] = None, index: Optional[ItemIconIndex] = None,
+                 threshold: float = 0.75, empty_std: float = 8.0):
+        self.layout = layout or DropLayout()
+        self.index = index or ItemIconIndex.load(self.layout.icon_size)
+        self.threshold = threshold
+        self.empty_std = empty_std
+
+    def read(self, image: np.ndarray, ocr=None) -> Optional[Dict[str, int]]:
+        """识别所有格子的物品，ocr 为空时每格按 1 个计数
+
+        没有物品图标(resource/image/items 为空)时无法识别，返回 None，不能当作没有掉落
+        """
+        if not self.index.names:
+            return None
+        frame = normalize_frame(image)
+        slots = self.layout.slots()
+        patches = stack_rois(frame, slots, self.layout.icon_size)
+        # 空格子几乎没有纹理，直接跳过
+        occupied = patches.reshape(len(patches), -1).std(axis=1) > self.empty_std
+        if not occupied.any():
+            return {}
+
+        names = self.index.match(patches[occupied], self.threshold)
+        found = [(slot, name) for slot, name in zip(np.array(slots)[occupied], names) if name is not None]
+        counts = [1] * len(found)
+        if ocr is not None and found:
+            # 所有格子的数量一次识别
+            cx, cy, cw, ch = self.layout.count_roi
+            rois = [(int(x) + cx, int(y) + cy, cw, ch) for (x, y, _, _), _ in found]
+            counts = [count or 1 for count in ocr.read_number_batch(frame, rois)]
+        drops: Dict[str, int] = {}
+        for (_, name), count in zip(found, counts):
+            drops[name] = drops.get(name, 0) + count
+        return drops
+
+
+@dataclass
+class ItemRate:
+    """某关卡中单个物品的掉落统计"""
+    item: str
+    runs: int
+    total: int
+    mean: float            # 每场平均掉落数
+    mean_ci: Tuple[float, float]
+    chance: float          # 至少掉落一个的概率
+    chance_ci: Tuple[float, float]
+
+
+def wilson_interval(successes: int, trials: int, z: float = 1.96) -> Tuple[float, float]:
+    """二项分布比例的 Wilson 置信区间"""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denom = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denom
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+class DropStats:
+    """按关卡统计掉率
+
+    掉落只写入出击历史数据库(RunHistory 的 drops 表)，这里不另外保存记录；
+    统计时由 SQLite 聚合出计数、平方和等充分统计量，再计算掉率与置信区间。
+    """
+
+    def __init__(self, history):
+        self.history = history
+
+    def rates(self, quest_id, z: float = 1.96, days: Optional[float] = None) -> List[ItemRate]:
+        """某关卡各物品的掉率与置信区间，按每场平均掉落数降序"""
+        runs, items = self.history.drop_summary(quest_id, days)
+        if runs == 0:
+            return []
+        rates = []
+        for item, (total, sum_sq, runs_with) in items.items():
+            mean = total / runs
+            variance = max(0.0, sum_sq / runs - mean * mean)
+            half = z * math.sqrt(variance / runs) if runs > 1 else float("inf")
+            rates.append(ItemRate(
+                item=item,
+                runs=runs,
+                total=total,
+                mean=mean,
+                mean_ci=(max(0.0, mean - half), mean + half),
+                chance=runs_with / runs,
+                chance_ci=wilson_interval(runs_with, runs, z),
+            ))
+        rates.sort(key=lambda r: r.mean, reverse=True)
+        return rates
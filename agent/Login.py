@@ -0,0 +1,173 @@
+"""启动登录：标题 → 资料更新 → 广告 → 公告 → 主界面，每一步由画面状态驱动
+
+启动游戏后不再固定等待，而是轮询画面状态：出现弹窗立即关闭，到达主界面立即结束。
+状态先用锚点模板识别，模板缺失或未命中时退回整屏 OCR 按关键字判断；
+整屏 OCR 的结果按画面签名缓存，静止的加载画面与标题画面不会重复识别。
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from maa.pipeline import JOCR, JRecognitionType
+
+from Recognition import CompiledRecognition
+from RepeatLoop import FramePrefetcher
+from ScreenState import LOGIN_ANCHORS, ScreenState, StateClassifier
+from Vision import Roi, frame_signature, normalize_frame
+
+logger = logging.getLogger("FGOBattle")
+
+# 各状态的关键字，按优先级排列(与原 pipeline 中的 OCR 节点一致)
+LOGIN_TEXTS: List[Tuple[str, Tuple[str, ...]]] = [
+    (ScreenState.LOGIN_REQUIRED, ("请输入手机号",)),
+    (ScreenState.UPDATE_PROMPT, ("开始更新资料",)),
+    (ScreenState.CM_PROMPT, ("不收看",)),
+    (ScreenState.TITLE, ("请点击游戏界面", "点击屏幕")),
+    (ScreenState.ANNOUNCEMENT, ("关闭",)),
+]
+
+STATE_NAMES = {
+    ScreenState.UNKNOWN: "加载",
+    ScreenState.TITLE: "标题",
+    ScreenState.UPDATE_PROMPT: "资料更新",
+    ScreenState.CM_PROMPT: "广告",
+    ScreenState.ANNOUNCEMENT: "公告/弹窗",
+    ScreenState.LOGIN_REQUIRED: "需要登录",
+    ScreenState.HOME: "主界面",
+}
+
+
+class TextStateDetector:
+    """整屏 OCR 一次，按关键字判断登录流程中的画面状态，返回匹配文字的位置用于点击"""
+
+    def __init__(self, context, home_texts: Sequence[str], model: str = "", memo_size: int = 16):
+        self.context = context
+        self.texts = LOGIN_TEXTS + [(ScreenState.HOME, tuple(home_texts))]
+        self.memo_size = memo_size
+        self._memo: Dict[bytes, list] = {}
+        self._ocr = CompiledRecognition.compile("login_ocr", JRecognitionType.OCR, JOCR(model=model))
+
+    def _results(self, frame: np.ndarray) -> list:
+        signature = frame_signature(frame)
+        if signature in self._memo:
+            return self._memo[signature]
+        detail = self._ocr.run(self.context, frame)
+        results = [(r.text, tuple(r.box)) for r in (detail.all_results if detail else [])]
+        if len(self._memo) >= self.memo_size:
+            self._memo.pop(next(iter(self._memo)))
+        self._memo[signature] = results
+        return results
+
+    def detect(self, frame: np.ndarray) -> Tuple[str, Optional[Roi]]:
+        results = self._results(frame)
+        for state, keywords in self.texts:
+            # 同一关键字出现多次时取最后一个(例如 "不收看" 按钮在提示文字之后)
+            matched = [box for text, box in results if any(keyword in text for keyword in keywords)]
+            if matched:
+                return state, matched[-1]
+        return ScreenState.UNKNOWN, None
+
+
+@dataclass
+class LoginResult:
+    success: bool
+    elapsed: float
+    stages: List[Tuple[str, float]] = field(default_factory=list)  # (状态, 停留秒数)，按出现顺序
+
+    def summary(self) -> str:
+        stages = " → ".join(f"{STATE_NAMES.get(state, state)} {seconds:.1f}s" for state, seconds in self.stages)
+        return f"登录{'完成' if self.success else '失败'}，用时 {self.elapsed:.1f} 秒: {stages}"
+
+
+class LoginFlow:
+    """启动后的登录流程，调用前游戏已经启动"""
+
+    # 点击命中位置即可推进的状态
+    CLICK_STATES = (ScreenState.TITLE, ScreenState.UPDATE_PROMPT, ScreenState.CM_PROMPT, ScreenState.ANNOUNCEMENT)
+
+    def __init__(self, capture: Callable[[], np.ndarray], click: Callable[[int, int], None],
+                 classifier: StateClassifier, text_detector: Optional[TextStateDetector] = None,
+                 timeout: float = 180.0, poll_interval: float = 0.5, ocr_interval: float = 1.0,
+                 click_cooldown: float = 1.5):
+        self.capture = capture
+        self.click = click
+        self.classifier = classifier
+        self.text_detector = text_detector
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.ocr_interval = ocr_interval
+        self.click_cooldown = click_cooldown
+        self._last_ocr = float("-inf")
+
+    @classmethod
+    def from_config(cls, context, config, capture: Callable[[], np.ndarray],
+                    click: Callable[[int, int], None]) -> "LoginFlow":
+        home_texts = [t.strip() for t in config.get('Login', 'home_text', fallback='召唤,编队').split(',') if t.strip()]
+        detector = None
+        if config.getboolean('Login', 'ocr_fallback', True):
+            detector = TextStateDetector(context, home_texts, model=config.get('OCR', 'model', fallback=''))
+        return cls(
+            capture, click, StateClassifier(LOGIN_ANCHORS), detector,
+            timeout=config.getfloat('Login', 'timeout', 180.0),
+            poll_interval=config.getfloat('Login', 'poll_interval', 0.5),
+            ocr_interval=config.getfloat('Login', 'ocr_interval', 1.0),
+            click_cooldown=config.getfloat('Login', 'click_cooldown', 1.5),
+        )
+
+    def detect(self, frame: np.ndarray) -> Tuple[str, Optional[Roi]]:
+        """先用锚点模板识别，未命中时按间隔退回整屏 OCR"""
+        state, box = self.classifier.match(frame)
+        if state != ScreenState.UNKNOWN or self.text_detector is None:
+            return state, box
+        now = time.monotonic()
+        if now - self._last_ocr < self.ocr_interval:
+            return ScreenState.UNKNOWN, None
+        self._last_ocr = now
+        return self.text_detector.detect(normalize_frame(frame))
+
+    def run(self) -> LoginResult:
+        started_at = time.monotonic()
+        stages: List[Tuple[str, float]] = []
+        stage, stage_started = None, started_at
+        last_click: Dict[str, float] = {}
+        prefetcher = FramePrefetcher(self.capture)
+
+        def finish(success: bool) -> LoginResult:
+            now = time.monotonic()
+            if stage is not None:
+                stages.append((stage, now - stage_started))
+            result = LoginResult(success, now - started_at, stages)
+            (logger.info if success else logger.warning)(result.summary())
+            return result
+
+        try:
+            while time.monotonic() - started_at < self.timeout:
+                state, box = self.detect(prefetcher.next())
+                now = time.monotonic()
+                if state != stage:
+                    if stage is not None:
+                        stages.append((stage, now - stage_started))
+                    logger.info(f"登录流程: {STATE_NAMES.get(state, state)} ({now - started_at:.1f}s)")
+                    stage, stage_started = state, now
+
+                if state == ScreenState.HOME:
+                    return finish(True)
+                if state == ScreenState.LOGIN_REQUIRED:
+                    logger.error("需要手动输入账号登录")
+                    return finish(False)
+                if state in self.CLICK_STATES and box is not None:
+                    # 点击后画面切换前可能仍识别为同一状态，冷却期内不重复点击
+                    if now - last_click.get(state, float("-inf")) >= self.click_cooldown:
+                        x, y, w, h = box
+                        self.click(x + w // 2, y + h // 2)
+                        last_click[state] = now
+                        prefetcher.invalidate()
+                        continue
+                time.sleep(self.poll_interval)
+
+            logger.warning(f"登录流程超时 ({self.timeout:.0f} 秒)")
+            return finish(False)
+        finally:
+            prefetcher.close()
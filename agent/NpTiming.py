@@ -0,0 +1,157 @@
+"""宝具动画时长模型：按从者学习实际时长，并以画面变化确认动画结束"""
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ScreenState import ScreenState
+from Vision import frame_difference
+
+logger = logging.getLogger("FGOBattle")
+
+NpKey = Tuple[int, int]  # (svtId, tdId)
+
+
+class NpTimingModel:
+    """按 (svtId, tdId) 记录宝具动画时长的指数滑动平均，并持久化到 JSON"""
+
+    def __init__(self, path="np_timing.json", alpha: float = 0.3, default: float = 10.0,
+                 card_time: float = 4.0):
+        self.path = Path(path)
+        self.alpha = alpha
+        self.default = default
+        self.card_time = card_time  # 普通指令卡攻击动画与回合切换的固定时长
+        self.entries: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"宝具时长文件读取失败，将重新学习: {e}")
+            return {}
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(np_key: NpKey) -> str:
+        return f"{np_key[0]}:{np_key[1]}"
+
+    def duration(self, np_key: NpKey) -> float:
+        entry = self.entries.get(self._key(np_key))
+        return entry["mean"] if entry else self.default
+
+    def expected(self, np_keys: Iterable[NpKey]) -> float:
+        """本回合(可能有多个宝具连发)的预计动画总时长"""
+        return self.card_time + sum(self.duration(k) for k in np_keys)
+
+    def update(self, np_keys: List[NpKey], measured: float):
+        """用一回合的实测总时长更新模型
+
+        多个宝具连发时只能测到总时长，按各自当前估计值的比例分摊。
+        """
+        if not np_keys:
+            return
+        np_time = max(0.0, measured - self.card_time)
+        estimates = [self.duration(k) for k in np_keys]
+        total = sum(estimates) or len(np_keys)
+        for np_key, estimate in zip(np_keys, estimates):
+            share = np_time * (estimate / total)
+            key = self._key(np_key)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = {"mean": share, "count": 1}
+            else:
+                entry["mean"] += self.alpha * (share - entry["mean"])
+                entry["count"] += 1
+        self.save()
+
+
+@dataclass
+class AnimationResult:
+    duration: float
+    state: str
+    skipped: bool = False
+    timed_out: bool = False
+
+    @property
+    def confirmed(self) -> bool:
+        """是否由状态识别确认了动画结束
+
+        画面静止与超时只是推断，静止可能出现在动画中途，只有确认的结束时刻才能用来学习时长。
+        """
+        return self.state in AnimationWatcher.DONE_STATES
+
+
+class AnimationWatcher:
+    """等待攻击动画结束
+
+    先按预计时长提前 lead 秒休眠一次，之后轮询截图：识别到指令界面、结算等状态，
+    或者状态未知但连续多帧静止时即认为动画结束。开启跳过时从第一帧开始轮询，
+    一旦出现可跳过的标志立即点击。
+    """
+
+    DONE_STATES = (ScreenState.BATTLE_COMMAND, ScreenState.BATTLE_RESULT, ScreenState.DROP_RESULT)
+
+    def __init__(self, capture: Callable[[], np.ndarray], classifier, click: Callable[[int, int], None],
+                 interval: float = 0.25, lead: float = 1.5, still_frames: int = 3,
+                 still_threshold: float = 1.5, skip_position: Optional[Tuple[int, int]] = None):
+        self.capture = capture
+        self.classifier = classifier
+        self.click = click
+        self.interval = interval
+        self.lead = lead
+        self.still_frames = still_frames
+        self.still_threshold = still_threshold
+        self.skip_position = skip_position
+
+    def wait(self, expected: float, timeout: float) -> AnimationResult:
+        start = time.monotonic()
+        skipped = False
+
+        if self.skip_position is None:
+            time.sleep(max(0.0, expected - self.lead))
+
+        previous = None
+        still = 0
+        state = ScreenState.UNKNOWN
+        timed_out = False
+        while True:
+            frame = self.capture()
+            state = self.classifier.classify(frame)
+            elapsed = time.monotonic() - start
+            if state in self.DONE_STATES:
+                break
+
+            if self.skip_position is not None and not skipped and state == ScreenState.NP_SKIP:
+                self.click(*self.skip_position)
+                skipped = True
+                logger.info(f"在 {elapsed:.2f} 秒时跳过宝具动画")
+
+            if previous is not None and frame_difference(previous, frame) < self.still_threshold:
+                still += 1
+            else:
+                still = 0
+            previous = frame
+
+            # 无法识别状态时，以画面静止作为结束依据，但至少等到预计时长的一半
+            if state == ScreenState.UNKNOWN and still >= self.still_frames and elapsed >= expected * 0.5:
+                break
+            if elapsed >= timeout:
+                logger.warning(f"等待攻击动画超时 ({timeout:.1f} 秒)")
+                timed_out = True
+                break
+            time.sleep(self.interval)
+
+        return AnimationResult(time.monotonic() - start, state, skipped, timed_out)
@@ -0,0 +1,211 @@
+"""通过 MaaFramework 已加载的 OCR 模型读取截图中的文字
+
+同一张截图的多个 ROI 拼接成一张图，只做一次 OCR 推理；识别结果按截取区域的差值哈希缓存，
+画面上不变的文字(按钮、标题、未变化的数字)不会重复识别。
+"""
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from maa.pipeline import JOCR, JRecognitionType
+
+from Recognition import CompiledRecognition
+from Vision import Roi, crop, normalize_frame
+
+logger = logging.getLogger("FGOBattle")
+
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+# 拼接图中相邻区域之间的空白，避免文字检测把上下两个区域连成一行
+MOSAIC_GAP = 16
+
+
+# 差值哈希网格的上限，文字区域一般不超过 128x32，网格与原图接近时字形的差别不会丢失
+DHASH_MAX_SIZE = (128, 32)
+
+
+def dhash(image: np.ndarray, max_size: Tuple[int, int] = DHASH_MAX_SIZE) -> bytes:
+    """差值哈希：缩放到 (宽+1, 高) 的灰度图后比较相邻像素
+
+    只反映字形而不受亮度影响；网格随区域大小变化，区域尺寸也计入哈希，不同 ROI 不会互相命中。
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    width, height = min(gray.shape[1], max_size[0]), min(gray.shape[0], max_size[1])
+    small = cv2.resize(gray, (width + 1, height), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return gray.shape[0].to_bytes(2, "little") + gray.shape[1].to_bytes(2, "little") + bits.tobytes()
+
+
+class OcrCache:
+    """按差值哈希缓存识别结果的 LRU 表，各个 OcrReader 共用"""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            text = self._items.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key: bytes, text: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = text
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+_shared_cache = OcrCache()
+
+
+def shared_cache() -> OcrCache:
+    return _shared_cache
+
+
+def build_mosaic(tiles: Sequence[np.ndarray], gap: int = MOSAIC_GAP) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """把多个区域纵向拼接成一张图，返回 (拼接图, 每个区域的 (起始行, 结束行))"""
+    width = max(tile.shape[1] for tile in tiles)
+    height = sum(tile.shape[0] for tile in tiles) + gap * (len(tiles) + 1)
+    mosaic = np.zeros((height, width, 3), dtype=np.uint8)
+    spans = []
+    y = gap
+    for tile in tiles:
+        if tile.ndim == 2:
+            tile = cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
+        h, w = tile.shape[:2]
+        mosaic[y:y + h, :w] = tile
+        spans.append((y, y + h))
+        y += h + gap
+    return mosaic, spans
+
+
+def _join(results) -> str:
+    """多段文字按从左到右拼接"""
+    return "".join(r.text for r in sorted(results, key=lambda r: (r.box[0], r.box[1])))
+
+
+class OcrReader:
+    """对同一张截图的多个 ROI 做文字识别
+
+    识别直接作用于传入的截图，不会重新截图，也不会修改 pipeline。
+    多个未命中缓存的 ROI 拼接成一张图后一次识别，再按文字框的纵向位置分回各个 ROI。
+    """
+
+    def __init__(self, context, model: str = "", cache: Optional[OcrCache] = None, batch: bool = True):
+        self.context = context
+        self.cache = cache if cache is not None else shared_cache()
+        self.batch = batch
+        # 所有区域与拼接图都用同一组参数做整图识别
+        self._ocr = CompiledRecognition.compile("ocr", JRecognitionType.OCR, JOCR(model=model))
+
+    @classmethod
+    def from_config(cls, context, config) -> "OcrReader":
+        """按 [OCR] 配置创建，model 为 resource/model/ocr 下的子目录，留空使用默认模型"""
+        cache = shared_cache()
+        cache.max_size = config.getint('OCR', 'cache_size', 512)
+        return cls(context, model=config.get('OCR', 'model', fallback=''), cache=cache,
+                   batch=config.getboolean('OCR', 'batch', True))
+
+    def _recognize(self, image: np.ndarray):
+        detail = self._ocr.run(self.context, np.ascontiguousarray(image))
+        if detail is None or not detail.all_results:
+            return []
+        return detail.all_results
+
+    def _recognize_tiles(self, tiles: List[np.ndarray]) -> List[str]:
+        if len(tiles) == 1 or not self.batch:
+            return [_join(self._recognize(tile)) for tile in tiles]
+        mosaic, spans = build_mosaic(tiles)
+        grouped: Dict[int, list] = {index: [] for index in range(len(tiles))}
+        for result in self._recognize(mosaic):
+            _, y, _, h = result.box
+            center = y + h / 2
+            for index, (top, bottom) in enumerate(spans):
+                if top - MOSAIC_GAP / 2 <= center < bottom + MOSAIC_GAP / 2:
+                    grouped[index].append(result)
+                    break
+        return [_join(grouped[index]) for index in range(len(tiles))]
+
+    def read_batch(self, image: np.ndarray, rois: Sequence[Roi]) -> List[str]:
+        """识别同一张截图的多个 ROI，返回与 rois 一一对应的文字"""
+        frame = normalize_frame(image)
+        texts: List[Optional[str]] = [None] * len(rois)
+        pending: Dict[bytes, List[int]] = {}
+        tiles: Dict[bytes, np.ndarray] = {}
+        for index, roi in enumerate(rois):
+            tile = crop(frame, tuple(roi))
+            if tile.size == 0:
+                texts[index] = ""
+                continue
+            key = dhash(tile)
+            if key in pending:
+                pending[key].append(index)
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                texts[index] = cached
+            else:
+                pending[key] = [index]
+                tiles[key] = tile
+
+        if pending:
+            keys = list(pending)
+            for key, text in zip(keys, self._recognize_tiles([tiles[key] for key in keys])):
+                self.cache.put(key, text)
+                for index in pending[key]:
+                    texts[index] = text
+            logger.debug(f"OCR 识别 {len(keys)} 个区域，{len(rois) - len(keys)} 个命中缓存")
+        return texts
+
+    def read(self, image: np.ndarray, roi: Roi) -> str:
+        """识别 ROI 内的文字，多段文字按从左到右拼接"""
+        return self.read_batch(image, [roi])[0]
+
+    @staticmethod
+    def _numbers(text: str) -> List[int]:
+        text = text.replace(",", "").replace(" ", "")
+        return [int(n) for n in _NUMBER_PATTERN.findall(text)]
+
+    def read_numbers(self, image: np.ndarray, roi: Roi) -> List[int]:
+        """识别 ROI 内的所有整数，例如 "123/145" 返回 [123, 145]"""
+        return self._numbers(self.read(image, roi))
+
+    def read_number(self, image: np.ndarray, roi: Roi) -> Optional[int]:
+        """识别 ROI 内的第一个整数，识别失败时返回 None"""
+        numbers = self.read_numbers(image, roi)
+        return numbers[0] if numbers else None
+
+    def read_numbers_batch(self, image: np.ndarray, rois: Sequence[Roi]) -> List[List[int]]:
+        """一次识别多个 ROI 内的所有整数"""
+        return [self._numbers(text) for text in self.read_batch(image, rois)]
+
+    def read_number_batch(self, image: np.ndarray, rois: Sequence[Roi]) -> List[Optional[int]]:
+        """一次识别多个 ROI 内的第一个整数，识别失败的为 None"""
+        return [numbers[0] if numbers else None for numbers in self.read_numbers_batch(image, rois)]
+
+    def read_fraction(self, image: np.ndarray, roi: Roi) -> Optional[Tuple[int, int]]:
+        """识别 "当前/上限" 形式的数值"""
+        numbers = self.read_numbers(image, roi)
+        if len(numbers) < 2:
+            return None
+        return numbers[0], numbers[1]
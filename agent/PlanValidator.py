@@ -0,0 +1,162 @@
+"""出击前检查队伍作业：从者、技能、目标、指令卡索引是否与队伍一致"""
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from BattlePlan import FieldState
+
+logger = logging.getLogger("FGOBattle")
+
+FIELD_SLOTS = 3
+SKILLS_PER_SERVANT = 3
+MASTER_SKILLS = 3
+CARDS_PER_SERVANT = 5
+ENEMY_SLOTS = 3
+
+ERROR = "error"
+WARNING = "warning"
+
+
+@dataclass
+class ValidationIssue:
+    level: str
+    turn: Optional[int]  # 从 1 开始的回合号，与回合无关时为 None
+    message: str
+
+    def __str__(self):
+        where = f"第 {self.turn} 回合: " if self.turn else ""
+        return f"[{self.level}] {where}{self.message}"
+
+
+class PlanValidator:
+    """对解析后的 BattleData 做静态检查，在消耗体力之前发现作业错误"""
+
+    def __init__(self, max_waves: int = 3):
+        self.max_waves = max_waves
+        self.issues: List[ValidationIssue] = []
+
+    def _add(self, level, turn, message):
+        self.issues.append(ValidationIssue(level, turn, message))
+
+    def validate(self, battle_data) -> List[ValidationIssue]:
+        self.issues = []
+        result = battle_data.data.result
+        team = result.team
+
+        on_field = list(team.onFieldSvts or [])
+        backups = list(team.backupSvts or [])
+        if not on_field:
+            self._add(ERROR, None, "队伍中没有在场从者")
+            return self.issues
+        if len(on_field) > FIELD_SLOTS:
+            self._add(ERROR, None, f"在场从者 {len(on_field)} 名，超过 {FIELD_SLOTS} 名")
+        if len(backups) > FIELD_SLOTS:
+            self._add(ERROR, None, f"替补从者 {len(backups)} 名，超过 {FIELD_SLOTS} 名")
+        for index, svt in enumerate(on_field):
+            if len(svt.skillIds) != SKILLS_PER_SERVANT:
+                self._add(WARNING, None, f"从者 {index+1} (svtId {svt.svtId}) 技能数量为 {len(svt.skillIds)}")
+
+        state = FieldState.from_team(team)
+        mystic_code = team.mysticCode.mysticCodeId if team.mysticCode else 0
+        used_backups = set()
+
+        if not result.turns:
+            self._add(ERROR, None, "作业中没有任何操作")
+            return self.issues
+        if len(result.turns) < self.max_waves:
+            self._add(WARNING, None, f"作业只有 {len(result.turns)} 回合，少于 {self.max_waves} 波，剩余波次将使用自动战斗")
+
+        for turn in result.turns:
+            number = turn.turn_number
+            for skill in turn.skills:
+                self._check_skill(number, skill, state, mystic_code)
+                if skill.is_order_change(mystic_code):
+                    state = self._check_swap(number, skill, state, used_backups)
+            if not turn.attacks:
+                self._add(WARNING, number, "只有技能操作，没有攻击")
+            for action in turn.attacks:
+                self._check_attack(number, action, state)
+        return self.issues
+
+    def _check_swap(self, turn, skill, state, used_backups):
+        """检查换人的位置是否有效，返回换人后的站位"""
+        if not skill.swap or len(skill.swap) != 2:
+            self._add(ERROR, turn, "使用了换人技能，但作业中没有对应的换人位置 (replaceMemberIndexes)")
+            return state
+        front, back = skill.swap
+        if not 0 <= front < FIELD_SLOTS or state.servant(front) is None:
+            self._add(ERROR, turn, f"换人: 在场位置 {front+1} 没有从者")
+            return state
+        if not 0 <= back < FIELD_SLOTS or state.backups[back] is None:
+            self._add(ERROR, turn, f"换人: 替补位置 {back+1} 没有从者")
+            return state
+        if back in used_backups:
+            self._add(WARNING, turn, f"换人: 替补位置 {back+1} 已经换上过场")
+        used_backups.add(back)
+        return state.swap(front, back)
+
+    def _check_targets(self, turn, options, state, what):
+        if options is None:
+            return
+        if not -1 <= options.playerTarget < FIELD_SLOTS:
+            self._add(ERROR, turn, f"{what}的我方目标 {options.playerTarget} 超出范围")
+        elif options.playerTarget >= 0 and state.servant(options.playerTarget) is None:
+            self._add(WARNING, turn, f"{what}的我方目标位置 {options.playerTarget+1} 没有从者")
+        if not -1 <= options.enemyTarget < ENEMY_SLOTS:
+            self._add(ERROR, turn, f"{what}的敌方目标 {options.enemyTarget} 超出范围")
+
+    def _check_skill(self, turn, skill, state, mystic_code):
+        if skill.svt is None:
+            what = f"御主技能 {skill.skill+1}"
+            if not 0 <= skill.skill < MASTER_SKILLS:
+                self._add(ERROR, turn, f"{what} 超出范围")
+            elif not mystic_code:
+                self._add(ERROR, turn, f"队伍没有魔术礼装，无法使用{what}")
+            if not skill.is_order_change(mystic_code):
+                self._check_targets(turn, skill.options, state, what)
+            return
+
+        what = f"从者 {skill.svt+1} 的技能 {skill.skill+1}"
+        servant = state.servant(skill.svt)
+        if servant is None:
+            self._add(ERROR, turn, f"{what}: 该位置没有从者")
+            return
+        if not 0 <= skill.skill < SKILLS_PER_SERVANT:
+            self._add(ERROR, turn, f"{what}: 技能编号超出范围")
+        elif skill.skill >= len(servant.skillIds) or not servant.skillIds[skill.skill]:
+            self._add(ERROR, turn, f"{what}: 从者 (svtId {servant.svtId}) 没有该技能")
+        self._check_targets(turn, skill.options, state, what)
+
+    def _check_attack(self, turn, action, state):
+        attacks = action.attacks
+        if not 1 <= len(attacks) <= 3:
+            self._add(ERROR, turn, f"选择了 {len(attacks)} 张指令卡")
+        seen_cards = set()
+        seen_np = set()
+        for attack in attacks:
+            what = f"从者 {attack.svt+1} 的{'宝具卡' if attack.isTD else f'指令卡 {attack.card+1}'}"
+            servant = state.servant(attack.svt)
+            if servant is None:
+                self._add(ERROR, turn, f"{what}: 该位置没有从者")
+                continue
+            if attack.isTD:
+                if attack.svt in seen_np:
+                    self._add(ERROR, turn, f"{what}: 同一回合重复选择")
+                seen_np.add(attack.svt)
+                if not servant.tdId:
+                    self._add(ERROR, turn, f"{what}: 从者 (svtId {servant.svtId}) 没有宝具")
+            else:
+                if not 0 <= attack.card < CARDS_PER_SERVANT:
+                    self._add(ERROR, turn, f"{what}: 指令卡编号超出范围")
+                if (attack.svt, attack.card) in seen_cards:
+                    self._add(ERROR, turn, f"{what}: 同一回合重复选择")
+                seen_cards.add((attack.svt, attack.card))
+        self._check_targets(turn, action.options, state, "攻击")
+
+
+def validate_plan(battle_data, max_waves: int = 3) -> bool:
+    """检查作业并写日志，存在错误时返回 False"""
+    issues = PlanValidator(max_waves).validate(battle_data)
+    for issue in issues:
+        (logger.error if issue.level == ERROR else logger.warning)(f"作业检查 {issue}")
+    return not any(issue.level == ERROR for issue in issues)
@@ -0,0 +1,312 @@
+"""关卡导航：章节 → 地图 → 关卡节点的路线图，每一步用单帧锚点确认"""
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ScreenState import ScreenState
+from Vision import Roi, load_template, match_in_roi, normalize_frame, resource_dir, to_gray
+
+logger = logging.getLogger("FGOBattle")
+
+Point = Tuple[int, int]
+
+
+@dataclass
+class RouteNode:
+    """路线图中的一个画面，anchor 模板缺失时无法确认是否到达"""
+    id: str
+    name: str = ""
+    template: Optional[np.ndarray] = None
+    roi: Optional[Roi] = None
+    threshold: float = 0.8
+
+    def matches(self, gray: np.ndarray) -> bool:
+        if self.template is None:
+            return False
+        score, _ = match_in_roi(gray, self.template, self.roi)
+        return score >= self.threshold
+
+
+@dataclass
+class RouteEdge:
+    """从一个画面到另一个画面的点击序列，swipes 在点击前执行"""
+    source: str
+    target: str
+    taps: List[Point] = field(default_factory=list)
+    swipes: List[Tuple[int, int, int, int, int]] = field(default_factory=list)
+
+
+@dataclass
+class QuestEntry:
+    """章节地图上的关卡：节点坐标与难度(同一节点下的关卡列表)坐标"""
+    map: str
+    nodes: List[Point]
+    difficulties: List[Point] = field(default_factory=list)
+
+
+class QuestGraph:
+    """从 resource/quest/<name>.json 加载的路线图"""
+
+    def __init__(self, nodes: Dict[str, RouteNode], edges: List[RouteEdge], quests: Dict[str, QuestEntry],
+                 home: str, continue_edge: Optional[RouteEdge] = None, verified: bool = True):
+        self.nodes = nodes
+        self.verified = verified  # 坐标与锚点是否已在设备上核对
+        self.quests = quests
+        self.home = home
+        self.continue_edge = continue_edge
+        self.edges: Dict[str, List[RouteEdge]] = {}
+        for edge in edges:
+            self.edges.setdefault(edge.source, []).append(edge)
+
+    @staticmethod
+    def _edge(raw) -> RouteEdge:
+        return RouteEdge(raw["from"], raw["to"],
+                         [tuple(p) for p in raw.get("taps", [])],
+                         [tuple(s) for s in raw.get("swipes", [])])
+
+    @classmethod
+    def load(cls, name: str = "lostbelt") -> "QuestGraph":
+        path = resource_dir() / "quest" / f"{name}.json"
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        nodes = {}
+        for node_id, raw in data["nodes"].items():
+            anchor = raw.get("anchor") or {}
+            nodes[node_id] = RouteNode(
+                node_id, raw.get("name", ""),
+                load_template(anchor["template"]) if anchor.get("template") else None,
+                tuple(anchor["roi"]) if anchor.get("roi") else None,
+                anchor.get("threshold", 0.8),
+            )
+        edges = [cls._edge(raw) for raw in data.get("edges", [])]
+        quests = {
+            chapter: QuestEntry(raw["map"], [tuple(p) for p in raw["nodes"]],
+                                [tuple(p) for p in raw.get("difficulties", [])])
+            for chapter, raw in data.get("quests", {}).items()
+        }
+        continue_edge = cls._edge(data["continue"]) if data.get("continue") else None
+        graph = cls(nodes, edges, quests, data.get("home", next(iter(nodes))), continue_edge,
+                    data.get("verified", True))
+        if not graph.verified:
+            logger.warning(f"路线图 {name} 的坐标尚未在设备上核对，可能点错位置")
+        return graph
+
+    def missing_anchors(self) -> List[str]:
+        """锚点模板缺失的节点，这些画面无法确认是否到达"""
+        return [node_id for node_id, node in self.nodes.items() if node.template is None]
+
+    def shortest_path(self, source: str, target: str) -> Optional[List[RouteEdge]]:
+        """按点击步数的最短路线(BFS)，不可达时返回 None"""
+        if source == target:
+            return []
+        previous: Dict[str, RouteEdge] = {}
+        queue = deque([source])
+        visited = {source}
+        while queue:
+            current = queue.popleft()
+            for edge in self.edges.get(current, []):
+                if edge.target in visited:
+                    continue
+                visited.add(edge.target)
+                previous[edge.target] = edge
+                if edge.target == target:
+                    path = []
+                    node = target
+                    while node != source:
+                        path.append(previous[node])
+                        node = previous[node].source
+                    return path[::-1]
+                queue.append(edge.target)
+        return None
+
+
+class RouteCache:
+    """记住上一次的关卡与所在画面，重复出击时只需点击"连续出击" """
+
+    def __init__(self, path="fgo_route.json"):
+        self.path = Path(path)
+        self.data = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"路线缓存读取失败: {e}")
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def update(self, **values):
+        self.data.update(values)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class QuestNavigator:
+    """按路线图前往指定关卡
+
+    每次点击后只截图检查目标画面的锚点，匹配即进入下一步；目标锚点模板缺失时视为无法到达，
+    只有开启 blind 时才退回到固定等待 fallback_wait 秒。到达失败时重新定位当前画面并重新规划路线。
+    """
+
+    def __init__(self, graph: QuestGraph, capture: Callable[[], np.ndarray],
+                 click: Callable[[int, int], None], swipe: Callable[[int, int, int, int, int], None],
+                 cache: Optional[RouteCache] = None, step_timeout: float = 8.0,
+                 poll_interval: float = 0.3, fallback_wait: float = 2.0, max_replans: int = 2,
+                 blind: bool = False):
+        self.graph = graph
+        self.capture = capture
+        self.click = click
+        self.swipe = swipe
+        self.cache = cache or RouteCache()
+        self.step_timeout = step_timeout
+        self.poll_interval = poll_interval
+        self.fallback_wait = fallback_wait
+        self.max_replans = max_replans
+        self.blind = blind
+
+    def _gray(self) -> np.ndarray:
+        return to_gray(normalize_frame(self.capture()))
+
+    def locate(self, gray: Optional[np.ndarray] = None) -> Optional[str]:
+        """识别当前画面所在节点，优先检查缓存的节点及其相邻节点"""
+        gray = self._gray() if gray is None else gray
+        last = self.cache.get("node")
+        candidates = []
+        if last in self.graph.nodes:
+            candidates.append(last)
+            candidates.extend(edge.target for edge in self.graph.edges.get(last, []))
+        candidates.extend(node_id for node_id in self.graph.nodes if node_id not in candidates)
+        for node_id in candidates:
+            if self.graph.nodes[node_id].matches(gray):
+                return node_id
+        return None
+
+    def wait_for(self, node_id: str) -> bool:
+        """等待到达 node_id，每次轮询只截图一次、只匹配一个锚点"""
+        node = self.graph.nodes[node_id]
+        if node.template is None:
+            if not self.blind:
+                logger.error(f"{node_id} ({node.name}) 没有锚点模板，无法确认是否到达")
+                return False
+            time.sleep(self.fallback_wait)
+            return True
+        deadline = time.monotonic() + self.step_timeout
+        while True:
+            if node.matches(self._gray()):
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+    def _run_edge(self, edge: RouteEdge) -> bool:
+        for swipe in edge.swipes:
+            self.swipe(*swipe)
+        for x, y in edge.taps:
+            self.click(x, y)
+        if not self.wait_for(edge.target):
+            logger.warning(f"未能到达 {edge.target} ({self.graph.nodes[edge.target].name})")
+            return False
+        self.cache.update(node=edge.target)
+        return True
+
+    def go_to(self, target: str) -> bool:
+        """从当前画面前往 target 节点"""
+        for _ in range(self.max_replans + 1):
+            current = self.locate()
+            if current is None:
+                # 无法识别当前画面时先假设仍在上次记录的画面，没有路线再从主界面出发
+                current = self.cache.get("node")
+                if current not in self.graph.nodes or self.graph.shortest_path(current, target) is None:
+                    current = self.graph.home
+            path = self.graph.shortest_path(current, target)
+            if path is None:
+                logger.error(f"路线图中没有从 {current} 到 {target} 的路线")
+                return False
+            logger.info(f"导航: {' → '.join([current] + [edge.target for edge in path])}")
+            if all(self._run_edge(edge) for edge in path):
+                return True
+        return False
+
+    def enter_quest(self, chapter: str, node: int, difficulty: int = 0) -> bool:
+        """前往章节地图并进入关卡，成功时停在助战选择画面
+
+        与上一次关卡相同且正处于连续出击询问时，只点击"继续"。
+        """
+        quest = self.graph.quests.get(chapter)
+        if quest is None or not 0 <= node < len(quest.nodes):
+            logger.error(f"路线图中没有关卡 {chapter} #{node}")
+            return False
+
+        key = f"{chapter}:{node}:{difficulty}"
+        repeat = self.graph.continue_edge
+        if self.cache.get("quest") == key and repeat is not None and self.graph.nodes[repeat.source].matches(self._gray()):
+            logger.info("与上次关卡相同，直接连续出击")
+            return self._run_edge(repeat)
+
+        if not self.go_to(quest.map):
+            return False
+        taps = [quest.nodes[node]]
+        if quest.difficulties:
+            if not 0 <= difficulty < len(quest.difficulties):
+                logger.error(f"关卡 {chapter} #{node} 没有难度 {difficulty}")
+                return False
+            taps.append(quest.difficulties[difficulty])
+        if not self._run_edge(RouteEdge(quest.map, "support", taps)):
+            return False
+        self.cache.update(quest=key)
+        return True
+
+
+class FGOLostbeltQuest:
+    """白纸化地球关卡出击：导航到关卡，体力不足时按配置回复"""
+
+    def __init__(self, context, config, capture: Callable[[], np.ndarray],
+                 restore_ap: Optional[Callable[[], bool]] = None, classifier=None):
+        self.context = context
+        self.config = config
+        self.restore_ap = restore_ap
+        self.classifier = classifier
+        controller = context.tasker.controller
+        self.navigator = QuestNavigator(
+            QuestGraph.load(config.get('Quest', 'route_graph', fallback='lostbelt')),
+            capture=capture,
+            click=lambda x, y: controller.post_click(x, y).wait(),
+            swipe=lambda x1, y1, x2, y2, duration: controller.post_swipe(x1, y1, x2, y2, duration).wait(),
+            cache=RouteCache(config.get('Quest', 'route_cache', fallback='fgo_route.json')),
+            step_timeout=config.getfloat('Quest', 'step_timeout', fallback=8.0),
+            fallback_wait=config.getfloat('Quest', 'fallback_wait', fallback=2.0),
+            blind=config.getboolean('Quest', 'blind_navigation', fallback=False),
+        )
+
+    def complete_quest_selection(self, chapter: str, node: int, difficulty: int = 0, ap_recovery: bool = False) -> bool:
+        """进入关卡直到助战选择画面，返回是否成功"""
+        missing = self.navigator.graph.missing_anchors()
+        if missing and not self.navigator.blind:
+            # 在点击之前就停止，避免按未确认的画面继续点击
+            logger.error(f"路线图缺少锚点模板: {', '.join(missing)}，请补充 resource/image/quest 下的截图"
+                         f"或开启 [Quest] blind_navigation")
+            return False
+        if self.navigator.enter_quest(chapter, node, difficulty):
+            return True
+
+        # 没有到达助战画面，可能是体力不足弹出了回复界面
+        if self.classifier is not None and self.restore_ap is not None:
+            if self.classifier.classify(self.navigator.capture()) == ScreenState.AP_RECOVERY:
+                if not ap_recovery:
+                    logger.info("体力不足，未启用体力回复")
+                    return False
+                if self.restore_ap() and self.navigator.wait_for("support"):
+                    self.navigator.cache.update(node="support", quest=f"{chapter}:{node}:{difficulty}")
+                    return True
+        return False
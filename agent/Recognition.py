@@ -0,0 +1,68 @@
+"""预先声明识别参数的自定义识别基类
+
+context.run_recognition 配合 pipeline_override / override_pipeline / clone 修改 ROI 时，
+每次调用都要合并一遍 pipeline JSON，clone 还会复制整个 context。
+
+PrecompiledRecognition 在注册(实例化)时构造 VARIANTS 中的各个识别变体，
+analyze 中通过公开接口 context.run_recognition_direct 直接对 argv.image 执行，
+不克隆 context，也不修改 pipeline。
+"""
+import dataclasses
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from maa.custom_recognition import CustomRecognition
+from maa.pipeline import JRecognitionParam, JRecognitionType
+
+logger = logging.getLogger("FGOBattle")
+
+
+def variant(reco_type: JRecognitionType, param: JRecognitionParam, **changes) -> Tuple[JRecognitionType, JRecognitionParam]:
+    """基于 param 修改部分字段(roi、expected、threshold 等)得到一个识别变体"""
+    if "roi" in changes and isinstance(changes["roi"], list):
+        changes["roi"] = tuple(changes["roi"])
+    return reco_type, dataclasses.replace(param, **changes)
+
+
+@dataclass(frozen=True)
+class CompiledRecognition:
+    """构造完成的识别变体"""
+    name: str
+    reco_type: JRecognitionType
+    param: JRecognitionParam
+
+    @classmethod
+    def compile(cls, name: str, reco_type: JRecognitionType, param: JRecognitionParam) -> "CompiledRecognition":
+        return cls(name, reco_type, param)
+
+    def run(self, context, image: np.ndarray):
+        """对截图执行识别，返回 RecognitionDetail，无法启动识别时返回 None"""
+        return context.run_recognition_direct(self.reco_type, self.param, image)
+
+
+class PrecompiledRecognition(CustomRecognition):
+    """识别变体在实例化时构造的自定义识别
+
+    子类在 VARIANTS 中声明 {变体名: variant(...)}，在 analyze 中通过
+    recognize / recognize_all 对 argv.image 执行。
+    """
+
+    VARIANTS: Dict[str, Tuple[JRecognitionType, JRecognitionParam]] = {}
+
+    def __init__(self):
+        super().__init__()
+        self.variants: Dict[str, CompiledRecognition] = {
+            name: CompiledRecognition.compile(name, reco_type, param)
+            for name, (reco_type, param) in self.VARIANTS.items()
+        }
+
+    def recognize(self, context, image: np.ndarray, name: str):
+        """对截图执行一个变体，返回 RecognitionDetail 或 None"""
+        return self.variants[name].run(context, image)
+
+    def recognize_all(self, context, image: np.ndarray, names: Optional[Iterable[str]] = None) -> Dict[str, object]:
+        """对同一张截图执行多个变体(默认全部)"""
+        return {name: self.variants[name].run(context, image)
+                for name in (self.variants if names is None else names)}
@@ -0,0 +1,166 @@
+"""连续出击：结算 → 连续出击 → 体力回复 → 助战 → 下一场战斗，每一步由画面状态驱动"""
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from ScreenState import ScreenState
+
+logger = logging.getLogger("FGOBattle")
+
+
+class FramePrefetcher:
+    """后台截图：处理当前帧时下一帧已经在截取
+
+    点击之后调用 invalidate()，丢弃点击之前发起的截图。
+    """
+
+    def __init__(self, capture: Callable[[], np.ndarray]):
+        self.capture = capture
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.pending: Optional[Future] = None
+
+    def prefetch(self):
+        if self.pending is None:
+            self.pending = self.executor.submit(self.capture)
+
+    def next(self) -> np.ndarray:
+        self.prefetch()
+        frame = self.pending.result()
+        self.pending = None
+        self.prefetch()
+        return frame
+
+    def invalidate(self):
+        self.pending = None
+        self.prefetch()
+
+    def close(self):
+        self.pending = None
+        self.executor.shutdown(wait=False)
+
+
+@dataclass
+class RepeatLayout:
+    """连续出击流程中的点击位置(基准分辨率 1280x720)"""
+    advance: Tuple[int, int] = (450, 450)  # 结算画面点击任意位置继续
+    continue_button: Tuple[int, int] = (350, 450)
+    quit_button: Tuple[int, int] = (550, 450)
+
+
+@dataclass
+class LoopResult:
+    started: bool  # 是否进入了下一场战斗
+    overhead: float  # 从结算到下一场战斗指令界面的耗时(秒)
+    drops: Optional[Dict[str, int]] = None
+
+
+class RepeatLoop:
+    """一场战斗结束后的连续出击流程
+
+    每次循环取一帧(预取)、识别一次状态，只执行该状态对应的操作；
+    状态之间不使用固定等待，因此非战斗开销取决于游戏本身的加载时间。
+    状态识别不可用(没有锚点模板)时退回到按固定顺序和等待执行。
+    """
+
+    RESULT_STATES = (ScreenState.BATTLE_RESULT, ScreenState.DROP_RESULT)
+
+    def __init__(self, capture: Callable[[], np.ndarray], classifier, click: Callable[[int, int], None],
+                 read_drops: Callable[[np.ndarray], Optional[Dict[str, int]]],
+                 on_results_done: Callable[[Optional[Dict[str, int]]], None],
+                 should_continue: Callable[[], bool],
+                 restore_ap: Callable[..., bool],
+                 select_support: Callable[[], bool],
+                 layout: Optional[RepeatLayout] = None,
+                 timeout: float = 90.0, poll_interval: float = 0.2, blind_wait: float = 1.0):
+        self.capture = capture
+        self.classifier = classifier
+        self.click = click
+        self.read_drops = read_drops
+        self.on_results_done = on_results_done
+        self.should_continue = should_continue
+        self.restore_ap = restore_ap
+        self.select_support = select_support
+        self.layout = layout or RepeatLayout()
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.blind_wait = blind_wait
+
+    def run(self) -> LoopResult:
+        if not self.classifier.anchors:
+            return self._run_blind()
+
+        started_at = time.monotonic()
+        prefetcher = FramePrefetcher(self.capture)
+        drops = None
+        results_seen = False
+        results_done = False
+        try:
+            while time.monotonic() - started_at < self.timeout:
+                frame = prefetcher.next()
+                state = self.classifier.classify(frame)
+
+                if state in self.RESULT_STATES or (state == ScreenState.UNKNOWN and not results_done):
+                    # 结算中的羁绊、经验等画面没有锚点，点击继续即可
+                    results_seen = results_seen or state in self.RESULT_STATES
+                    if state == ScreenState.DROP_RESULT and drops is None:
+                        drops = self.read_drops(frame)
+                    self.click(*self.layout.advance)
+                    if state == ScreenState.UNKNOWN:
+                        time.sleep(self.poll_interval)
+                    prefetcher.invalidate()
+                    continue
+                if not results_done:
+                    # 离开结算画面，结算信息已经完整
+                    self.on_results_done(drops)
+                    results_done = True
+
+                if state == ScreenState.REPEAT_DIALOG:
+                    if not self.should_continue():
+                        self.click(*self.layout.quit_button)
+                        return LoopResult(False, time.monotonic() - started_at, drops)
+                    self.click(*self.layout.continue_button)
+                elif state == ScreenState.AP_RECOVERY:
+                    if not self.restore_ap():
+                        return LoopResult(False, time.monotonic() - started_at, drops)
+                elif state == ScreenState.SUPPORT_SELECT:
+                    if self.select_support() is not True:
+                        return LoopResult(False, time.monotonic() - started_at, drops)
+                elif state == ScreenState.BATTLE_COMMAND:
+                    return LoopResult(True, time.monotonic() - started_at, drops)
+                else:
+                    # 加载中或过场，等待下一帧
+                    time.sleep(self.poll_interval)
+                    continue
+                prefetcher.invalidate()
+
+            logger.warning(f"连续出击流程超时 ({self.timeout:.0f} 秒)")
+            # 没有见到结算画面(例如全灭)时不记录结束，由调用方记为失败
+            if results_seen and not results_done:
+                self.on_results_done(drops)
+            return LoopResult(False, time.monotonic() - started_at, drops)
+        finally:
+            prefetcher.close()
+
+    def _run_blind(self) -> LoopResult:
+        """没有状态识别时按固定顺序执行"""
+        started_at = time.monotonic()
+        for _ in range(5):
+            self.click(*self.layout.advance)
+            time.sleep(self.blind_wait)
+        self.on_results_done(None)
+
+        if not self.should_continue():
+            self.click(*self.layout.quit_button)
+            return LoopResult(False, time.monotonic() - started_at)
+        self.click(*self.layout.continue_button)
+        time.sleep(self.blind_wait)
+        # 无法识别是否弹出了体力回复界面，由 restore_ap 读取体力判断
+        if not self.restore_ap(required=False):
+            return LoopResult(False, time.monotonic() - started_at)
+        if self.select_support() is not True:
+            return LoopResult(False, time.monotonic() - started_at)
+        return LoopResult(True, time.monotonic() - started_at)
@@ -0,0 +1,105 @@
+"""重试策略：截止时间、带抖动的指数退避以及错误分类"""
+import random
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, Optional
+
+
+class TransientError(Exception):
+    """可重试的临时错误，例如 ADB 连接抖动、截图超时"""
+
+
+class FatalError(Exception):
+    """不可重试的错误，例如数据格式错误"""
+
+
+class RetryExhausted(FatalError):
+    """内层操作已重试失败，外层不应再次重试"""
+
+
+# 编程或数据错误，重试也不会成功
+FATAL_EXCEPTIONS = (FatalError, AttributeError, TypeError, IndexError, KeyError, ValueError, NameError)
+# 与设备通信相关的错误，通常稍后重试即可恢复
+TRANSIENT_EXCEPTIONS = (TransientError, TimeoutError, ConnectionError, OSError)
+
+
+def is_transient(error: BaseException) -> bool:
+    """判断错误是否值得重试，未知错误按临时错误处理"""
+    if isinstance(error, TRANSIENT_EXCEPTIONS):
+        return True
+    return not isinstance(error, FATAL_EXCEPTIONS)
+
+
+class _OperationFailed:
+    """操作最终失败的标记，布尔值为 False 以兼容 `if not result` 的判断"""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "OPERATION_FAILED"
+
+
+OPERATION_FAILED = _OperationFailed()
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """单个操作的重试策略
+
+    max_attempts -- 最多执行次数(含第一次)
+    base_delay -- 第一次重试前的等待时间(秒)
+    max_delay -- 单次等待的上限(秒)
+    multiplier -- 每次重试等待时间的倍数
+    jitter -- 抖动比例，实际等待时间在 [delay * (1 - jitter), delay] 内随机
+    deadline -- 从第一次执行开始计算的总时限(秒)，None 表示不限
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+    multiplier: float = 2.0
+    jitter: float = 0.5
+    deadline: Optional[float] = None
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间"""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def delays(self) -> Iterator[float]:
+        """依次给出每次重试前的等待时间"""
+        for attempt in range(1, self.max_attempts):
+            yield self.backoff(attempt)
+
+
+DEFAULT_POLICIES: Dict[str, RetryPolicy] = {
+    # 单次点击类操作：快速重试
+    "default": RetryPolicy(),
+    "click": RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=0.5, deadline=3.0),
+    # 技能、选卡：需要重新确认画面状态，等待稍长
+    "skill": RetryPolicy(max_attempts=3, base_delay=0.3, max_delay=1.5, deadline=8.0),
+    "attack": RetryPolicy(max_attempts=2, base_delay=0.5, max_delay=1.5, deadline=10.0),
+    # 整回合流程：内层已各自重试，外层只兜底一次
+    "turn": RetryPolicy(max_attempts=2, base_delay=0.5, max_delay=1.0, deadline=60.0),
+    # 结算、助战等界面流程
+    "dialog": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=3.0, deadline=20.0),
+}
+
+
+def load_policy(name: str, config=None) -> RetryPolicy:
+    """获取指定操作的策略，可通过配置 [Retry] 节覆盖
+
+    例如 `skill_attempts = 4`、`skill_deadline = 10`、`skill_base_delay = 0.2`。
+    """
+    policy = DEFAULT_POLICIES.get(name, DEFAULT_POLICIES["default"])
+    if config is None:
+        return policy
+
+    overrides = {}
+    attempts = config.getint("Retry", f"{name}_attempts", fallback=0)
+    if attempts > 0:
+        overrides["max_attempts"] = attempts
+    for field_name in ("base_delay", "max_delay", "deadline"):
+        value = config.getfloat("Retry", f"{name}_{field_name}", fallback=-1.0)
+        if value >= 0:
+            overrides[field_name] = value
+    return replace(policy, **overrides) if overrides else policy
@@ -0,0 +1,251 @@
+"""基于 SQLite 的出击历史记录与查询"""
+import logging
+import platform
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("FGOBattle")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS battles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device TEXT NOT NULL,
+    team_id INTEGER,
+    quest_id INTEGER,
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    duration REAL,
+    turns INTEGER,
+    success INTEGER NOT NULL DEFAULT 0,
+    drops_read INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_battles_quest_team ON battles (quest_id, team_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_battles_device ON battles (device, started_at);
+
+CREATE TABLE IF NOT EXISTS turns (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    turn_index INTEGER NOT NULL,
+    wave INTEGER,
+    started_at REAL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_battle ON turns (battle_id);
+
+CREATE TABLE IF NOT EXISTS waits (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    kind TEXT NOT NULL,
+    key TEXT,
+    expected REAL,
+    actual REAL
+);
+CREATE INDEX IF NOT EXISTS idx_waits_battle ON waits (battle_id);
+CREATE INDEX IF NOT EXISTS idx_waits_kind ON waits (kind, key);
+
+CREATE TABLE IF NOT EXISTS drops (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    item TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_drops_battle ON drops (battle_id);
+CREATE INDEX IF NOT EXISTS idx_drops_item ON drops (item);
+
+CREATE TABLE IF NOT EXISTS apple_use (
+    battle_id INTEGER REFERENCES battles (id),
+    device TEXT NOT NULL,
+    apple_type TEXT NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_apple_use_device ON apple_use (device, used_at);
+"""
+
+
+@dataclass
+class BattleRecord:
+    """一场战斗在内存中的记录，战斗结束时一次性写入数据库"""
+    device: str
+    team_id: Optional[int]
+    quest_id: Optional[int]
+    started_at: float = field(default_factory=time.time)
+    turns: List[Tuple[int, int, float, float]] = field(default_factory=list)
+    waits: List[Tuple[str, Optional[str], float, float]] = field(default_factory=list)
+    apples: List[Tuple[str, float]] = field(default_factory=list)
+
+    def add_turn(self, turn_index: int, wave: int, started_at: float, duration: float):
+        self.turns.append((turn_index, wave, started_at, duration))
+
+    def add_wait(self, kind: str, expected: float, actual: float, key: Optional[str] = None):
+        self.waits.append((kind, key, expected, actual))
+
+    def add_apple(self, apple_type: str):
+        self.apples.append((apple_type, time.time()))
+
+
+@dataclass
+class TeamStats:
+    """某队伍在某关卡的统计"""
+    team_id: int
+    runs: int
+    success_rate: float
+    mean_duration: Optional[float]
+    mean_turns: Optional[float]
+
+
+class RunHistory:
+    """出击历史数据库
+
+    使用 WAL 模式，查询不会阻塞写入；每场战斗的所有数据在一个事务中批量写入。
+    """
+
+    _shared: Dict[Tuple[str, Optional[str]], "RunHistory"] = {}
+
+    def __init__(self, path="fgo_history.db", device: Optional[str] = None):
+        self.path = path
+        self.device = device or platform.node() or "default"
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """旧版本数据库缺少的列"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(battles)")}
+        if "drops_read" not in columns:
+            # 旧数据无法区分"没有掉落"与"没有识别掉落"，一律不计入掉率
+            with self.conn:
+                self.conn.execute("ALTER TABLE battles ADD COLUMN drops_read INTEGER NOT NULL DEFAULT 0")
+
+    @classmethod
+    def from_config(cls, config) -> Optional["RunHistory"]:
+        """按配置 [History] 取得共用的数据库连接，同一数据库只打开一次；未启用或打开失败时返回 None"""
+        if not config.getboolean('History', 'enabled', fallback=True):
+            return None
+        key = (config.get('History', 'db_path', fallback='fgo_history.db'),
+               config.get('History', 'device', fallback='') or None)
+        if key not in cls._shared:
+            try:
+                cls._shared[key] = cls(*key)
+            except sqlite3.Error as e:
+                logger.error(f"打开历史数据库失败: {e}")
+                return None
+        return cls._shared[key]
+
+    def begin(self, team_id: Optional[int], quest_id: Optional[int]) -> BattleRecord:
+        return BattleRecord(self.device, team_id, quest_id)
+
+    def commit(self, record: BattleRecord, success: bool, turns: int, drops: Optional[Dict[str, int]] = None) -> int:
+        """写入一场战斗的全部数据，返回战斗 id
+
+        drops 为 None 表示没有识别掉落，该场不计入掉率；空字典表示识别了但没有掉落
+        """
+        ended_at = time.time()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO battles (device, team_id, quest_id, started_at, ended_at, duration, turns, success, "
+                "drops_read) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (record.device, record.team_id, record.quest_id, record.started_at, ended_at,
+                 ended_at - record.started_at, turns, int(success), int(drops is not None)),
+            )
+            battle_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO turns (battle_id, turn_index, wave, started_at, duration) VALUES (?, ?, ?, ?, ?)",
+                [(battle_id, *turn) for turn in record.turns],
+            )
+            self.conn.executemany(
+                "INSERT INTO waits (battle_id, kind, key, expected, actual) VALUES (?, ?, ?, ?, ?)",
+                [(battle_id, *wait) for wait in record.waits],
+            )
+            self.conn.executemany(
+                "INSERT INTO drops (battle_id, item, count) VALUES (?, ?, ?)",
+                [(battle_id, item, count) for item, count in (drops or {}).items()],
+            )
+            self.conn.executemany(
+                "INSERT INTO apple_use (battle_id, device, apple_type, used_at) VALUES (?, ?, ?, ?)",
+                [(battle_id, record.device, apple_type, used_at) for apple_type, used_at in record.apples],
+            )
+        return battle_id
+
+    def record_apple(self, apple_type: str):
+        """记录不属于任何战斗的苹果使用(如出击前回复体力)"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO apple_use (battle_id, device, apple_type, used_at) VALUES (NULL, ?, ?, ?)",
+                (self.device, apple_type, time.time()),
+            )
+
+    def close(self):
+        self.conn.close()
+        for key, history in list(self._shared.items()):
+            if history is self:
+                del self._shared[key]
+
+    # ---------------- 查询 ----------------
+
+    def mean_run_time(self, quest_id: int, team_id: Optional[int] = None, days: float = 7,
+                      device: Optional[str] = None) -> Optional[float]:
+        """最近 days 天内某关卡(可指定队伍、设备)成功战斗的平均用时(秒)"""
+        sql = "SELECT AVG(duration) FROM battles WHERE quest_id = ? AND success = 1 AND started_at >= ?"
+        params = [quest_id, time.time() - days * 86400]
+        if team_id is not None:
+            sql += " AND team_id = ?"
+            params.append(team_id)
+        if device is not None:
+            sql += " AND device = ?"
+            params.append(device)
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def team_stats(self, quest_id: int, days: float = 7) -> List[TeamStats]:
+        """最近 days 天内某关卡各队伍的成功率、平均用时与回合数"""
+        rows = self.conn.execute(
+            "SELECT team_id, COUNT(*), AVG(success), "
+            "AVG(CASE WHEN success = 1 THEN duration END), AVG(CASE WHEN success = 1 THEN turns END) "
+            "FROM battles WHERE quest_id = ? AND started_at >= ? GROUP BY team_id",
+            (quest_id, time.time() - days * 86400),
+        ).fetchall()
+        return [TeamStats(*row) for row in rows]
+
+    def fastest_team(self, quest_id: int, days: float = 7, min_runs: int = 3) -> Optional[int]:
+        """最近 days 天内平均用时最短的队伍(至少 min_runs 场)"""
+        candidates = [s for s in self.team_stats(quest_id, days) if s.runs >= min_runs and s.mean_duration]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: s.mean_duration).team_id
+
+    def mean_wait(self, kind: str, key: Optional[str] = None, days: float = 7) -> Optional[float]:
+        """某类等待的实际平均耗时"""
+        sql = ("SELECT AVG(w.actual) FROM waits w JOIN battles b ON b.id = w.battle_id "
+               "WHERE w.kind = ? AND b.started_at >= ?")
+        params = [kind, time.time() - days * 86400]
+        if key is not None:
+            sql += " AND w.key = ?"
+            params.append(key)
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def drop_totals(self, quest_id: int, days: float = 7) -> Dict[str, int]:
+        """最近 days 天内某关卡的掉落总数"""
+        rows = self.conn.execute(
+            "SELECT d.item, SUM(d.count) FROM drops d JOIN battles b ON b.id = d.battle_id "
+            "WHERE b.quest_id = ? AND b.started_at >= ? GROUP BY d.item",
+            (quest_id, time.time() - days * 86400),
+        ).fetchall()
+        return dict(rows)
+
+    def drop_summary(self, quest_id: int, days: Optional[float] = None) -> Tuple[int, Dict[str, Tuple[int, int, int]]]:
+        """某关卡识别过掉落的场次，以及各物品的 (总数, 平方和, 有掉落的场次)
+
+        days 为空时统计全部历史
+        """
+        since = time.time() - days * 86400 if days is not None else float("-inf")
+        runs = self.conn.execute(
+            "SELECT COUNT(*) FROM battles WHERE quest_id = ? AND drops_read = 1 AND started_at >= ?",
+            (quest_id, since),
+        ).fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT d.item, SUM(d.count), SUM(d.count * d.count), SUM(d.count > 0) "
+            "FROM drops d JOIN battles b ON b.id = d.battle_id "
+            "WHERE b.quest_id = ? AND b.drops_read = 1 AND b.started_at >= ? GROUP BY d.item",
+            (quest_id, since),
+        ).fetchall()
+        return runs, {item: (total, sum_sq, runs_with) for item, total, sum_sq, runs_with in rows}
@@ -0,0 +1,126 @@
+"""基于锚点模板的画面状态分类"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from Vision import Roi, load_template, match_in_roi, normalize_frame, to_gray
+
+logger = logging.getLogger("FGOBattle")
+
+
+class ScreenState:
+    """画面状态常量"""
+    UNKNOWN = "unknown"
+    BATTLE_COMMAND = "battle_command"      # 战斗指令界面(技能、攻击按钮可见)
+    SKILL_TARGET = "skill_target"          # 技能选择目标
+    MASTER_SKILL_MENU = "master_skill_menu"
+    CARD_SELECT = "card_select"            # 选卡界面
+    BATTLE_RESULT = "battle_result"        # 战斗结算
+    AP_RECOVERY = "ap_recovery"            # 体力不足，回复体力界面
+    DROP_RESULT = "drop_result"            # 结算中的掉落物品界面
+    NP_SKIP = "np_skip"                    # 宝具动画中出现可跳过提示
+    REPEAT_DIALOG = "repeat_dialog"        # 连续出击询问
+    SUPPORT_SELECT = "support_select"      # 助战选择界面
+    TITLE = "title"                        # 标题画面，点击任意位置进入游戏
+    UPDATE_PROMPT = "update_prompt"        # 资料更新确认
+    CM_PROMPT = "cm_prompt"                # 是否收看广告
+    ANNOUNCEMENT = "announcement"          # 公告与各类弹窗
+    LOGIN_REQUIRED = "login_required"      # 需要输入账号，无法自动处理
+    HOME = "home"                          # 主界面
+
+
+@dataclass
+class StateAnchor:
+    """用于识别某个状态的锚点：在固定 ROI 内匹配一张小模板"""
+    state: str
+    template: str
+    roi: Roi
+    threshold: float = 0.8
+
+
+DEFAULT_ANCHORS = [
+    StateAnchor(ScreenState.BATTLE_COMMAND, "state/战斗_攻击按钮.png", (1050, 500, 230, 220)),
+    StateAnchor(ScreenState.CARD_SELECT, "state/选卡_返回按钮.png", (1100, 620, 180, 100)),
+    StateAnchor(ScreenState.SKILL_TARGET, "state/技能_选择目标.png", (400, 80, 480, 120)),
+    StateAnchor(ScreenState.MASTER_SKILL_MENU, "state/御主技能菜单.png", (860, 260, 420, 120)),
+    StateAnchor(ScreenState.BATTLE_RESULT, "state/战斗结算.png", (0, 0, 640, 200)),
+    StateAnchor(ScreenState.DROP_RESULT, "state/掉落结算.png", (0, 0, 400, 120)),
+    StateAnchor(ScreenState.AP_RECOVERY, "state/体力回复.png", (440, 40, 400, 100)),
+    StateAnchor(ScreenState.NP_SKIP, "state/宝具跳过.png", (1080, 0, 200, 100)),
+    StateAnchor(ScreenState.REPEAT_DIALOG, "state/连续出击.png", (340, 460, 600, 120)),
+    StateAnchor(ScreenState.SUPPORT_SELECT, "state/助战选择.png", (0, 0, 400, 100)),
+]
+
+# 启动登录流程使用的锚点，与战斗中的画面互不重叠，单独创建分类器
+LOGIN_ANCHORS = [
+    StateAnchor(ScreenState.HOME, "state/主界面.png", (880, 600, 400, 120)),
+    StateAnchor(ScreenState.UPDATE_PROMPT, "state/资料更新.png", (340, 420, 600, 160)),
+    StateAnchor(ScreenState.CM_PROMPT, "state/收看CM.png", (340, 420, 600, 160)),
+    StateAnchor(ScreenState.ANNOUNCEMENT, "游戏公告关闭按钮.png", (0, 0, 1280, 720)),
+    StateAnchor(ScreenState.ANNOUNCEMENT, "弹窗退出.png", (0, 0, 1280, 720)),
+    StateAnchor(ScreenState.TITLE, "state/标题_点击屏幕.png", (340, 520, 600, 160)),
+]
+
+
+class StateClassifier:
+    """画面状态分类器
+
+    每个锚点只在自己的小 ROI 内匹配，并且按最近命中顺序尝试，
+    连续处于同一状态时通常一次匹配就能得出结果。模板缺失的锚点会被跳过。
+    """
+
+    def __init__(self, anchors: Optional[Iterable[StateAnchor]] = None):
+        # (锚点, 灰度模板)，按最近命中顺序排列
+        self.anchors: List[Tuple[StateAnchor, np.ndarray]] = []
+        for anchor in anchors if anchors is not None else DEFAULT_ANCHORS:
+            template = load_template(anchor.template)
+            if template is not None:
+                self.add_anchor(anchor, template)
+
+        if not self.anchors:
+            logger.debug("没有可用的状态锚点模板，画面状态将始终为 unknown")
+
+    def add_anchor(self, anchor: StateAnchor, template: np.ndarray):
+        """添加一个锚点，template 为基准分辨率下的灰度模板"""
+        self.anchors.append((anchor, to_gray(template)))
+
+    def classify(self, image: np.ndarray) -> str:
+        """返回画面所处的状态，无法判断时返回 ScreenState.UNKNOWN"""
+        return self.match(image)[0]
+
+    def match(self, image: np.ndarray) -> Tuple[str, Optional[Roi]]:
+        """返回 (画面状态, 命中的锚点在基准分辨率下的位置)，无法判断时为 (UNKNOWN, None)"""
+        if not self.anchors or image is None or image.size == 0:
+            return ScreenState.UNKNOWN, None
+
+        frame = to_gray(normalize_frame(image))
+        for index, (anchor, template) in enumerate(self.anchors):
+            score, (x, y) = match_in_roi(frame, template, anchor.roi)
+            if score >= anchor.threshold:
+                if index:
+                    # 把命中的锚点移到最前，下次优先尝试
+                    self.anchors.insert(0, self.anchors.pop(index))
+                return anchor.state, (x, y, template.shape[1], template.shape[0])
+        return ScreenState.UNKNOWN, None
+
+    def wait_for(
+        self,
+        capture: Callable[[], np.ndarray],
+        states: Iterable[str],
+        timeout: float,
+        interval: float = 0.2,
+    ) -> str:
+        """轮询截图直到进入给定状态之一或超时，返回最后一次识别到的状态"""
+        if not self.anchors:
+            return ScreenState.UNKNOWN
+        states = set(states)
+        deadline = time.monotonic() + timeout
+        state = ScreenState.UNKNOWN
+        while True:
+            state = self.classify(capture())
+            if state in states or time.monotonic() >= deadline:
+                return state
+            time.sleep(interval)
@@ -0,0 +1,76 @@
+"""agent 启动耗时统计：各阶段耗时与最慢的模块导入，用于 --profile-startup"""
+import importlib.abc
+import importlib.machinery
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """包装模块的 loader，记录 exec_module 的耗时(包含其导入的子模块)"""
+
+    def __init__(self, loader, timings: Dict[str, float]):
+        self.loader = loader
+        self.timings = timings
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        started = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timings[module.__name__] = time.perf_counter() - started
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self, timings: Dict[str, float]):
+        self.timings = timings
+
+    def find_spec(self, fullname, path, target=None):
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is None or spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return None
+        spec.loader = _TimedLoader(spec.loader, self.timings)
+        return spec
+
+
+class StartupProfile:
+    """按阶段记录启动耗时；未启用时只有计时开销"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.imports: Dict[str, float] = {}
+        self._finder = None
+        if enabled:
+            self._finder = _ImportTimer(self.imports)
+            sys.meta_path.insert(0, self._finder)
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self, top: int = 15) -> str:
+        """输出报告并停止记录模块导入"""
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        lines = ["启动耗时:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'合计(自进程启动计时起)':<24} {(time.perf_counter() - self.started) * 1000:8.1f} ms")
+        if self.imports:
+            lines.append(f"最慢的模块导入(包含子模块，前 {top} 个):")
+            for name, seconds in sorted(self.imports.items(), key=lambda item: -item[1])[:top]:
+                lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+        return "\n".join(lines)
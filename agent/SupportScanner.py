@@ -0,0 +1,229 @@
+"""助战列表扫描：每页截图一次，批量匹配所有可见行"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from Vision import Roi, batch_ncc, frame_signature, load_template, normalize_frame, stack_rois, to_gray
+
+logger = logging.getLogger("FGOBattle")
+
+
+@dataclass
+class SupportLayout:
+    """助战列表布局(基准分辨率 1280x720)，区域坐标相对于行的左上角"""
+    row_origins: List[Tuple[int, int]] = field(default_factory=lambda: [(60, 180), (60, 385)])
+    portrait_roi: Roi = (0, 0, 130, 140)
+    ce_roi: Roi = (0, 140, 130, 55)
+    skill_rois: List[Roi] = field(default_factory=lambda: [(480, 100, 40, 30), (540, 100, 40, 30), (600, 100, 40, 30)])
+    select_offset: Tuple[int, int] = (300, 80)
+    default_position: Tuple[int, int] = (450, 300)
+    list_roi: Roi = (60, 180, 1000, 520)
+    scroll: Tuple[int, int, int, int, int] = (640, 600, 640, 200, 500)
+    refresh_button: Tuple[int, int] = (750, 200)
+    refresh_confirm: Tuple[int, int] = (550, 450)
+
+
+@dataclass
+class SupportTarget:
+    """一种筛选条件：模板以及需要匹配的区域"""
+    name: str
+    template: np.ndarray
+    rois: List[Roi]
+
+
+class SupportScanner:
+    """助战选择器
+
+    - 每一页只截图一次，所有可见行的立绘、礼装、技能等级一次批量比对
+    - 记住本轮(两次刷新之间)已经扫描失败的页面签名，同样的页面不会再次比对；
+      签名是有损的，刷新后列表内容改变，因此每次刷新都会清空
+    - 刷新冷却按计时器计算剩余时间，冷却中不阻塞等待：剩余时间超过 refresh_max_wait 时
+      不再刷新，否则轮询列表直到冷却结束；滑动与刷新后通过画面签名判断是否稳定，而非固定等待
+    """
+
+    def __init__(self, ctx, config, capture: Callable[[], np.ndarray], layout: Optional[SupportLayout] = None):
+        self.ctx = ctx
+        self.config = config
+        self.capture = capture
+        self.layout = layout or SupportLayout()
+
+        self.threshold = config.getfloat('Support', 'match_threshold', fallback=0.8)
+        self.match_all = config.get('Support', 'match_mode', fallback='any') == 'all'
+        self.max_refresh = config.getint('Support', 'max_refresh', fallback=5)
+        self.max_scroll = config.getint('Support', 'max_scroll', fallback=5)
+        self.auto_refresh = config.getboolean('Support', 'auto_refresh', fallback=True)
+        self.refresh_cooldown = config.getfloat('Support', 'refresh_cooldown', fallback=10.0)
+        self.refresh_max_wait = config.getfloat('Support', 'refresh_max_wait', fallback=3.0)
+        self.settle_timeout = config.getfloat('Support', 'settle_timeout', fallback=3.0)
+
+        self.targets = self._load_targets()
+        self.failed_pages: Set[bytes] = set()
+        self.last_refresh: Optional[float] = None
+
+    def _load_targets(self) -> List[SupportTarget]:
+        """按 从者 > 礼装 > 技能 的优先级加载配置中的筛选模板"""
+        layout = self.layout
+        specs = [
+            ('servant', "support/servant/{}.png", [layout.portrait_roi]),
+            ('craft_essence', "support/ce/{}.png", [layout.ce_roi]),
+            ('skill', "support/skill/{}.png", layout.skill_rois),
+        ]
+        targets = []
+        for option, pattern, rois in specs:
+            name = self.config.get('Support', option, fallback='')
+            if not name:
+                continue
+            template = load_template(pattern.format(name))
+            if template is None:
+                logger.warning(f"助战筛选模板不存在: {pattern.format(name)}")
+                continue
+            targets.append(SupportTarget(name, template, rois))
+        return targets
+
+    def match_rows(self, frame: np.ndarray) -> np.ndarray:
+        """返回形状为 (行数, 条件数) 的布尔矩阵，表示每一行是否满足每个条件"""
+        frame = to_gray(normalize_frame(frame))
+        rows = len(self.layout.row_origins)
+        matched = np.zeros((rows, len(self.targets)), dtype=bool)
+        for column, target in enumerate(self.targets):
+            rois = [
+                (ox + x, oy + y, w, h)
+                for ox, oy in self.layout.row_origins
+                for x, y, w, h in target.rois
+            ]
+            height, width = target.template.shape[:2]
+            patches = stack_rois(frame, rois, (width, height))
+            scores = batch_ncc(patches, target.template[None]).reshape(rows, len(target.rois))
+            # 一个条件有多个区域时(如三个技能)，需要全部满足
+            matched[:, column] = (scores >= self.threshold).all(axis=1)
+        return matched
+
+    def find_row(self, frame: np.ndarray) -> Optional[int]:
+        """在当前页中查找满足条件的行"""
+        if not self.targets:
+            return None
+        matched = self.match_rows(frame)
+        if self.match_all:
+            hits = np.flatnonzero(matched.all(axis=1))
+            return int(hits[0]) if hits.size else None
+        # 按条件优先级依次查找
+        for column, target in enumerate(self.targets):
+            hits = np.flatnonzero(matched[:, column])
+            if hits.size:
+                logger.info(f"找到目标助战: {target.name}")
+                return int(hits[0])
+        return None
+
+    def signature(self, frame: np.ndarray) -> bytes:
+        return frame_signature(normalize_frame(frame), self.layout.list_roi)
+
+    def wait_settled(self, previous: Optional[bytes] = None) -> Tuple[np.ndarray, bytes]:
+        """截图直到列表不再变化(且与 previous 不同)或超时，返回最后一帧及其签名"""
+        deadline = time.monotonic() + self.settle_timeout
+        frame = self.capture()
+        sig = self.signature(frame)
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            next_frame = self.capture()
+            next_sig = self.signature(next_frame)
+            stable = next_sig == sig
+            frame, sig = next_frame, next_sig
+            if stable and sig != previous:
+                break
+        return frame, sig
+
+    @property
+    def controller(self):
+        return self.ctx.tasker.controller
+
+    def click_row(self, row: int):
+        ox, oy = self.layout.row_origins[row]
+        dx, dy = self.layout.select_offset
+        self.controller.post_click(ox + dx, oy + dy).wait()
+
+    def click_default(self):
+        """选择第一个助战"""
+        self.controller.post_click(*self.layout.default_position).wait()
+
+    def scroll(self):
+        self.controller.post_swipe(*self.layout.scroll).wait()
+
+    def cooldown_remaining(self) -> float:
+        """距离可以再次刷新的秒数"""
+        if self.last_refresh is None:
+            return 0.0
+        return max(0.0, self.refresh_cooldown - (time.monotonic() - self.last_refresh))
+
+    def wait_cooldown(self, sig: bytes) -> Optional[Tuple[np.ndarray, bytes]]:
+        """轮询列表直到冷却结束；期间列表发生变化时立即返回新的画面与签名，否则返回 None"""
+        while self.cooldown_remaining() > 0:
+            time.sleep(min(0.2, self.cooldown_remaining()))
+            frame = self.capture()
+            new_sig = self.signature(frame)
+            if new_sig != sig:
+                return frame, new_sig
+        return None
+
+    def refresh(self) -> bool:
+        """刷新助战列表，冷却未结束时不刷新并返回 False"""
+        if self.cooldown_remaining() > 0:
+            return False
+        self.controller.post_click(*self.layout.refresh_button).wait()
+        self.controller.post_click(*self.layout.refresh_confirm).wait()
+        self.last_refresh = time.monotonic()
+        return True
+
+    def select(self) -> bool:
+        """查找并选择目标助战，找不到时选择第一个，返回是否找到目标"""
+        if not self.targets:
+            logger.info("未指定助战筛选条件，选择第一个")
+            self.click_default()
+            return False
+
+        refresh_count = 0
+        self.failed_pages.clear()
+        frame = self.capture()
+        sig = self.signature(frame)
+        while True:
+            for scroll_count in range(self.max_scroll + 1):
+                if sig in self.failed_pages:
+                    logger.debug("页面已扫描过，跳过比对")
+                else:
+                    row = self.find_row(frame)
+                    if row is not None:
+                        self.click_row(row)
+                        return True
+                    self.failed_pages.add(sig)
+
+                if scroll_count == self.max_scroll:
+                    break
+                self.scroll()
+                frame, new_sig = self.wait_settled()
+                if new_sig == sig:
+                    # 滑动后画面不变，已到列表底部
+                    break
+                sig = new_sig
+
+            if not self.auto_refresh or refresh_count >= self.max_refresh:
+                break
+            remaining = self.cooldown_remaining()
+            if remaining > self.refresh_max_wait:
+                logger.info(f"助战刷新冷却还剩 {remaining:.1f} 秒，不再刷新")
+                break
+            changed = self.wait_cooldown(sig)
+            if changed is None:
+                logger.info("刷新助战列表")
+                self.refresh()
+                refresh_count += 1
+                frame, sig = self.wait_settled(previous=sig)
+            else:
+                frame, sig = changed
+            # 新的一轮列表，上一轮的页面签名不再适用
+            self.failed_pages.clear()
+
+        logger.info("未找到指定助战，选择第一个")
+        self.click_default()
+        return False
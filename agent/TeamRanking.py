@@ -0,0 +1,152 @@
+"""按实测出击效率为同一关卡的队伍排序，并用 UCB 兼顾探索
+
+这里只选择作业文件，不会切换游戏内的编队；候选作业必须使用当前编队，否则选中的作业与实际队伍不符。
+"""
+import json
+import logging
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from Vision import resource_dir
+
+logger = logging.getLogger("FGOBattle")
+
+
+@dataclass
+class TeamPlan:
+    """从队伍文件中提取的排序所需信息(不做完整解析)"""
+    team_id: int
+    quest_id: int
+    enemy_hash: str
+    path: Path
+    turns: int
+    np_count: int
+    votes_up: int
+    votes_down: int
+
+
+@dataclass
+class TeamScore:
+    """某队伍的效率估计"""
+    plan: TeamPlan
+    runs: int
+    success_rate: float
+    duration: float            # 估计的单场用时(秒)
+    runs_per_hour: float
+    ucb: float
+
+
+def load_plan(path: Path) -> Optional[TeamPlan]:
+    """读取队伍文件中的关卡、回合数与宝具次数"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        actions = raw["data"]["result"].get("actions", [])
+        attacks = [a for a in actions if a.get("type") == "attack"]
+        votes = raw.get("votes") or {}
+        return TeamPlan(
+            team_id=raw["id"],
+            quest_id=raw["questId"],
+            enemy_hash=raw.get("enemyHash", ""),
+            path=path,
+            turns=len(attacks),
+            np_count=sum(1 for a in attacks for card in a.get("attacks", []) if card.get("isTD")),
+            votes_up=votes.get("up") or 0,
+            votes_down=votes.get("down") or 0,
+        )
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"队伍文件 {path} 无法解析: {e}")
+        return None
+
+
+class TeamRanking:
+    """同一关卡(questId + enemyHash)的队伍排序
+
+    单场用时与成功率优先使用历史数据库中的实测值，样本少时与按回合数、宝具次数
+    估算的先验值加权平均；选择时使用 UCB1，保证少跑过的队伍也会被定期尝试。
+    """
+
+    def __init__(self, history=None, team_dir: Optional[Path] = None, days: float = 7,
+                 turn_time: float = 20.0, np_time: float = 12.0, fixed_time: float = 30.0,
+                 prior_weight: float = 2.0, exploration: float = 0.5):
+        self.history = history
+        self.team_dir = team_dir or resource_dir() / "team"
+        self.days = days
+        self.turn_time = turn_time
+        self.np_time = np_time
+        self.fixed_time = fixed_time
+        self.prior_weight = prior_weight
+        self.exploration = exploration
+        self.plans = [plan for plan in map(load_plan, sorted(self.team_dir.glob("*.json"))) if plan]
+
+    @classmethod
+    def from_config(cls, config, history=None) -> "TeamRanking":
+        return cls(
+            history=history,
+            days=config.getfloat('Team', 'history_days', fallback=7.0),
+            turn_time=config.getfloat('Team', 'prior_turn_time', fallback=20.0),
+            np_time=config.getfloat('Timing', 'np_animation_wait', fallback=12.0),
+            fixed_time=config.getfloat('Team', 'prior_fixed_time', fallback=30.0),
+            exploration=config.getfloat('Team', 'ucb_exploration', fallback=0.5),
+        )
+
+    def candidates(self, quest_id: int, enemy_hash: Optional[str] = None) -> List[TeamPlan]:
+        return [p for p in self.plans
+                if p.quest_id == quest_id and (enemy_hash is None or p.enemy_hash == enemy_hash)]
+
+    def prior_duration(self, plan: TeamPlan) -> float:
+        return self.fixed_time + plan.turns * self.turn_time + plan.np_count * self.np_time
+
+    def score(self, quest_id: int, enemy_hash: Optional[str] = None) -> List[TeamScore]:
+        """返回按 UCB 值降序排列的队伍效率估计"""
+        plans = self.candidates(quest_id, enemy_hash)
+        measured: Dict[int, object] = {}
+        if self.history is not None:
+            measured = {s.team_id: s for s in self.history.team_stats(quest_id, self.days)}
+
+        estimates = []
+        for plan in plans:
+            stats = measured.get(plan.team_id)
+            runs = stats.runs if stats else 0
+            # 先验成功率来自社区投票
+            prior_success = (plan.votes_up + 1) / (plan.votes_up + plan.votes_down + 2)
+            successes = stats.success_rate * runs if stats else 0.0
+            success_rate = (successes + self.prior_weight * prior_success) / (runs + self.prior_weight)
+
+            prior = self.prior_duration(plan)
+            duration = prior
+            if stats and stats.mean_duration:
+                n = successes
+                duration = (n * stats.mean_duration + self.prior_weight * prior) / (n + self.prior_weight)
+            estimates.append((plan, runs, success_rate, duration, success_rate * 3600 / duration))
+
+        if not estimates:
+            return []
+
+        # 以最优估计归一化，使探索项与收益处于同一量级
+        best = max(e[4] for e in estimates) or 1.0
+        total_runs = sum(e[1] for e in estimates)
+        scores = []
+        for plan, runs, success_rate, duration, throughput in estimates:
+            if runs == 0:
+                ucb = math.inf
+            else:
+                ucb = throughput / best + self.exploration * math.sqrt(math.log(max(total_runs, 1)) / runs)
+            scores.append(TeamScore(plan, runs, success_rate, duration, throughput, ucb))
+        scores.sort(key=lambda s: (s.ucb, s.runs_per_hour), reverse=True)
+        return scores
+
+    def select(self, quest_id: int, enemy_hash: Optional[str] = None) -> Optional[TeamPlan]:
+        """选择下一次出击使用的队伍"""
+        scores = self.score(quest_id, enemy_hash)
+        if not scores:
+            logger.warning(f"关卡 {quest_id} 没有可用的队伍文件")
+            return None
+        for s in scores:
+            logger.info(f"队伍 {s.plan.team_id}: {s.runs} 场, 成功率 {s.success_rate:.0%}, "
+                        f"单场 {s.duration:.0f} 秒, 每小时 {s.runs_per_hour:.1f} 场, UCB {s.ucb:.3f}")
+        chosen = scores[0]
+        logger.info(f"选择队伍 {chosen.plan.team_id} ({chosen.plan.path.name})")
+        return chosen.plan
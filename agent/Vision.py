@@ -0,0 +1,134 @@
+"""图像识别公共工具：资源定位、模板缓存与画面预处理"""
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("FGOBattle")
+
+# 所有 ROI 与坐标都以 1280x720 为基准分辨率
+BASE_WIDTH = 1280
+BASE_HEIGHT = 720
+
+Roi = Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=None)
+def resource_dir() -> Path:
+    """定位资源目录(开发环境为 assets/resource，安装后为 resource)"""
+    agent_dir = Path(__file__).parent.resolve()
+    candidates = [
+        agent_dir.parent / "assets" / "resource",
+        agent_dir.parent / "resource",
+    ]
+    for candidate in candidates:
+        if candidate.exists():
+            return candidate
+    return candidates[0]
+
+
+@lru_cache(maxsize=None)
+def load_template(name: str, gray: bool = True) -> Optional[np.ndarray]:
+    """从 resource/image 加载模板图片，结果会被缓存
+
+    使用 imdecode 读取，以支持 Windows 下的中文路径。
+    """
+    path = resource_dir() / "image" / name
+    if not path.exists():
+        logger.debug(f"模板不存在: {path}")
+        return None
+    data = np.fromfile(str(path), dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR)
+    if image is None:
+        logger.warning(f"模板无法解码: {path}")
+    return image
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """转换为灰度图，已是灰度图时原样返回"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def normalize_frame(image: np.ndarray) -> np.ndarray:
+    """把截图缩放到基准分辨率，分辨率一致时不复制"""
+    height, width = image.shape[:2]
+    if (width, height) == (BASE_WIDTH, BASE_HEIGHT):
+        return image
+    return cv2.resize(image, (BASE_WIDTH, BASE_HEIGHT), interpolation=cv2.INTER_AREA)
+
+
+def crop(image: np.ndarray, roi: Roi) -> np.ndarray:
+    """按 (x, y, w, h) 截取区域，越界部分会被裁掉"""
+    x, y, w, h = roi
+    height, width = image.shape[:2]
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + w), min(height, y + h)
+    return image[y0:y1, x0:x1]
+
+
+def match_in_roi(image: np.ndarray, template: np.ndarray, roi: Optional[Roi] = None) -> Tuple[float, Tuple[int, int]]:
+    """在 ROI 内做模板匹配，返回 (最高分, 基准坐标系下的左上角坐标)"""
+    region = crop(image, roi) if roi else image
+    if region.shape[0] < template.shape[0] or region.shape[1] < template.shape[1]:
+        return 0.0, (0, 0)
+    result = cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    offset_x, offset_y = (roi[0], roi[1]) if roi else (0, 0)
+    return float(max_val), (max_loc[0] + offset_x, max_loc[1] + offset_y)
+
+
+def mean_brightness(image: np.ndarray, roi: Roi) -> float:
+    """ROI 内的平均亮度，用于判断按钮是否变暗(冷却、不可用)"""
+    region = crop(to_gray(image), roi)
+    if region.size == 0:
+        return 0.0
+    return float(region.mean())
+
+
+def normalize_patches(patches: np.ndarray) -> np.ndarray:
+    """把 (N, h, w) 的区域展平为零均值、单位长度的 (N, h*w) 向量"""
+    vectors = patches.reshape(len(patches), -1).astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-6
+    return vectors
+
+
+def batch_ncc(patches: np.ndarray, templates: np.ndarray) -> np.ndarray:
+    """一次计算多个区域与多个模板的归一化互相关
+
+    patches -- 形状为 (N, h, w) 的区域
+    templates -- 形状为 (T, h, w) 的模板，尺寸需与区域一致
+    返回形状为 (N, T) 的相似度矩阵，取值范围 [-1, 1]
+    """
+    return normalize_patches(patches) @ normalize_patches(templates).T
+
+
+def stack_rois(image: np.ndarray, rois, size: Tuple[int, int]) -> np.ndarray:
+    """截取多个 ROI 并统一缩放到 size (w, h)，返回 (N, h, w) 数组"""
+    gray = to_gray(image)
+    patches = []
+    for roi in rois:
+        region = crop(gray, roi)
+        if region.shape[:2] != (size[1], size[0]):
+            region = cv2.resize(region, size, interpolation=cv2.INTER_AREA) if region.size else np.zeros((size[1], size[0]), np.uint8)
+        patches.append(region)
+    return np.stack(patches)
+
+
+def frame_signature(image: np.ndarray, roi: Optional[Roi] = None, size: Tuple[int, int] = (32, 18)) -> bytes:
+    """画面的感知哈希，内容相同(忽略轻微噪声)的画面得到相同的签名"""
+    region = crop(to_gray(image), roi) if roi else to_gray(image)
+    small = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+    return np.packbits(small > small.mean()).tobytes()
+
+
+def frame_difference(a: np.ndarray, b: np.ndarray, size: Tuple[int, int] = (64, 36)) -> float:
+    """两帧缩小后的平均绝对差，用于判断画面是否还在变化"""
+    small_a = cv2.resize(to_gray(a), size, interpolation=cv2.INTER_AREA)
+    small_b = cv2.resize(to_gray(b), size, interpolation=cv2.INTER_AREA)
+    return float(cv2.absdiff(small_a, small_b).mean())
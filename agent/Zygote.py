@@ -0,0 +1,129 @@
+"""预热的 agent 进程池(zygote)
+
+zygote 进程预先导入 maa 与 Battle、完成 warmup，然后在本地 Unix socket 上等待；
+MaaFramework 启动的 main.py 只把 socket_id、工作目录和标准输入输出交给 zygote，
+由 zygote fork 出已经预热好的子进程执行 AgentServer，子进程结束时把退出码返回给 main.py。
+
+fork 前不能启动任何线程(包括 MaaFramework 的连接)，因此 zygote 中同步执行 warmup，
+AgentServer.start_up 只在子进程中调用。没有 fork 的平台(Windows)不支持。
+
+子进程切换到 main.py 的工作目录后才打开日志文件；配置文件(fgo_config.ini)在每次运行自定义操作时
+按当前工作目录与修改时间重新读取。预热时已经加载的内容不会更新：修改模板图片(resource/image)、
+队伍与路线等资源文件或代码后需要重启 zygote。
+"""
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+DEFAULT_PATH = os.path.join(os.environ.get("TMPDIR", "/tmp"), "fgo-maa-zygote.sock")
+
+
+def supported() -> bool:
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX")
+
+
+def socket_path() -> str:
+    return os.environ.get("FGO_MAA_ZYGOTE", DEFAULT_PATH)
+
+
+def launch(socket_id: str, path: str = None):
+    """请 zygote 为 socket_id 启动一个 agent，返回子进程的退出码；没有可用的 zygote 时返回 None"""
+    if not supported():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path or socket_path())
+    except OSError:
+        client.close()
+        return None
+
+    request = json.dumps({"socket_id": socket_id, "cwd": os.getcwd()}).encode("utf-8")
+    with client:
+        socket.send_fds(client, [request], [0, 1, 2])
+        # 子进程结束时发送退出码；连接意外断开视为异常退出
+        reply = client.makefile("rb").readline()
+    try:
+        return int(reply)
+    except ValueError:
+        return 1
+
+
+def _run_child(conn: socket.socket, request: dict, fds, run_agent):
+    """fork 出的子进程：接管 main.py 的标准输入输出并运行 agent"""
+    for target, fd in enumerate(fds[:3]):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request["cwd"])
+
+    def watch_launcher():
+        # main.py 被 MaaFramework 结束时连接断开，子进程随之退出
+        try:
+            conn.recv(1)
+        finally:
+            os._exit(1)
+
+    threading.Thread(target=watch_launcher, name="launcher-watch", daemon=True).start()
+    code = 1
+    try:
+        run_agent(request["socket_id"])
+        code = 0
+    except BaseException:
+        # os._exit 不会输出未处理的异常，这里手动输出到 main.py 的标准错误
+        traceback.print_exc()
+    finally:
+        try:
+            conn.sendall(f"{code}\n".encode("ascii"))
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+
+def serve(run_agent, path: str = None):
+    """运行 zygote：调用方已完成导入与预热，run_agent(socket_id) 在子进程中运行 agent"""
+    if not supported():
+        print("当前平台不支持 fork，无法运行 zygote")
+        return False
+
+    path = path or socket_path()
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(16)
+    # 子进程退出后由内核回收，不留下僵尸进程
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    print(f"zygote 已就绪: {path}")
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                message, fds, _, _ = socket.recv_fds(conn, 4096, 3)
+                request = json.loads(message.decode("utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"无效的请求: {e}")
+                conn.close()
+                continue
+
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _run_child(conn, request, fds, run_agent)
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+            print(f"已为 {request['socket_id']} 启动 agent (pid {pid})")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+    return True
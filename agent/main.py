@@ -1,18 +1,70 @@
 import sys
+import threading
 
-from maa.agent.agent_server import AgentServer
-from maa.toolkit import Toolkit
+import Zygote
+from Startup import StartupProfile
 
-import Battle
-def main():
-    Toolkit.init_option("./")
+# --profile-startup: 输出各阶段与模块导入的耗时
+PROFILE = StartupProfile("--profile-startup" in sys.argv)
+
+
+def load():
+    """导入 maa 与 Battle(注册所有自定义操作)"""
+    with PROFILE.phase("import maa"):
+        import maa.agent.agent_server  # noqa: F401
+        import maa.toolkit  # noqa: F401
+
+    with PROFILE.phase("import Battle (注册自定义操作)"):
+        import Battle  # noqa: F401
+
+
+def run_agent(socket_id):
+    from maa.agent.agent_server import AgentServer
+    from maa.toolkit import Toolkit
+    import Battle
+
+    # 日志文件写入本次运行的工作目录(zygote 的子进程已切换到 main.py 的工作目录)
+    Battle.setup_log_file()
+
+    with PROFILE.phase("Toolkit.init_option"):
+        Toolkit.init_option("./")
 
-    socket_id = sys.argv[-1]
+    with PROFILE.phase("AgentServer.start_up"):
+        AgentServer.start_up(socket_id)
+
+    # 连接建立后再加载第一次运行才需要的模块与模板，不阻塞第一个任务的连接
+    warmup = threading.Thread(target=Battle.warmup, name="warmup", daemon=True)
+    warmup.start()
+    if PROFILE.enabled:
+        with PROFILE.phase("后台预加载"):
+            warmup.join()
+        print(PROFILE.report())
 
-    AgentServer.start_up(socket_id)
     AgentServer.join()
     AgentServer.shut_down()
 
 
+def main():
+    if "--zygote" in sys.argv:
+        # 常驻的预热进程：fork 前同步完成全部加载，之后每个任务只需要 fork
+        load()
+        import Battle
+        Battle.warmup()
+        Zygote.serve(run_agent)
+        return
+
+    # socket_id 由 MaaFramework 作为最后一个参数传入
+    socket_id = [arg for arg in sys.argv[1:] if not arg.startswith("--")][-1]
+
+    # 有运行中的 zygote 时由它 fork 出已预热的 agent，否则在本进程中启动
+    if "--no-zygote" not in sys.argv and not PROFILE.enabled:
+        code = Zygote.launch(socket_id)
+        if code is not None:
+            sys.exit(code)
+
+    load()
+    run_agent(socket_id)
+
+
 if __name__ == "__main__":
     main()
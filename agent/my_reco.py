@@ -1,10 +1,19 @@
 from maa.agent.agent_server import AgentServer
 from maa.custom_recognition import CustomRecognition
 from maa.context import Context
+from maa.pipeline import JOCR, JRecognitionType
+
+from Recognition import PrecompiledRecognition, variant
 
 
 @AgentServer.custom_recognition("my_reco_222")
-class MyRecongition(CustomRecognition):
+class MyRecongition(PrecompiledRecognition):
+
+    # ROI 不同的识别变体在注册时构造一次，不需要 override_pipeline 或 clone
+    VARIANTS = {
+        "upper": variant(JRecognitionType.OCR, JOCR(), roi=[100, 100, 200, 300]),
+        "lower": variant(JRecognitionType.OCR, JOCR(), roi=[100, 200, 300, 400]),
+    }
 
     def analyze(
         self,
@@ -12,20 +21,8 @@ class MyRecongition(CustomRecognition):
         argv: CustomRecognition.AnalyzeArg,
     ) -> CustomRecognition.AnalyzeResult:
 
-        reco_detail = context.run_recognition(
-            "MyCustomOCR",
-            argv.image,
-            pipeline_override={"MyCustomOCR": {"roi": [100, 100, 200, 300]}},
-        )
-
-        # context is a reference, will override the pipeline for whole task
-        context.override_pipeline({"MyCustomOCR": {"roi": [1, 1, 114, 514]}})
-        # context.run_recognition ...
-
-        # make a new context to override the pipeline, only for itself
-        new_context = context.clone()
-        new_context.override_pipeline({"MyCustomOCR": {"roi": [100, 200, 300, 400]}})
-        reco_detail = new_context.run_recognition("MyCustomOCR", argv.image)
+        # 两个变体直接作用于 argv.image
+        reco_details = self.recognize_all(context, argv.image)
 
         click_job = context.tasker.controller.post_click(10, 20)
         click_job.wait()
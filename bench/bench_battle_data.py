@@ -0,0 +1,47 @@
+"""BattleData 解析与回合分组"""
+from common import benchmark, prepare_agent_import, team_files
+
+
+@benchmark("battle_data.from_json", group="battle_data")
+def bench_from_json():
+    prepare_agent_import()
+    from BattleData import BattleData
+
+    contents = [path.read_text(encoding="utf-8") for path in team_files()]
+
+    def run():
+        for content in contents:
+            BattleData.from_json(content)
+
+    return run
+
+
+@benchmark("battle_data.turn_grouping", group="battle_data", number=20)
+def bench_turn_grouping():
+    prepare_agent_import()
+    from BattleData import BattleData
+
+    results = [BattleData.from_json(path.read_text(encoding="utf-8")).data.result for path in team_files()]
+
+    def run():
+        for result in results:
+            result.__post_init__()
+
+    return run
+
+
+@benchmark("battle_data.compile_plan", group="battle_data", number=20)
+def bench_compile_plan():
+    prepare_agent_import()
+    from BattleData import BattleData
+    from BattlePlan import BattlePlan
+    from PlanValidator import PlanValidator
+
+    battles = [BattleData.from_json(path.read_text(encoding="utf-8")) for path in team_files()]
+
+    def run():
+        for battle in battles:
+            PlanValidator().validate(battle)
+            BattlePlan.compile(battle)
+
+    return run
@@ -0,0 +1,36 @@
+"""自动战斗出卡组合评分"""
+import numpy as np
+
+from common import benchmark, prepare_agent_import
+
+
+@benchmark("card_chain.best_chain", group="card_chain", number=200)
+def bench_best_chain():
+    prepare_agent_import()
+    from CardChain import Card, best_chain
+
+    cards = [Card(0, 0, 2.0), Card(1, 0), Card(2, 1), Card(0, 2, 0.5), Card(1, 1)]
+    np_colors = [0, None, None]
+
+    def run():
+        best_chain(cards, np_colors)
+
+    return run
+
+
+@benchmark("card_chain.read_cards", group="card_chain", number=20)
+def bench_read_cards():
+    prepare_agent_import()
+    from CardChain import CardLayout, CardReader
+
+    layout = CardLayout(card_centers=[(170 + 150 * i, 350) for i in range(5)],
+                        np_centers=[(250 + 200 * i, 200) for i in range(3)])
+    reader = CardReader(layout)
+    rng = np.random.default_rng(5)
+    frame = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+
+    def run():
+        reader.read(frame)
+        reader.read_np_colors(frame, reader.read_np_available(frame))
+
+    return run
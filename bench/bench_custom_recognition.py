@@ -0,0 +1,119 @@
+"""自定义识别中修改识别参数的开销：override + clone 与预编译变体
+
+使用返回固定画面的 CustomController 和只有空 pipeline 的资源运行真实的 Tasker，
+每次计时提交一个任务，其中的自定义识别连续执行 ANALYZE_COUNT 次 analyze，
+每次 analyze 对同一张截图执行两个只有 ROI 不同的 ColorMatch 识别(不依赖 OCR 模型)。
+"""
+import json
+import logging
+
+import numpy as np
+
+from common import benchmark, prepare_agent_import, sandbox_dir
+
+ANALYZE_COUNT = 20
+ROIS = {"upper": [100, 100, 200, 300], "lower": [100, 200, 300, 400]}
+COLOR = {"recognition": "ColorMatch", "lower": [0, 0, 0], "upper": [10, 10, 10]}
+
+_tasker = None
+
+
+def _create_tasker():
+    """创建并连接基准测试用的 Tasker，注册两种写法的自定义识别"""
+    from maa.controller import CustomController
+    from maa.custom_recognition import CustomRecognition
+    from maa.pipeline import JColorMatch, JRecognitionType
+    from maa.resource import Resource
+    from maa.tasker import LoggingLevelEnum, Tasker
+    from maa.toolkit import Toolkit
+
+    from Recognition import PrecompiledRecognition, variant
+
+    class StaticController(CustomController):
+        def __init__(self):
+            super().__init__()
+            self.frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+        def connect(self) -> bool:
+            return True
+
+        def request_uuid(self) -> str:
+            return "bench"
+
+        def screencap(self) -> np.ndarray:
+            return self.frame
+
+        def __getattr__(self, name):
+            # 其余控制操作(点击、滑动等)在基准测试中不会用到
+            return lambda *args, **kwargs: True
+
+    class CloneRecognition(CustomRecognition):
+        def analyze(self, context, argv):
+            for _ in range(ANALYZE_COUNT):
+                context.run_recognition("BenchColor", argv.image,
+                                        pipeline_override={"BenchColor": {**COLOR, "roi": ROIS["upper"]}})
+                new_context = context.clone()
+                new_context.override_pipeline({"BenchColor": {**COLOR, "roi": ROIS["lower"]}})
+                new_context.run_recognition("BenchColor", argv.image)
+            return CustomRecognition.AnalyzeResult(box=(0, 0, 1, 1), detail="")
+
+    base = JColorMatch(lower=[COLOR["lower"]], upper=[COLOR["upper"]])
+
+    class BenchPrecompiled(PrecompiledRecognition):
+        VARIANTS = {name: variant(JRecognitionType.ColorMatch, base, roi=roi) for name, roi in ROIS.items()}
+
+        def analyze(self, context, argv):
+            for _ in range(ANALYZE_COUNT):
+                self.recognize_all(context, argv.image)
+            return CustomRecognition.AnalyzeResult(box=(0, 0, 1, 1), detail="")
+
+    root = sandbox_dir()
+    bundle = root / "reco_bundle"
+    (bundle / "pipeline").mkdir(parents=True, exist_ok=True)
+    (bundle / "pipeline" / "bench.json").write_text(
+        json.dumps({"BenchColor": COLOR}), encoding="utf-8")
+
+    Toolkit.init_option(str(root))
+    Tasker.set_stdout_level(LoggingLevelEnum.Off)
+    controller = StaticController()
+    controller.post_connection().wait()
+    resource = Resource()
+    resource.post_bundle(str(bundle)).wait()
+    resource.register_custom_recognition("BenchClone", CloneRecognition())
+    resource.register_custom_recognition("BenchPrecompiled", BenchPrecompiled())
+    tasker = Tasker()
+    tasker.bind(resource, controller)
+    # 保持 controller/resource 的引用
+    tasker.bench_refs = (controller, resource)
+    return tasker
+
+
+def _get_tasker():
+    global _tasker
+    if _tasker is None:
+        prepare_agent_import()
+        logging.getLogger("maa").setLevel(logging.WARNING)
+        _tasker = _create_tasker()
+    return _tasker
+
+
+def _make_case(mode: str, recognition: str):
+    @benchmark(f"custom_recognition.{mode}", group="custom_recognition",
+               analyze=ANALYZE_COUNT, mode=mode)
+    def bench():
+        tasker = _get_tasker()
+        # 去掉节点默认的 pre_delay/post_delay，计时只包含任务调度与 analyze
+        override = {"BenchEntry": {"recognition": "Custom", "custom_recognition": recognition,
+                                   "pre_delay": 0, "post_delay": 0, "rate_limit": 0}}
+
+        def run():
+            if not tasker.post_task("BenchEntry", override).wait().succeeded:
+                raise RuntimeError(f"{recognition} 执行失败")
+
+        return run
+
+    return bench
+
+
+_make_case("clone", "BenchClone")
+_make_case("precompiled", "BenchPrecompiled")
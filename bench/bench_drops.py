@@ -0,0 +1,47 @@
+"""掉落界面识别与掉率统计"""
+import numpy as np
+
+from common import benchmark, prepare_agent_import, sandbox_dir
+
+
+@benchmark("drops.read_screen", group="drops", number=10)
+def bench_read_screen():
+    prepare_agent_import()
+    from DropReader import DropLayout, DropReader, ItemIconIndex
+
+    layout = DropLayout()
+    rng = np.random.default_rng(3)
+    # 模拟 300 种物品的图标索引
+    icons = rng.integers(0, 256, size=(300, layout.icon_size[1], layout.icon_size[0]), dtype=np.uint8)
+    reader = DropReader(layout=layout, index=ItemIconIndex([f"item{i}" for i in range(len(icons))], icons))
+
+    frame = np.full((720, 1280, 3), 128, dtype=np.uint8)
+    for slot, icon in zip(layout.slots()[:12], icons[::25]):
+        x, y, w, h = slot
+        frame[y:y + h, x:x + w] = icon[..., None]
+
+    def run():
+        reader.read(frame)
+
+    return run
+
+
+@benchmark("drops.rates", group="drops", number=20)
+def bench_rates():
+    prepare_agent_import()
+    from DropReader import DropStats
+    from RunHistory import RunHistory
+
+    history = RunHistory(str(sandbox_dir() / "bench_drops.db"), device="bench")
+    rng = np.random.default_rng(6)
+    # 同一关卡 2000 场的掉落，统计时由 SQLite 聚合
+    for _ in range(2000):
+        drops = {"凶骨": int(rng.integers(0, 3)), "蛇之宝玉": int(rng.integers(0, 2)), "QP": 1}
+        history.commit(history.begin(team_id=42200, quest_id=94099812), success=True, turns=3,
+                       drops={item: count for item, count in drops.items() if count})
+    stats = DropStats(history)
+
+    def run():
+        stats.rates(94099812)
+
+    return run
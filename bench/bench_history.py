@@ -0,0 +1,37 @@
+"""出击历史数据库写入与查询"""
+from common import benchmark, prepare_agent_import, sandbox_dir
+
+
+def _open_history(name):
+    prepare_agent_import()
+    from RunHistory import RunHistory
+
+    return RunHistory(str(sandbox_dir() / name), device="bench")
+
+
+@benchmark("history.commit_battle", group="history", number=10)
+def bench_commit_battle():
+    history = _open_history("bench_commit.db")
+    drops = {"凶骨": 2, "QP": 1}
+
+    def run():
+        record = history.begin(team_id=42200, quest_id=94099812)
+        for turn in range(3):
+            record.add_turn(turn, turn + 1, 0.0, 20.0)
+            record.add_wait("np_animation", 10.0, 8.5, key="2300900")
+        history.commit(record, success=True, turns=3, drops=drops)
+
+    return run
+
+
+@benchmark("history.mean_run_time", group="history", number=10)
+def bench_mean_run_time():
+    history = _open_history("bench_query.db")
+    for index in range(2000):
+        record = history.begin(team_id=42200 + index % 5, quest_id=94099812 + index % 20)
+        history.commit(record, success=True, turns=3)
+
+    def run():
+        history.mean_run_time(94099812, team_id=42200, days=7)
+
+    return run
@@ -0,0 +1,42 @@
+"""战斗日志记录开销"""
+from common import benchmark, prepare_agent_import, sandbox_dir
+
+
+def _make_logger(name):
+    prepare_agent_import()
+    from Battle import BattleLogger
+
+    return BattleLogger(log_file=str(sandbox_dir() / name))
+
+
+@benchmark("logger.battle_start", group="logger", number=50)
+def bench_battle_start():
+    battle_logger = _make_logger("bench_start.txt")
+
+    def run():
+        battle_logger.log_battle_start("bench")
+
+    return run
+
+
+@benchmark("logger.battle_end", group="logger", number=50)
+def bench_battle_end():
+    battle_logger = _make_logger("bench_end.txt")
+    drops = {"凶骨": 3, "QP": 1}
+
+    def run():
+        # 每场战斗只记录一次结束，每次计时前重新标记战斗已开始，计时包含写日志与掉落统计
+        battle_logger.battle_open = True
+        battle_logger.log_battle_end(3, drops)
+
+    return run
+
+
+@benchmark("logger.apple_use", group="logger", number=50)
+def bench_apple_use():
+    battle_logger = _make_logger("bench_apple.txt")
+
+    def run():
+        battle_logger.log_apple_use("gold")
+
+    return run
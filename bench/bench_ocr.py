@@ -0,0 +1,53 @@
+"""OCR 结果缓存：同一画面的区域全部命中缓存时的开销(哈希与查表)，以及拼接图的构建
+
+无设备环境下没有 OCR 模型，这里不计时推理本身；命中缓存时不会调用 MaaFramework。
+"""
+import numpy as np
+
+from common import benchmark, prepare_agent_import
+
+# 5 张指令卡的暴击率区域与掉落界面的 12 个数量区域
+CRIT_ROIS = [(95 + 150 * i, 260, 60, 28) for i in range(5)]
+COUNT_ROIS = [(130 + 140 * (i % 6), 230 + 150 * (i // 6), 60, 24) for i in range(12)]
+
+
+def _make_cached_case(name: str, rois):
+    @benchmark(f"ocr.read_batch_cached.{name}", group="ocr", number=50, rois=len(rois))
+    def bench():
+        prepare_agent_import()
+        from OcrReader import OcrCache, OcrReader, dhash
+        from Vision import crop
+
+        rng = np.random.default_rng(4)
+        frame = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+        cache = OcrCache()
+        for roi in rois:
+            cache.put(dhash(crop(frame, roi)), "30%")
+        reader = OcrReader(None, cache=cache)
+
+        def run():
+            reader.read_batch(frame, rois)
+
+        return run
+
+    return bench
+
+
+_make_cached_case("crit", CRIT_ROIS)
+_make_cached_case("drops", COUNT_ROIS)
+
+
+@benchmark("ocr.build_mosaic", group="ocr", number=50, rois=len(COUNT_ROIS))
+def bench_build_mosaic():
+    prepare_agent_import()
+    from OcrReader import build_mosaic
+    from Vision import crop
+
+    rng = np.random.default_rng(5)
+    frame = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+    tiles = [crop(frame, roi) for roi in COUNT_ROIS]
+
+    def run():
+        build_mosaic(tiles)
+
+    return run
@@ -0,0 +1,82 @@
+"""各检测器的模板匹配耗时"""
+import numpy as np
+
+from common import benchmark, prepare_agent_import
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+# 检测器模板在 720p 下的大致尺寸(宽, 高)，1080p 按比例放大
+DETECTOR_TEMPLATES = {
+    "battle_end": (240, 60),
+    "wave_transition": (160, 48),
+}
+
+
+def _make_case(detector: str, resolution: str):
+    width, height = RESOLUTIONS[resolution]
+    scale = width / 1280
+    tpl_w, tpl_h = (int(v * scale) for v in DETECTOR_TEMPLATES[detector])
+
+    @benchmark(f"recognition.{detector}.{resolution}", group="recognition",
+               detector=detector, resolution=resolution)
+    def bench():
+        prepare_agent_import()
+        from Battle import ImageRecognition
+
+        rng = np.random.default_rng(0)
+        # 检测器读取的是灰度模板，这里同样使用单通道图像
+        screen = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+        y, x = height // 2, width // 2
+        template = screen[y:y + tpl_h, x:x + tpl_w].copy()
+
+        def run():
+            ImageRecognition.find_template(screen, template)
+
+        return run
+
+    return bench
+
+
+for _detector in DETECTOR_TEMPLATES:
+    for _resolution in RESOLUTIONS:
+        _make_case(_detector, _resolution)
+
+
+def _make_classifier_case(resolution: str, hit: bool):
+    width, height = RESOLUTIONS[resolution]
+    label = "hit" if hit else "miss"
+
+    @benchmark(f"state_classifier.{label}.{resolution}", group="state_classifier",
+               number=10, resolution=resolution)
+    def bench():
+        prepare_agent_import()
+        from ScreenState import DEFAULT_ANCHORS, StateClassifier
+
+        rng = np.random.default_rng(1)
+        base = rng.integers(0, 256, size=(720, 1280), dtype=np.uint8)
+        classifier = StateClassifier(anchors=[])
+        for anchor in DEFAULT_ANCHORS:
+            x, y, w, h = anchor.roi
+            template = base[y + 10:y + 50, x + 10:x + 60].copy()
+            classifier.add_anchor(anchor, template)
+
+        # 命中场景使用包含锚点的画面，未命中场景使用全新的随机画面(遍历全部锚点)
+        frame = base if hit else rng.integers(0, 256, size=(720, 1280), dtype=np.uint8)
+        if (width, height) != (1280, 720):
+            import cv2
+            frame = cv2.resize(frame, (width, height))
+
+        def run():
+            classifier.classify(frame)
+
+        return run
+
+    return bench
+
+
+for _resolution in RESOLUTIONS:
+    _make_classifier_case(_resolution, hit=True)
+    _make_classifier_case(_resolution, hit=False)
@@ -0,0 +1,31 @@
+"""连续出击流程自身的开销(不含游戏加载时间)"""
+import numpy as np
+
+from common import benchmark, prepare_agent_import
+
+
+@benchmark("repeat_loop.run", group="repeat_loop", number=20)
+def bench_repeat_loop():
+    prepare_agent_import()
+    from RepeatLoop import RepeatLoop
+    from ScreenState import ScreenState
+
+    states = [ScreenState.BATTLE_RESULT, ScreenState.DROP_RESULT, ScreenState.REPEAT_DIALOG,
+              ScreenState.SUPPORT_SELECT, ScreenState.BATTLE_COMMAND]
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+
+    class Classifier:
+        anchors = {state: None for state in states}
+
+        def __init__(self):
+            self.sequence = iter(states)
+
+        def classify(self, _frame):
+            return next(self.sequence)
+
+    def run():
+        RepeatLoop(lambda: frame, Classifier(), lambda x, y: None,
+                   read_drops=lambda _frame: {}, on_results_done=lambda _drops: None,
+                   should_continue=lambda: True, restore_ap=lambda required=True: True, select_support=lambda: True).run()
+
+    return run
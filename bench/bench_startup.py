@@ -0,0 +1,18 @@
+"""agent 冷启动：新进程中导入 Battle(注册所有自定义操作)的耗时"""
+import subprocess
+import sys
+
+from common import AGENT_DIR, benchmark, sandbox_dir
+
+IMPORT_BATTLE = f"import sys; sys.path.insert(0, {str(AGENT_DIR)!r}); import Battle"
+
+
+@benchmark("startup.import_battle", group="startup", number=1)
+def bench_import_battle():
+    cwd = sandbox_dir()
+
+    def run():
+        subprocess.run([sys.executable, "-c", IMPORT_BATTLE], cwd=cwd, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    return run
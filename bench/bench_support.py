@@ -0,0 +1,35 @@
+"""助战列表单页批量比对"""
+import numpy as np
+
+from common import benchmark, prepare_agent_import
+
+
+class _Config:
+    """只提供默认值的配置"""
+
+    def get(self, section, option, fallback=None):
+        return fallback
+
+    getint = getfloat = getboolean = get
+
+
+@benchmark("support.match_page", group="support", number=20)
+def bench_match_page():
+    prepare_agent_import()
+    from SupportScanner import SupportScanner, SupportTarget
+
+    rng = np.random.default_rng(2)
+    frame = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+    scanner = SupportScanner(None, _Config(), capture=lambda: frame)
+    layout = scanner.layout
+    scanner.targets = [
+        SupportTarget("servant", rng.integers(0, 256, (140, 130), dtype=np.uint8), [layout.portrait_roi]),
+        SupportTarget("ce", rng.integers(0, 256, (55, 130), dtype=np.uint8), [layout.ce_roi]),
+        SupportTarget("skill", rng.integers(0, 256, (30, 40), dtype=np.uint8), layout.skill_rois),
+    ]
+
+    def run():
+        scanner.find_row(frame)
+        scanner.signature(frame)
+
+    return run
@@ -0,0 +1,151 @@
+"""updatemaa.py 下载与校验，使用本地 HTTP 服务代替 GitHub"""
+import hashlib
+import http.server
+import os
+import threading
+
+from common import benchmark, prepare_root_import, sandbox_dir
+
+PAYLOAD_SIZE = 16 * 1024 * 1024
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """只提供一个文件、支持单个 Range 区间的 HTTP 服务"""
+    payload = b""
+
+    def do_GET(self):
+        data = self.payload
+        header = self.headers.get("Range")
+        if header and header.startswith("bytes="):
+            first, _, last = header[6:].partition("-")
+            start = int(first)
+            end = min(int(last) if last else len(data) - 1, len(data) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            body = data[start:end + 1]
+        else:
+            self.send_response(200)
+            body = data
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def serve_payload():
+    """启动本地服务，返回下载链接与摘要"""
+    global _server
+    if _server is None:
+        RangeHandler.payload = os.urandom(PAYLOAD_SIZE)
+        _server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{_server.server_address[1]}/MaaFramework.zip"
+    return url, "sha256:" + hashlib.sha256(RangeHandler.payload).hexdigest()
+
+
+def _download_bench(workers):
+    prepare_root_import()
+    import updatemaa
+
+    url, digest = serve_payload()
+    target = str(sandbox_dir() / "MaaFramework.zip")
+
+    def run():
+        assert updatemaa.download_file(url, target, digest=digest, workers=workers, segment_size=2 * 1024 * 1024)
+
+    return run
+
+
+@benchmark("update.download_single", group="update", workers=1)
+def bench_download_single():
+    return _download_bench(1)
+
+
+@benchmark("update.download_parallel", group="update", workers=4)
+def bench_download_parallel():
+    return _download_bench(4)
+
+
+def _synthetic_zip():
+    """生成一个含多个大文件的压缩包，内容可压缩，模拟 MaaFramework 的二进制文件"""
+    import zipfile
+
+    path = sandbox_dir() / "synthetic.zip"
+    if not path.exists():
+        block = os.urandom(64 * 1024)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            for i in range(24):
+                zip_ref.writestr(f"bin/lib{i:02d}.dll", (block + bytes(64 * 1024)) * (8 + i))
+            for i in range(200):
+                zip_ref.writestr(f"share/file{i:03d}.txt", f"resource {i}\n" * 500)
+    return str(path)
+
+
+def _unzip_bench(workers, skip_unchanged, fresh):
+    prepare_root_import()
+    import shutil
+    import updatemaa
+
+    archive = _synthetic_zip()
+    target = sandbox_dir() / f"unzip_{workers}_{skip_unchanged}"
+    updatemaa.unzip(archive, str(target), workers=workers)
+
+    def run():
+        if fresh:
+            shutil.rmtree(target, ignore_errors=True)
+        updatemaa.unzip(archive, str(target), workers=workers, skip_unchanged=skip_unchanged)
+
+    return run
+
+
+@benchmark("update.unzip_single", group="update", workers=1)
+def bench_unzip_single():
+    return _unzip_bench(1, False, True)
+
+
+@benchmark("update.unzip_parallel", group="update", workers=4)
+def bench_unzip_parallel():
+    return _unzip_bench(4, False, True)
+
+
+@benchmark("update.unzip_unchanged", group="update", workers=4)
+def bench_unzip_unchanged():
+    return _unzip_bench(4, True, False)
+
+
+@benchmark("update.delta_update", group="update", workers=4)
+def bench_delta_update():
+    """压缩包中只有一个文件改变时的增量更新"""
+    prepare_root_import()
+    import io
+    import zipfile
+    import updatemaa
+
+    archive = _synthetic_zip()
+    target = str(sandbox_dir() / "delta")
+    updatemaa.unzip(archive, target)
+    url, _ = serve_payload()
+
+    with zipfile.ZipFile(archive) as source:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as changed:
+            for info in source.infolist():
+                data = source.read(info)
+                changed.writestr(info.filename, data[:-1] + b"x" if info.filename == "bin/lib00.dll" else data)
+    payload = buffer.getvalue()
+
+    def run():
+        original, RangeHandler.payload = RangeHandler.payload, payload
+        try:
+            assert updatemaa.delta_update(url, target)
+        finally:
+            RangeHandler.payload = original
+        # 恢复为原版本，下一次采样同样只有一个文件需要更新
+        assert updatemaa.rollback(target)
+
+    return run
@@ -0,0 +1,101 @@
+"""基准测试公共工具：注册表、计时与结果汇总"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).parent.parent.resolve()
+AGENT_DIR = ROOT_DIR / "agent"
+RESOURCE_DIR = ROOT_DIR / "assets" / "resource"
+TEAM_DIR = RESOURCE_DIR / "team"
+
+
+@dataclass
+class Benchmark:
+    """一个已注册的基准测试"""
+    name: str
+    group: str
+    func: Callable[[], Callable[[], None]]
+    number: int = 1
+    params: Dict[str, object] = field(default_factory=dict)
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, group: str, number: int = 1, **params):
+    """注册基准测试
+
+    被装饰函数负责准备数据并返回一个无参可调用对象，计时只覆盖该可调用对象。
+    number 为每次采样内的调用次数，用于测量亚微秒级的操作。
+    """
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, group, setup, number, params))
+        return setup
+    return decorator
+
+
+def measure(fn: Callable[[], None], repeat: int, number: int, warmup: int = 2) -> Dict[str, float]:
+    """多次采样并返回单次调用耗时的统计值(秒)"""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter_ns() - start) / number / 1e9)
+
+    samples.sort()
+    p95_index = min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))
+    return {
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "p95": samples[p95_index],
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+_sandbox: Optional[tempfile.TemporaryDirectory] = None
+
+
+def prepare_agent_import():
+    """让 agent 模块可以在无设备环境下导入
+
+    Battle.py 在导入时会在当前目录读取(或创建)配置文件，这里切换到临时目录，
+    避免污染仓库，同时压低日志级别，不让日志输出干扰计时。
+    """
+    global _sandbox
+    if str(AGENT_DIR) not in sys.path:
+        sys.path.insert(0, str(AGENT_DIR))
+    if _sandbox is None:
+        _sandbox = tempfile.TemporaryDirectory(prefix="fgo_bench_")
+        os.chdir(_sandbox.name)
+    logging.getLogger("FGOBattle").setLevel(logging.WARNING)
+
+
+def prepare_root_import():
+    """让仓库根目录下的脚本(updatemaa.py 等)可以导入，工作目录同样切换到临时目录"""
+    prepare_agent_import()
+    if str(ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(ROOT_DIR))
+
+
+def sandbox_dir() -> Path:
+    """基准测试使用的临时工作目录"""
+    prepare_agent_import()
+    return Path(_sandbox.name)
+
+
+def team_files() -> List[Path]:
+    """仓库中所有的队伍文件"""
+    return sorted(TEAM_DIR.glob("*.json"))
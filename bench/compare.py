@@ -0,0 +1,75 @@
+"""对比两次基准测试结果，发现性能回退
+
+用法:
+    python bench/compare.py 基线.json 当前.json [--threshold 0.1]
+
+任一用例的中位数耗时比基线慢超过阈值时，以退出码 1 结束。
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def load(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base: dict, head: dict, threshold: float, metric: str = "median"):
+    """返回 (表格行, 回退用例列表)"""
+    rows = []
+    regressions = []
+    base_results = base["results"]
+    head_results = head["results"]
+
+    for name in sorted(set(base_results) | set(head_results)):
+        if name not in base_results:
+            rows.append((name, None, head_results[name][metric], None, "新增"))
+            continue
+        if name not in head_results:
+            rows.append((name, base_results[name][metric], None, None, "移除"))
+            continue
+
+        old = base_results[name][metric]
+        new = head_results[name][metric]
+        change = (new - old) / old if old > 0 else 0.0
+        status = ""
+        if change > threshold:
+            status = "回退"
+            regressions.append(name)
+        elif change < -threshold:
+            status = "提升"
+        rows.append((name, old, new, change, status))
+
+    return rows, regressions
+
+
+def _fmt_time(value):
+    return "-" if value is None else f"{value * 1e6:.1f}us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准测试结果")
+    parser.add_argument("base", type=Path, help="基线结果 JSON")
+    parser.add_argument("head", type=Path, help="当前结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定为回退的相对变化，默认 0.1 (10%%)")
+    parser.add_argument("--metric", default="median", choices=["min", "median", "mean", "p95"])
+    args = parser.parse_args()
+
+    base = load(args.base)
+    head = load(args.head)
+    rows, regressions = compare(base, head, args.threshold, args.metric)
+
+    print(f"基线 {base['meta']['commit']} -> 当前 {head['meta']['commit']} ({args.metric})")
+    for name, old, new, change, status in rows:
+        change_text = "-" if change is None else f"{change:+.1%}"
+        print(f"{name:<45} {_fmt_time(old):>12} {_fmt_time(new):>12} {change_text:>8} {status}")
+
+    if regressions:
+        print(f"\n{len(regressions)} 个用例出现回退: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""运行基准测试并输出 JSON 结果
+
+用法:
+    python bench/run.py [--filter 关键字] [--repeat 次数] [--output 结果.json]
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent.resolve()
+sys.path.insert(0, str(BENCH_DIR))
+
+from common import BENCHMARKS, ROOT_DIR, measure  # noqa: E402
+
+
+def load_benchmarks():
+    """导入 bench 目录下所有 bench_*.py 以完成注册"""
+    for path in sorted(BENCH_DIR.glob("bench_*.py")):
+        importlib.import_module(path.stem)
+
+
+def git_revision() -> str:
+    """当前提交的哈希，不在 git 仓库中时返回 unknown"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FGO-MAA 战斗热路径基准测试")
+    parser.add_argument("--filter", default="", help="只运行名称包含该关键字的用例")
+    parser.add_argument("--repeat", type=int, default=30, help="每个用例的采样次数")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径，默认输出到标准输出")
+    parser.add_argument("--list", action="store_true", help="只列出用例")
+    args = parser.parse_args()
+
+    load_benchmarks()
+    selected = [b for b in BENCHMARKS if args.filter in b.name]
+
+    if args.list:
+        for bench in selected:
+            print(bench.name)
+        return
+
+    results = {}
+    for bench in selected:
+        print(f"运行 {bench.name} ...", file=sys.stderr)
+        # 被测代码的输出不能混入标准输出中的 JSON 结果
+        with contextlib.redirect_stdout(sys.stderr):
+            stats = measure(bench.func(), repeat=args.repeat, number=bench.number)
+        stats["group"] = bench.group
+        stats.update(bench.params)
+        results[bench.name] = stats
+        print(f"  median {stats['median'] * 1e6:.1f} us", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
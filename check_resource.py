@@ -1,37 +1,223 @@
+import hashlib
+import json
 import sys
+import time
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
 
-from maa.resource import Resource
-from maa.tasker import Tasker, LoggingLevelEnum
+CACHE_FILE = Path(".check_resource_cache.json")
 
+# 目前 MaaFramework 支持的识别与动作类型，新版本增加的类型只给出警告
+RECOGNITIONS = {
+    "DirectHit", "TemplateMatch", "FeatureMatch", "ColorMatch", "OCR",
+    "NeuralNetworkClassify", "NeuralNetworkDetect", "And", "Or", "Custom",
+}
+ACTIONS = {
+    "DoNothing", "Click", "LongPress", "Swipe", "MultiSwipe", "Scroll",
+    "TouchDown", "TouchMove", "TouchUp", "ClickKey", "LongPressKey", "KeyDown", "KeyUp",
+    "InputText", "StartApp", "StopApp", "StopTask", "Command", "Shell", "Custom",
+}
+# 值为节点名(或节点名列表)的字段
+TARGET_FIELDS = ("next", "interrupt", "on_error", "timeout_next")
 
-def check(dirs: List[Path]) -> bool:
-    resource = Resource()
 
+@dataclass
+class Issue:
+    level: str  # "error" | "warning"
+    file: str
+    node: Optional[str]
+    message: str
+
+    def __str__(self):
+        where = f"{self.file}" + (f" [{self.node}]" if self.node else "")
+        return f"{self.level}: {where}: {self.message}"
+
+
+@dataclass
+class Result:
+    dir: Path
+    ok: bool
+    seconds: float
+    issues: List[Issue]
+    cached: bool = False
+
+
+def bundle_hash(dir: Path) -> str:
+    """资源目录的内容哈希：所有文件的相对路径与内容"""
+    hasher = hashlib.sha256()
+    for path in sorted(p for p in dir.rglob("*") if p.is_file()):
+        hasher.update(path.relative_to(dir).as_posix().encode("utf-8") + b"\0")
+        hasher.update(path.read_bytes())
+    return hasher.hexdigest()
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def node_targets(node: dict) -> Iterable[Tuple[str, str]]:
+    """节点引用的其它节点 (字段, 节点名)，去掉 [JumpBack] 等前缀"""
+    for field in TARGET_FIELDS:
+        for target in _as_list(node.get(field)):
+            if isinstance(target, dict):
+                target = target.get("name")
+            if isinstance(target, str):
+                while target.startswith("["):
+                    target = target.split("]", 1)[-1]
+                yield field, target
+
+
+def node_templates(node: dict) -> List[str]:
+    """节点引用的模板图片，相对于 image 目录"""
+    templates = []
+    for key in ("template", "template_path"):
+        templates.extend(t for t in _as_list(node.get(key)) if isinstance(t, str))
+    return templates
+
+
+def load_pipeline(dir: Path, issues: List[Issue]) -> Dict[str, Tuple[str, dict]]:
+    """读取 pipeline 目录下的所有节点，返回 {节点名: (文件, 节点)}"""
+    nodes = {}
+    for path in sorted((dir / "pipeline").rglob("*.json")):
+        name = path.relative_to(dir).as_posix()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            issues.append(Issue("error", name, None, f"无法解析: {e}"))
+            continue
+        if not isinstance(data, dict):
+            issues.append(Issue("error", name, None, "顶层必须是对象"))
+            continue
+        for node_name, node in data.items():
+            if node_name.startswith("$"):
+                continue
+            if not isinstance(node, dict):
+                issues.append(Issue("error", name, node_name, "节点必须是对象"))
+                continue
+            if node_name in nodes:
+                issues.append(Issue("error", name, node_name, f"与 {nodes[node_name][0]} 中的节点重名"))
+            nodes[node_name] = (name, node)
+    return nodes
+
+
+def precheck(dir: Path, strict: bool = False) -> List[Issue]:
+    """不加载 MaaFramework 的静态检查
+
+    所有 json 必须可以解析；pipeline 节点的字段类型、识别与动作类型、引用的节点与模板必须存在。
+    缺少模板图片在 strict 为 False 时只是警告(运行时该节点永远识别失败)。
+    """
+    issues: List[Issue] = []
+    for path in sorted(dir.rglob("*.json")):
+        if "pipeline" in path.relative_to(dir).parts:
+            continue
+        try:
+            json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            issues.append(Issue("error", path.relative_to(dir).as_posix(), None, f"无法解析: {e}"))
+
+    nodes = load_pipeline(dir, issues)
+    image_dir = dir / "image"
+    for node_name, (file, node) in nodes.items():
+        recognition = node.get("recognition", "DirectHit")
+        action = node.get("action", "DoNothing")
+        if not isinstance(recognition, (str, dict)):
+            issues.append(Issue("error", file, node_name, "recognition 类型错误"))
+        elif isinstance(recognition, str) and recognition not in RECOGNITIONS:
+            issues.append(Issue("warning", file, node_name, f"未知的识别类型 {recognition}"))
+        if not isinstance(action, (str, dict)):
+            issues.append(Issue("error", file, node_name, "action 类型错误"))
+        elif isinstance(action, str) and action not in ACTIONS:
+            issues.append(Issue("warning", file, node_name, f"未知的动作类型 {action}"))
+        for field in TARGET_FIELDS:
+            if field in node and not isinstance(node[field], (str, list)):
+                issues.append(Issue("error", file, node_name, f"{field} 必须是字符串或列表"))
+        for field, target in node_targets(node):
+            if target not in nodes:
+                issues.append(Issue("error", file, node_name, f"{field} 中的节点 {target} 不存在"))
+        for template in node_templates(node):
+            if not (image_dir / template).exists():
+                issues.append(Issue("error" if strict else "warning", file, node_name, f"模板 {template} 不存在"))
+    return issues
+
+
+def _load_bundle(dir: Path) -> bool:
+    """用 MaaFramework 加载资源目录"""
+    from maa.resource import Resource
+
+    return Resource().post_bundle(dir).wait().status.succeeded
+
+
+def check_one(dir: Path, strict: bool = False) -> Result:
+    started = time.perf_counter()
+    issues = precheck(dir, strict)
+    ok = not any(issue.level == "error" for issue in issues)
+    # 静态检查失败时不再加载框架
+    if ok and not _load_bundle(dir):
+        issues.append(Issue("error", str(dir), None, "MaaFramework 加载失败"))
+        ok = False
+    return Result(dir, ok, time.perf_counter() - started, issues)
+
+
+def _load_cache(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def check(dirs: List[Path], strict: bool = False, cache_path: Optional[Path] = CACHE_FILE,
+          workers: int = 4) -> bool:
+    """并发检查所有资源目录，内容未变且上次通过的目录直接跳过，报告全部失败"""
     print(f"Checking {len(dirs)} directories...")
+    cache = _load_cache(cache_path) if cache_path else {}
+    # 严格模式通过的结果与普通模式分开缓存
+    hashes = {dir: bundle_hash(dir) + (":strict" if strict else "") for dir in dirs}
+    pending = [dir for dir in dirs if cache.get(str(dir)) != hashes[dir]]
+    results = [Result(dir, True, 0.0, [], cached=True) for dir in dirs if dir not in pending]
+
+    if pending:
+        # 全部命中缓存时不需要导入 MaaFramework
+        from maa.tasker import Tasker, LoggingLevelEnum
 
-    for dir in dirs:
-        print(f"Checking {dir}...")
-        status = resource.post_bundle(dir).wait().status
-        if not status.succeeded:
-            print(f"Failed to check {dir}.")
-            return False
+        Tasker.set_stdout_level(LoggingLevelEnum.All)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results += executor.map(lambda dir: check_one(dir, strict), pending)
 
+    for result in sorted(results, key=lambda r: str(r.dir)):
+        state = "cached" if result.cached else ("ok" if result.ok else "FAILED")
+        print(f"{result.dir}: {state} ({result.seconds:.2f}s)")
+        for issue in result.issues:
+            print(f"  {issue}")
+        if result.ok:
+            cache[str(result.dir)] = hashes[result.dir]
+        else:
+            cache.pop(str(result.dir), None)
+
+    if cache_path:
+        cache_path.write_text(json.dumps(cache, indent=4), encoding="utf-8")
+
+    failed = [result for result in results if not result.ok]
+    if failed:
+        print(f"Failed to check {len(failed)} of {len(dirs)} directories.")
+        return False
     print("All directories checked.")
     return True
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python configure.py <directory>")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args:
+        print("Usage: python check_resource.py [--strict] [--no-cache] <directory>...")
         sys.exit(1)
 
-    Tasker.set_stdout_level(LoggingLevelEnum.All)
-
-    dirs = [Path(arg) for arg in sys.argv[1:]]
-    if not check(dirs):
+    dirs = [Path(arg) for arg in args]
+    cache_path = None if "--no-cache" in sys.argv else CACHE_FILE
+    if not check(dirs, strict="--strict" in sys.argv, cache_path=cache_path):
         sys.exit(1)
 
 
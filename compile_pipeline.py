@@ -0,0 +1,239 @@
+"""pipeline 预编译与静态分析
+
+构建节点图，报告悬空引用、不可达节点与缺失的模板，删除永远无法识别成功的候选，输出优化后的资源目录。
+
+next 中候选的顺序就是识别的优先级，多个候选可能同时命中同一画面，因此默认不改变顺序；
+只有在确认各候选互斥时才使用 --reorder 按记录的命中次数重排。
+
+用法:
+    python compile_pipeline.py [资源目录] [--output 输出目录] [--stats 命中统计.json]
+                               [--record maa.log ...] [--entry 节点 ...] [--strict] [--reorder]
+"""
+import json
+import re
+import shutil
+import sys
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from check_resource import TARGET_FIELDS, Issue, load_pipeline, node_targets, node_templates
+
+ROOT_DIR = Path(__file__).parent
+DEFAULT_STATS = ROOT_DIR / "pipeline_stats.json"
+
+# MaaFramework 日志中的节点事件，例如
+# !!!OnEventNotify!!! [handle=true] [msg=Node.NextList.Starting] [details={"name": ..., "list": [...]}]
+EVENT_PATTERN = re.compile(r"\[msg=(Node\.NextList\.Starting|Node\.Recognition\.Succeeded)\] \[details=(\{.*\})\]")
+
+
+@dataclass
+class PipelineGraph:
+    """所有 pipeline 文件中的节点与它们之间的引用"""
+    nodes: Dict[str, Tuple[str, dict]]
+    issues: List[Issue] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, bundle: Path) -> "PipelineGraph":
+        issues: List[Issue] = []
+        nodes = load_pipeline(bundle, issues)
+        return cls(nodes, issues)
+
+    def edges(self, name: str) -> Iterable[str]:
+        return (target for _, target in node_targets(self.nodes[name][1]))
+
+    def reachable(self, entries: Iterable[str]) -> Set[str]:
+        seen = set()
+        queue = deque(entry for entry in entries if entry in self.nodes)
+        while queue:
+            name = queue.popleft()
+            if name in seen:
+                continue
+            seen.add(name)
+            queue.extend(target for target in self.edges(name) if target in self.nodes and target not in seen)
+        return seen
+
+
+def interface_entries(interface: Path) -> List[str]:
+    """interface.json 中各任务的入口节点"""
+    try:
+        data = json.loads(interface.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    return [task["entry"] for task in data.get("task", []) if task.get("entry")]
+
+
+def load_stats(path: Path) -> Dict[str, Dict[str, int]]:
+    """命中统计 {节点: {next 候选: 命中次数}}"""
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def record_hits(logs: Iterable[Path], stats: Dict[str, Dict[str, int]]) -> int:
+    """从 MaaFramework 日志中统计每个节点的 next 候选命中次数，累加到 stats，返回新记录的次数"""
+    recorded = 0
+    current: Dict[object, Tuple[str, Set[str]]] = {}  # task_id -> (节点, 候选)
+    for log in logs:
+        with open(log, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                match = EVENT_PATTERN.search(line)
+                if not match:
+                    continue
+                try:
+                    details = json.loads(match.group(2))
+                except ValueError:
+                    continue
+                task_id = details.get("task_id")
+                if match.group(1) == "Node.NextList.Starting":
+                    candidates = {item["name"] if isinstance(item, dict) else item for item in details.get("list", [])}
+                    current[task_id] = (details.get("name"), candidates)
+                elif task_id in current:
+                    parent, candidates = current.pop(task_id)
+                    name = details.get("name")
+                    if name in candidates:
+                        hits = stats.setdefault(parent, {})
+                        hits[name] = hits.get(name, 0) + 1
+                        recorded += 1
+    return recorded
+
+
+def _can_match(node: dict, image_dir: Path) -> bool:
+    """模板匹配节点的模板全部缺失时永远识别失败"""
+    if node.get("recognition") != "TemplateMatch":
+        return True
+    templates = node_templates(node)
+    return not templates or any((image_dir / template).exists() for template in templates)
+
+
+def _candidate_name(item) -> Optional[str]:
+    name = item.get("name") if isinstance(item, dict) else item
+    if not isinstance(name, str):
+        return None
+    while name.startswith("["):
+        name = name.split("]", 1)[-1]
+    return name
+
+
+def optimize(graph: PipelineGraph, bundle: Path, stats: Dict[str, Dict[str, int]],
+             reorder: bool = False) -> Tuple[Dict[str, dict], List[str]]:
+    """返回优化后的节点 {节点: 节点定义} 与修改说明
+
+    next 类字段中删除悬空与永远无法识别的候选。reorder 为 True 时其余候选按命中次数降序稳定排序，
+    没有命中记录的候选保持原有相对顺序并排在有记录的候选之后；这会改变识别优先级，
+    调用方需要确认同一字段中的候选不会同时命中。
+    """
+    image_dir = bundle / "image"
+    optimized = {}
+    changes = []
+    for name, (_, node) in graph.nodes.items():
+        node = dict(node)
+        hits = stats.get(name, {})
+        for key in TARGET_FIELDS:
+            if not isinstance(node.get(key), list):
+                continue
+            kept = []
+            for item in node[key]:
+                target = _candidate_name(item)
+                if target not in graph.nodes:
+                    changes.append(f"{name}.{key}: 删除不存在的节点 {target}")
+                elif not _can_match(graph.nodes[target][1], image_dir):
+                    changes.append(f"{name}.{key}: 删除无法识别的节点 {target} (模板缺失)")
+                else:
+                    kept.append(item)
+            ordered = sorted(kept, key=lambda item: -hits.get(_candidate_name(item), 0)) if reorder else kept
+            if [_candidate_name(item) for item in ordered] != [_candidate_name(item) for item in kept]:
+                changes.append(f"{name}.{key}: 按命中次数重排为 {[_candidate_name(item) for item in ordered]}")
+            node[key] = ordered
+        optimized[name] = node
+    return optimized, changes
+
+
+def analyze(graph: PipelineGraph, bundle: Path, entries: List[str], strict: bool = False) -> List[Issue]:
+    """悬空引用、不可达节点、缺失的模板"""
+    issues = list(graph.issues)
+    image_dir = bundle / "image"
+    for entry in entries:
+        if entry not in graph.nodes:
+            issues.append(Issue("error", "interface.json", entry, "入口节点不存在"))
+    reachable = graph.reachable(entries)
+    for name, (file, node) in graph.nodes.items():
+        for key, target in node_targets(node):
+            if target not in graph.nodes:
+                issues.append(Issue("error", file, name, f"{key} 中的节点 {target} 不存在"))
+        for template in node_templates(node):
+            if not (image_dir / template).exists():
+                issues.append(Issue("error" if strict else "warning", file, name, f"模板 {template} 不存在"))
+        if entries and name not in reachable:
+            issues.append(Issue("warning", file, name, "从任何入口都不可达"))
+    return issues
+
+
+def compile_bundle(bundle: Path, output: Path, stats: Dict[str, Dict[str, int]],
+                   entries: List[str], strict: bool = False, reorder: bool = False) -> bool:
+    """分析并输出优化后的资源目录，存在错误时不输出并返回 False"""
+    graph = PipelineGraph.load(bundle)
+    issues = analyze(graph, bundle, entries, strict)
+    for issue in issues:
+        print(issue)
+    if any(issue.level == "error" for issue in issues):
+        print("存在错误，未输出优化后的 pipeline")
+        return False
+
+    optimized, changes = optimize(graph, bundle, stats, reorder)
+    for change in changes:
+        print(change)
+
+    if output.resolve() != bundle.resolve():
+        shutil.copytree(bundle, output, dirs_exist_ok=True, ignore=shutil.ignore_patterns("pipeline"))
+    # 保持原有的文件划分，每个节点写回它所在的文件
+    files: Dict[str, Dict[str, dict]] = {}
+    for name, (file, _) in graph.nodes.items():
+        files.setdefault(file, {})[name] = optimized[name]
+    for file, nodes in files.items():
+        path = output / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(nodes, ensure_ascii=False, indent=4), encoding="utf-8")
+    print(f"已输出 {len(graph.nodes)} 个节点到 {output}，修改 {len(changes)} 处")
+    return True
+
+
+def _arg_values(name: str) -> List[str]:
+    """读取 --name 之后直到下一个 -- 参数的所有值"""
+    if name not in sys.argv:
+        return []
+    values = []
+    for arg in sys.argv[sys.argv.index(name) + 1:]:
+        if arg.startswith("--"):
+            break
+        values.append(arg)
+    return values
+
+
+def main():
+    positional = []
+    for arg in sys.argv[1:]:
+        if arg.startswith("--"):
+            break
+        positional.append(arg)
+    bundle = Path(positional[0]) if positional else ROOT_DIR / "assets" / "resource"
+    output = Path((_arg_values("--output") or ["build/resource"])[0])
+    stats_path = Path((_arg_values("--stats") or [DEFAULT_STATS])[0])
+
+    stats = load_stats(stats_path)
+    logs = [Path(log) for log in _arg_values("--record")]
+    if logs:
+        recorded = record_hits(logs, stats)
+        stats_path.write_text(json.dumps(stats, ensure_ascii=False, indent=4), encoding="utf-8")
+        print(f"从日志中记录了 {recorded} 次命中，已写入 {stats_path}")
+
+    entries = interface_entries(bundle.parent / "interface.json") + _arg_values("--entry")
+    if not compile_bundle(bundle, output, stats, entries, strict="--strict" in sys.argv,
+                          reorder="--reorder" in sys.argv):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
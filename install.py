@@ -5,6 +5,7 @@ import sys
 import json
 
 from configure import configure_ocr_model
+from compile_pipeline import compile_bundle, interface_entries
 
 
 working_dir = Path(__file__).parent
@@ -50,6 +51,14 @@ def install_resource():
         install_path,
     )
 
+    # 检查安装后的 pipeline 并删除无法识别的候选，不改变 next 的优先级；分析出错时保留原样
+    compile_bundle(
+        install_path / "resource",
+        install_path / "resource",
+        {},
+        interface_entries(working_dir / "assets" / "interface.json"),
+    )
+
     with open(install_path / "interface.json", "r", encoding="utf-8") as f:
         interface = json.load(f)
 
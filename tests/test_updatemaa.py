@@ -0,0 +1,162 @@
+"""updatemaa.py 下载的离线测试，使用本地 HTTP 服务代替 GitHub
+
+本地服务模拟 GitHub Release 的行为：下载链接先重定向到每次签名都不同的地址，再按 Range 返回数据。
+还可以模拟不支持 Range 的服务器、返回错误的区间以及提前断开的连接。
+"""
+import hashlib
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import updatemaa  # noqa: E402
+
+PAYLOAD_SIZE = 256 * 1024
+SEGMENT_SIZE = 64 * 1024
+CHUNK_SIZE = 8 * 1024
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """模拟 GitHub Release 下载的请求处理，行为由 server 上的属性控制"""
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/MaaFramework.zip":
+            # 与 GitHub 一样重定向到带签名的地址，签名每次请求都不同
+            with server.lock:
+                server.signature += 1
+                signature = server.signature
+            self.send_response(302)
+            self.send_header("Location", f"/signed/MaaFramework.zip?sig={signature}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        data = server.payload
+        header = self.headers.get("Range")
+        if header and header.startswith("bytes=") and server.ranged:
+            first, _, last = header[6:].partition("-")
+            start = int(first)
+            end = min(int(last) if last else len(data) - 1, len(data) - 1)
+            if start in server.broken_starts:
+                self.send_error(500)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            body = data[start:end + 1]
+        else:
+            self.send_response(200)
+            body = data
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        with server.lock:
+            truncate = len(body) > 1 and server.truncations > 0
+            if truncate:
+                server.truncations -= 1
+        if truncate:
+            # 只发送一半数据就断开连接
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        self.wfile.write(body)
+        with server.lock:
+            server.served += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, payload):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.payload = payload
+        self.lock = threading.Lock()
+        self.signature = 0
+        self.ranged = True
+        # 这些起始位置的区间请求返回 500
+        self.broken_starts = set()
+        # 接下来的多少个响应只发送一半数据
+        self.truncations = 0
+        # 已发送的数据字节数(不含响应头)
+        self.served = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/MaaFramework.zip"
+
+
+class DownloadFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = os.urandom(PAYLOAD_SIZE)
+        self.digest = "sha256:" + hashlib.sha256(self.payload).hexdigest()
+        self.server = StandInServer(self.payload)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.tmp.name, "MaaFramework.zip")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def download(self, digest=None, workers=4):
+        return updatemaa.download_file(self.server.url, self.target, digest=digest, workers=workers,
+                                       chunk_size=CHUNK_SIZE, segment_size=SEGMENT_SIZE)
+
+    def assertDownloaded(self):
+        with open(self.target, "rb") as f:
+            self.assertEqual(f.read(), self.payload)
+        self.assertFalse(os.path.exists(self.target + ".part"))
+        self.assertFalse(os.path.exists(self.target + ".part.json"))
+
+    def test_parallel_download(self):
+        self.assertTrue(self.download(self.digest))
+        self.assertDownloaded()
+
+    def test_resume_from_partial_download(self):
+        # 第一个分段之后的区间都失败，重试用尽后保留 .part 与进度文件
+        self.server.broken_starts = set(range(SEGMENT_SIZE, PAYLOAD_SIZE, SEGMENT_SIZE))
+        self.assertFalse(self.download(self.digest, workers=1))
+        self.assertTrue(os.path.exists(self.target + ".part"))
+        self.assertTrue(os.path.exists(self.target + ".part.json"))
+
+        # 再次运行时重定向后的签名已经不同，仍然从断点继续，只下载剩余的分段
+        self.server.broken_starts = set()
+        self.server.served = 0
+        self.assertTrue(self.download(self.digest, workers=1))
+        self.assertDownloaded()
+        # 探测请求会多发送 1 个字节
+        self.assertEqual(self.server.served, PAYLOAD_SIZE - SEGMENT_SIZE + 1)
+
+    def test_digest_mismatch_removes_partial_file(self):
+        wrong = "sha256:" + hashlib.sha256(b"other").hexdigest()
+        self.assertFalse(self.download(wrong))
+        self.assertFalse(os.path.exists(self.target))
+        self.assertFalse(os.path.exists(self.target + ".part"))
+        self.assertFalse(os.path.exists(self.target + ".part.json"))
+
+    def test_server_without_range_falls_back_to_single_stream(self):
+        self.server.ranged = False
+        self.assertTrue(self.download(self.digest))
+        self.assertDownloaded()
+        # 探测请求与下载请求各返回一次完整文件
+        self.assertEqual(self.server.served, 2 * PAYLOAD_SIZE)
+
+    def test_early_closed_segment_is_retried(self):
+        # 探测请求只有 1 个字节不会被截断，接下来两个分段请求提前断开
+        self.server.truncations = 2
+        self.assertTrue(self.download(self.digest, workers=1))
+        self.assertEqual(self.server.truncations, 0)
+        self.assertDownloaded()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,16 @@
 import ctypes
+import hashlib
+import io
+import json
 import os
 import platform
+import shutil
 import sys
+import threading
+import time
 import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import wintypes
 from pathlib import Path
 from typing import Optional
@@ -59,6 +67,9 @@ def get_local_version_from_dll(dll_path: str) -> Optional[str]:
     dll_path = os.path.abspath(dll_path)
 
     # 1. 尝试加载 DLL
+    if not hasattr(ctypes, "WinDLL"):
+        print("当前平台不支持读取 DLL 版本", file=sys.stderr)
+        return "NONE"
     try:
         # 使用 WinDLL 以便获取句柄
         lib = ctypes.WinDLL(dll_path)
@@ -106,7 +117,7 @@ def _safe_unload_dll(handle: int) -> bool:
         bool -- 是否成功卸载
     """
     try:
-        if handle and kernel32.FreeLibrary(handle):
+        if handle and _kernel32().FreeLibrary(handle):
             return True
         return False
     except Exception as e:
@@ -173,15 +184,84 @@ def custum_ver_select(resource_list):
             print("请输入有效的数字")
 
 
-def get_github_download_options():
-    """获取Github的下载选项（前5个版本）"""
-    url = "https://api.github.com/repos/MaaXYZ/MaaFramework/releases"
+RELEASES_URL = "https://api.github.com/repos/MaaXYZ/MaaFramework/releases"
+RELEASE_CACHE = "maa_releases.json"
+
+
+def _load_release_cache(cache_path):
     try:
-        response = requests.get(url, timeout=10)
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_release_cache(cache_path, cache):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def fetch_releases(cache_path=RELEASE_CACHE, ttl=3600):
+    """获取前5个 Release 的信息，使用本地缓存
+    Arguments:
+        cache_path {str} -- 缓存文件路径
+        ttl {int} -- 缓存有效期(秒)，有效期内不发起任何网络请求
+    Returns:
+        list -- Release 列表，失败时返回 None
+
+    缓存过期后带 If-None-Match / If-Modified-Since 请求，未改变时(304)只刷新缓存时间；
+    网络错误时退回到过期的缓存。
+    """
+    cache = _load_release_cache(cache_path)
+    if cache and time.time() - cache.get("fetched_at", 0) < ttl:
+        return cache["releases"]
+
+    headers = {}
+    if cache and cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache and cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+    try:
+        response = requests.get(RELEASES_URL, headers=headers, timeout=10)
+        if response.status_code == 304 and cache:
+            cache["fetched_at"] = time.time()
+            _save_release_cache(cache_path, cache)
+            return cache["releases"]
         response.raise_for_status()
-        releases = response.json()[:5]
     except requests.exceptions.RequestException as e:
         print(f"获取发布信息失败: {str(e)}")
+        if cache:
+            print("使用过期的本地缓存")
+            return cache["releases"]
+        return None
+
+    # 只保留用到的字段，缓存文件保持很小
+    releases = [
+        {
+            "tag_name": release['tag_name'],
+            "assets": [{key: asset.get(key) for key in ("name", "browser_download_url", "size", "digest")}
+                       for asset in release.get("assets", [])]
+        } for release in response.json()[:5]
+    ]
+    cache = {
+        "fetched_at": time.time(),
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "releases": releases,
+    }
+    try:
+        _save_release_cache(cache_path, cache)
+    except OSError as e:
+        print(f"写入发布信息缓存失败: {e}")
+    return releases
+
+
+def get_github_download_options(cache_path=RELEASE_CACHE, ttl=3600):
+    """获取Github的下载选项（前5个版本）"""
+    releases = fetch_releases(cache_path, ttl)
+    if releases is None:
         return None
 
     if not releases:
@@ -200,7 +280,9 @@ def get_github_download_options():
                 "name": asset['name'],
                 "url": asset['browser_download_url'],
                 "size": asset['size'],
-                "size_mb": asset['size'] / (1024 * 1024)
+                "size_mb": asset['size'] / (1024 * 1024),
+                # 形如 "sha256:<hex>"，较早的 Release 没有该字段
+                "digest": asset.get('digest')
             } for i, asset in enumerate(assets)
         ]
         resource_list.append({"version": version, "assets": asset_list})
@@ -281,32 +363,326 @@ def check_version(file_ver, url_ver):
     return file_ver in url_ver
 
 
-def download_file(url):
-    r = requests.get(
-        url,
-        allow_redirects=True,
-        stream=True,
-        timeout=10
-    )
-    with open("MaaFramework.zip", "wb") as f:
-        for chunk in r.iter_content(chunk_size=8192):
-            f.write(chunk)
+def find_asset(resource_list, url):
+    """根据下载链接查找资源信息
+    Arguments:
+        resource_list {list} -- 通过Release获取到的列表
+        url {str} -- 下载链接
+    Returns:
+        dict -- 资源信息，找不到时返回 None
+    """
+    for release in resource_list or []:
+        for asset in release['assets']:
+            if asset['url'] == url:
+                return asset
+    return None
+
+
+def verify_digest(filename, digest, chunk_size=1024 * 1024):
+    """校验文件的摘要
+    Arguments:
+        filename {str} -- 文件路径
+        digest {str} -- 形如 "sha256:<hex>" 的摘要
+    Returns:
+        bool -- 摘要一致时返回True，算法不支持时视为通过
+    """
+    algorithm, _, expected = digest.partition(":")
+    try:
+        hasher = hashlib.new(algorithm)
+    except ValueError:
+        print(f"不支持的校验算法 {algorithm}，跳过校验")
+        return True
+    with open(filename, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            hasher.update(block)
+    return hasher.hexdigest() == expected.lower()
+
+
+def _probe(session, url):
+    """获取重定向后的下载地址、文件大小以及服务器是否支持 Range"""
+    r = session.get(url, headers={"Range": "bytes=0-0"}, allow_redirects=True, stream=True, timeout=10)
+    r.raise_for_status()
+    r.close()
+    if r.status_code == 206 and "/" in r.headers.get("Content-Range", ""):
+        total = r.headers["Content-Range"].rsplit("/", 1)[1]
+        if total.isdigit():
+            return r.url, int(total), True
+    size = r.headers.get("Content-Length")
+    return r.url, int(size) if size and size.isdigit() else None, False
+
+
+class _DownloadState:
+    """分段下载的进度，保存在 <文件名>.part.json 中用于断点续传
+
+    进度按原始下载链接、大小与摘要识别。GitHub 的下载链接重定向后带有每次请求都不同的签名，
+    重定向后的地址只用于本次下载，不能用来判断是否为同一个文件。
+    """
+
+    def __init__(self, path, url, size, segment_size, digest=None):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.saved_at = 0.0
+        # 任一分段失败或用户中断时通知其余分段尽快停止
+        self.stop = threading.Event()
+        self.data = {"url": url, "size": size, "digest": digest, "segment_size": segment_size, "done": {}}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                key = ("url", "size", "digest", "segment_size")
+                if all(saved.get(name) == self.data[name] for name in key):
+                    self.data = saved
+            except (OSError, ValueError):
+                pass
+
+    def done(self, index):
+        return self.data["done"].get(str(index), 0)
+
+    def update(self, index, written):
+        with self.lock:
+            self.data["done"][str(index)] = written
+
+    def save(self, min_interval=0.0):
+        """写入进度文件，距上次写入不足 min_interval 秒时跳过"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.saved_at < min_interval:
+                return
+            self.saved_at = now
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(tmp_path, self.path)
+
+
+def _download_segment(session, url, part_path, state, index, start, end, chunk_size, progress, retries=3,
+                      save_interval=1.0):
+    """下载 [start, end] 区间，失败时从已写入的位置重试，重试用尽仍未完成时抛出异常
+
+    下载过程中每 save_interval 秒保存一次进度，中断后最多重新下载这段时间内的数据。
+    保存进度前先把缓冲区写入文件，进度文件中记录的字节数不会超过 .part 中实际写入的数据。
+    """
+    for attempt in range(retries):
+        offset = start + state.done(index)
+        if offset > end:
+            return
+        if state.stop.is_set():
+            return
+        try:
+            r = session.get(url, headers={"Range": f"bytes={offset}-{end}"}, stream=True, timeout=10)
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise requests.exceptions.RequestException("服务器未按 Range 返回数据")
+            written = state.done(index)
+            flushed_at = time.monotonic()
+            try:
+                with open(part_path, "r+b") as f:
+                    f.seek(offset)
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        if state.stop.is_set():
+                            break
+                        f.write(chunk)
+                        written += len(chunk)
+                        progress(len(chunk))
+                        if time.monotonic() - flushed_at >= save_interval:
+                            f.flush()
+                            state.update(index, written)
+                            state.save(save_interval)
+                            flushed_at = time.monotonic()
+            finally:
+                r.close()
+                # 文件关闭时缓冲区已经写入，此时才记录全部已写入的字节数
+                state.update(index, written)
+            if state.stop.is_set():
+                return
+            if start + state.done(index) > end:
+                state.save()
+                return
+            # 连接提前结束但没有报错，剩余部分继续重试
+            if attempt < retries - 1:
+                print(f"\n分段 {index} 数据不完整，正在重试")
+        except requests.exceptions.RequestException as e:
+            if attempt == retries - 1:
+                raise
+            print(f"\n分段 {index} 下载中断，正在重试: {e}")
+    raise requests.exceptions.RequestException(f"分段 {index} 重试 {retries} 次后仍未下载完整")
+
+
+def download_file(url, filename="MaaFramework.zip", digest=None, workers=4,
+                  chunk_size=64 * 1024, segment_size=4 * 1024 * 1024):
+    """多线程分段下载文件，支持断点续传
+    Arguments:
+        url {str} -- 下载链接
+        filename {str} -- 保存的文件名
+        digest {str} -- 形如 "sha256:<hex>" 的摘要，为 None 时只检查大小
+        workers {int} -- 并发连接数
+        chunk_size {int} -- 每次读取写入的字节数
+        segment_size {int} -- 每个分段的字节数，断点续传以分段内已写入的字节为单位
+    Returns:
+        bool -- 下载并校验成功时返回True
+
+    下载先写入 <文件名>.part，校验通过后才替换为目标文件；服务器不支持 Range 时退回单线程下载。
+    """
+    part_path = f"{filename}.part"
+    state_path = f"{filename}.part.json"
+    session = requests.Session()
+    try:
+        real_url, size, ranged = _probe(session, url)
+    except requests.exceptions.RequestException as e:
+        print(f"获取下载信息失败: {e}")
+        return False
+
+    downloaded = [0]
+    shown = [-1]
+    lock = threading.Lock()
+
+    def progress(n):
+        with lock:
+            downloaded[0] += n
+            # 百分比变化时才刷新进度，避免每个数据块都输出
+            percent = downloaded[0] * 100 // size if size else -1
+            if percent != shown[0]:
+                shown[0] = percent
+                print(f"\r下载进度: {percent}% ({downloaded[0] / (1024 * 1024):.1f} MB)", end="", file=sys.stderr, flush=True)
+
+    try:
+        if ranged and size:
+            state = _DownloadState(state_path, url, size, segment_size, digest)
+            segments = [(i, start, min(start + segment_size, size) - 1)
+                        for i, start in enumerate(range(0, size, segment_size))]
+            mode = "r+b" if os.path.exists(part_path) and state.data["done"] else "wb"
+            with open(part_path, mode) as f:
+                f.truncate(size)
+            downloaded[0] = sum(state.done(i) for i, _, _ in segments)
+            if downloaded[0]:
+                print(f"从 {downloaded[0] / (1024 * 1024):.1f} MB 处继续下载")
+            executor = ThreadPoolExecutor(max_workers=max(1, workers))
+            try:
+                futures = [executor.submit(_download_segment, session, real_url, part_path, state,
+                                           i, start, end, chunk_size, progress)
+                           for i, start, end in segments]
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # 包括 Ctrl-C：通知正在下载的分段停止，不再等待剩余分段全部下载完
+                state.stop.set()
+                raise
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+                state.save()
+            # .part 文件预先分配了完整大小，只能按各分段已写入的字节数判断是否下载完整
+            missing = [i for i, start, end in segments if state.done(i) != end - start + 1]
+            if missing:
+                print(f"\n分段 {missing} 未下载完整，再次运行将从断点继续")
+                return False
+        else:
+            r = session.get(real_url, stream=True, timeout=10)
+            r.raise_for_status()
+            with open(part_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    progress(len(chunk))
+        print(file=sys.stderr)
+    except requests.exceptions.RequestException as e:
+        print(f"\n下载失败，再次运行将从断点继续: {e}")
+        return False
+
+    if size and os.path.getsize(part_path) != size:
+        print(f"文件大小不一致: {os.path.getsize(part_path)} != {size}")
+        return False
+    if digest:
+        print("正在校验文件")
+        if not verify_digest(part_path, digest):
+            print("文件校验失败，已删除下载的文件")
+            os.remove(part_path)
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            return False
+    os.replace(part_path, filename)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return True
+
+
+def _member_path(target_dir, name):
+    """压缩包成员在目标目录中的路径，拒绝指向目标目录之外的成员"""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None
+    return os.path.join(target_dir, *parts)
+
+
+def _file_crc(path, buffer_size):
+    """计算磁盘上文件的 CRC32"""
+    crc = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(buffer_size)
+            if not block:
+                return crc
+            crc = zlib.crc32(block, crc)
+
+
+def _is_unchanged(info, path, buffer_size):
+    """磁盘上的文件与压缩包成员大小和 CRC 都一致时视为未改变"""
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+    except OSError:
+        return False
+    return _file_crc(path, buffer_size) == info.CRC
+
+
+class _Progress:
+    """线程安全的进度条，最多每 interval 秒刷新一次，输出到标准错误"""
+
+    def __init__(self, title, total, interval=0.1, bar_length=50):
+        self.title = title
+        self.total = total
+        self.interval = interval
+        self.bar_length = bar_length
+        self.count = 0
+        self.shown_at = 0.0
+        self.lock = threading.Lock()
+
+    def advance(self):
+        with self.lock:
+            self.count += 1
+            now = time.monotonic()
+            if self.count < self.total and now - self.shown_at < self.interval:
+                return
+            self.shown_at = now
+            progress = self.count / self.total if self.total else 1.0
+            bar = '█' * int(self.bar_length * progress)
+            print(f"\r{self.title}: [{bar:<{self.bar_length}}] {progress:.0%} ({self.count}/{self.total})", end="",
+                  file=sys.stderr, flush=True)
+
+
+def ask_target_dir(interactive=True):
+    """询问解压路径，留空或非交互模式时为上两级目录"""
+    if not interactive:
+        return "../../"
+    target_dir = input("请输入解压路径（留空则解压到上两级目录）: ").strip()
+    # 如果留空，使用当前目录(或者在此自定义路径)
+    return target_dir or "../../"
 
 
-def unzip(filename, target_dir=None):
+def unzip(filename, target_dir=None, workers=1, skip_unchanged=True, buffer_size=1024 * 1024):
     """
     解压ZIP文件到指定目录
     参数:
     filename -- 要解压的ZIP文件名
     target_dir -- 解压目标目录（默认为当前目录）
+    workers -- 并发解压的线程数，默认单线程；多线程只在多核机器上可能有收益，单核上实测没有加速
+    skip_unchanged -- 跳过磁盘上大小与 CRC 都一致的文件，升级时只写入改变的文件
+    buffer_size -- 解压与校验时每次读写的字节数
     """
     # 如果没有指定目标目录，询问用户
     if target_dir is None:
-        target_dir = input("请输入解压路径（留空则解压到上两级目录）: ").strip()
-
-    # 如果留空，使用当前目录(或者在此自定义路径)
-    if not target_dir:
-        target_dir = "../../"
+        target_dir = ask_target_dir()
 
     # 创建目标目录（如果不存在）
     os.makedirs(target_dir, exist_ok=True)
@@ -315,25 +691,53 @@ def unzip(filename, target_dir=None):
 
     try:
         with zipfile.ZipFile(filename, 'r') as zip_ref:
-            file_list = zip_ref.namelist()
-            total_files = len(file_list)
-
-            for i, file in enumerate(file_list, 1):
-                zip_ref.extract(file, target_dir)
-
-                # 计算进度百分比
-                progress = i / total_files
-                # 构造进度条字符串（50字符宽度）
-                bar_length = 50
-                bar = '█' * int(bar_length * progress)
-                percent = f"{progress:.0%}"
-                # 使用回车符覆盖当前行
-                print(
-                    f"\r解压进度: [{bar:<{bar_length}}] {percent} ({i}/{total_files})", end="")
-
-            # 最后换行
-            print("\n解压完成！")
-            return True
+            members = []
+            for info in zip_ref.infolist():
+                path = _member_path(target_dir, info.filename)
+                if path is None:
+                    print(f"\n跳过不安全的路径: {info.filename}")
+                    continue
+                if info.is_dir():
+                    os.makedirs(path, exist_ok=True)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    members.append((info, path))
+
+        # 每个线程使用独立的 ZipFile，避免共享文件句柄上的定位竞争
+        local = threading.local()
+        opened = []
+        opened_lock = threading.Lock()
+        progress = _Progress("解压进度", len(members))
+        written = [0]
+
+        def extract(member):
+            info, path = member
+            if not (skip_unchanged and _is_unchanged(info, path, buffer_size)):
+                if not hasattr(local, "zip_ref"):
+                    local.zip_ref = zipfile.ZipFile(filename, 'r')
+                    with opened_lock:
+                        opened.append(local.zip_ref)
+                with local.zip_ref.open(info) as source, open(path, "wb") as target:
+                    shutil.copyfileobj(source, target, buffer_size)
+                with opened_lock:
+                    written[0] += 1
+            progress.advance()
+
+        try:
+            # 大文件先开始，减少最后只剩一个线程在解压的时间
+            members.sort(key=lambda member: member[0].file_size, reverse=True)
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                for _ in executor.map(extract, members):
+                    pass
+        finally:
+            for zip_ref in opened:
+                zip_ref.close()
+
+        save_manifest(target_dir, {info.filename: [info.CRC, info.file_size] for info, _ in members})
+
+        # 最后换行
+        print(f"\n解压完成！写入 {written[0]} 个文件，跳过 {len(members) - written[0]} 个未改变的文件")
+        return True
     except zipfile.BadZipFile:
         print(f"错误: {filename} 不是有效的ZIP文件")
         return False
@@ -345,6 +749,253 @@ def unzip(filename, target_dir=None):
         return False
 
 
+MANIFEST_NAME = "maa_manifest.json"
+UPDATE_DIR = ".maa_update"
+
+
+def load_manifest(target_dir):
+    """读取已安装文件的清单 {成员名: [CRC32, 大小]}，不存在时返回空字典"""
+    try:
+        with open(os.path.join(target_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(target_dir, files):
+    """原子地写入已安装文件的清单"""
+    path = os.path.join(target_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+class _RemoteFile(io.RawIOBase):
+    """通过 HTTP Range 按需读取的远程文件，供 zipfile 直接读取中央目录与单个成员
+
+    已读取的区间缓存在内存中，copy() 得到共享缓存内容的独立读取位置，供多线程使用。
+    """
+
+    def __init__(self, session, url, size, blocks=None, readahead=256 * 1024):
+        super().__init__()
+        self.session = session
+        self.url = url
+        self.size = size
+        self.blocks = dict(blocks or {})
+        self.readahead = readahead
+        self.position = 0
+
+    def copy(self):
+        return _RemoteFile(self.session, self.url, self.size, self.blocks, self.readahead)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def fetch(self, start, end):
+        """读取 [start, end] 区间并缓存，已缓存的区间不重复读取"""
+        end = min(end, self.size - 1)
+        data = self._cached(start)
+        if data is not None and len(data) > end - start:
+            return
+        r = self.session.get(self.url, headers={"Range": f"bytes={start}-{end}"}, timeout=10)
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise requests.exceptions.RequestException("服务器未按 Range 返回数据")
+        self.blocks[start] = r.content
+
+    def _cached(self, position):
+        for start, data in self.blocks.items():
+            if start <= position < start + len(data):
+                return data[position - start:]
+        return None
+
+    def readinto(self, buffer):
+        wanted = min(len(buffer), self.size - self.position)
+        filled = 0
+        while filled < wanted:
+            data = self._cached(self.position)
+            if data is None:
+                self.fetch(self.position, self.position + max(wanted - filled, self.readahead) - 1)
+                continue
+            n = min(len(data), wanted - filled)
+            buffer[filled:filled + n] = data[:n]
+            filled += n
+            self.position += n
+        return filled
+
+
+def _changed_members(zip_ref, target_dir, manifest, buffer_size=1024 * 1024):
+    """比较中央目录与已安装文件，返回需要写入的成员 [(ZipInfo, 路径)]"""
+    changed = []
+    for info in zip_ref.infolist():
+        path = _member_path(target_dir, info.filename)
+        if path is None or info.is_dir():
+            continue
+        recorded = manifest.get(info.filename)
+        if recorded == [info.CRC, info.file_size]:
+            # 清单一致时只确认文件仍在且大小未变，不重新计算 CRC
+            try:
+                if os.path.getsize(path) == info.file_size:
+                    continue
+            except OSError:
+                pass
+        elif recorded is None and _is_unchanged(info, path, buffer_size):
+            # 没有清单(首次增量更新)时按磁盘上的 CRC 判断
+            continue
+        changed.append((info, path))
+    return changed
+
+
+def _swap_in(target_dir, staged, removed):
+    """用暂存的文件替换目标文件，旧文件移入备份目录；任何一步失败都回滚已完成的替换
+
+    staged 为 [(暂存路径, 目标路径)]，removed 为需要删除的目标路径。
+    """
+    update_dir = os.path.join(target_dir, UPDATE_DIR)
+    backup_dir = os.path.join(update_dir, "backup")
+    shutil.rmtree(backup_dir, ignore_errors=True)
+    journal = {"replaced": [], "added": []}
+    manifest_path = os.path.join(target_dir, MANIFEST_NAME)
+    try:
+        if os.path.exists(manifest_path):
+            os.makedirs(backup_dir, exist_ok=True)
+            shutil.copy2(manifest_path, os.path.join(backup_dir, MANIFEST_NAME))
+        for source, path in staged + [(None, path) for path in removed]:
+            relative = os.path.relpath(path, target_dir)
+            if os.path.exists(path):
+                backup = os.path.join(backup_dir, relative)
+                os.makedirs(os.path.dirname(backup), exist_ok=True)
+                os.replace(path, backup)
+                journal["replaced"].append(relative)
+            elif source is not None:
+                journal["added"].append(relative)
+            if source is not None:
+                os.replace(source, path)
+    except OSError as e:
+        print(f"替换文件失败，正在回滚: {e}")
+        _restore(target_dir, journal)
+        raise
+    with open(os.path.join(update_dir, "journal.json"), "w", encoding="utf-8") as f:
+        json.dump(journal, f, ensure_ascii=False)
+
+
+def _restore(target_dir, journal):
+    """按日志把备份目录中的文件放回原处，并删除新增的文件"""
+    backup_dir = os.path.join(target_dir, UPDATE_DIR, "backup")
+    for relative in journal["added"]:
+        path = os.path.join(target_dir, relative)
+        if os.path.exists(path):
+            os.remove(path)
+    for relative in journal["replaced"]:
+        backup = os.path.join(backup_dir, relative)
+        if os.path.exists(backup):
+            os.replace(backup, os.path.join(target_dir, relative))
+    backup_manifest = os.path.join(backup_dir, MANIFEST_NAME)
+    if os.path.exists(backup_manifest):
+        os.replace(backup_manifest, os.path.join(target_dir, MANIFEST_NAME))
+
+
+def rollback(target_dir):
+    """撤销上一次增量更新
+    Returns:
+        bool -- 是否找到可回滚的更新
+    """
+    journal_path = os.path.join(target_dir, UPDATE_DIR, "journal.json")
+    if not os.path.exists(journal_path):
+        print("没有可回滚的更新")
+        return False
+    with open(journal_path, "r", encoding="utf-8") as f:
+        journal = json.load(f)
+    _restore(target_dir, journal)
+    os.remove(journal_path)
+    print(f"已回滚 {len(journal['replaced'])} 个文件，删除 {len(journal['added'])} 个新增文件")
+    return True
+
+
+def delta_update(url, target_dir, workers=4, buffer_size=1024 * 1024):
+    """增量更新：只下载并替换与已安装文件不同的压缩包成员
+    Arguments:
+        url {str} -- 压缩包下载链接
+        target_dir {str} -- 安装目录
+    Returns:
+        bool -- 更新成功时返回True；服务器不支持 Range 或更新失败时返回False，此时安装目录保持不变
+
+    通过 Range 请求读取压缩包末尾的中央目录，与安装目录中的清单比较，只下载改变的成员；
+    每个成员由 zipfile 校验 CRC，全部下载到暂存目录后才替换，失败时回滚。
+    """
+    session = requests.Session()
+    try:
+        real_url, size, ranged = _probe(session, url)
+        if not ranged or not size:
+            print("服务器不支持分段下载，无法增量更新")
+            return False
+        remote = _RemoteFile(session, real_url, size)
+        # 中央目录位于末尾，一次读取末尾的 EOCD 与注释区
+        remote.fetch(max(0, size - 65536 - 22), size - 1)
+        with zipfile.ZipFile(remote) as zip_ref:
+            infos = zip_ref.infolist()
+            manifest = load_manifest(target_dir)
+            changed = _changed_members(zip_ref, target_dir, manifest, buffer_size)
+    except (requests.exceptions.RequestException, zipfile.BadZipFile) as e:
+        print(f"读取压缩包目录失败，无法增量更新: {e}")
+        return False
+
+    names = {info.filename for info in infos if not info.is_dir()}
+    removed = [path for path in (_member_path(target_dir, name) for name in manifest if name not in names)
+               if path and os.path.exists(path)]
+    print(f"压缩包共 {len(names)} 个文件，需要更新 {len(changed)} 个，删除 {len(removed)} 个")
+
+    staging_dir = os.path.join(target_dir, UPDATE_DIR, "staging")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    local = threading.local()
+    progress = _Progress("增量更新", len(changed))
+
+    def fetch(member):
+        info, path = member
+        if not hasattr(local, "zip_ref"):
+            local.zip_ref = zipfile.ZipFile(remote.copy())
+        # 本地文件头的扩展字段可能比中央目录中的长，多读一些避免再次请求
+        header = 30 + len(info.orig_filename.encode("utf-8")) + len(info.extra) + 1024
+        local.zip_ref.fp.fetch(info.header_offset, info.header_offset + header + info.compress_size)
+        staged = os.path.join(staging_dir, os.path.relpath(path, target_dir))
+        os.makedirs(os.path.dirname(staged), exist_ok=True)
+        with local.zip_ref.open(info) as source, open(staged, "wb") as target:
+            shutil.copyfileobj(source, target, buffer_size)
+        # 成员数据已写入暂存目录，释放该成员的缓存
+        local.zip_ref.fp.blocks.pop(info.header_offset, None)
+        progress.advance()
+        return staged, path
+
+    try:
+        for _, path in changed:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            staged = list(executor.map(fetch, changed))
+        print()
+        _swap_in(target_dir, staged, removed)
+    except (requests.exceptions.RequestException, zipfile.BadZipFile, OSError) as e:
+        print(f"\n增量更新失败，安装目录未改变: {e}")
+        return False
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    save_manifest(target_dir, {info.filename: [info.CRC, info.file_size] for info in infos if not info.is_dir()})
+    print("增量更新完成")
+    return True
+
+
 def delete_file(filename):
     """安全删除文件并处理所有异常"""
     try:
@@ -372,23 +1023,35 @@ def delete_file(filename):
         return False
 
 
-def main(is_debug=False, is_delete=True):
+DEFAULT_DLL_PATH = "../../bin/MaaFramework.dll"
+
+
+def main(is_debug=False, is_delete=True, workers=4, chunk_size=64 * 1024, full=False,
+         interactive=True, target_dir=None, dll_path=None, ttl=3600):
+    """检查并更新 MaaFramework
+    Returns:
+        bool -- 已是最新版本或更新成功时返回True
+
+    interactive 为 False 时不等待任何输入：自动选择匹配当前平台的最新版本，
+    未指定 target_dir 时解压到上两级目录，可以由脚本批量调用。
+    """
+    dll_path = os.path.abspath(dll_path or DEFAULT_DLL_PATH)
     print("正在获取最新版本信息", end=":\t")
-    download_options = get_github_download_options()
+    download_options = get_github_download_options(ttl=ttl)
     if download_options is None:
         print("网络错误或者手动退出,无法更新")
-        return None
+        return False
 
-    auto_update = auto_update_check()
+    auto_update = auto_update_check() if interactive else True
 
     print("正在获取本地版本信息", end=":\n")
     file_ver = get_local_version_from_dll(dll_path)
     print(f"当前版本:{file_ver}")
 
     url_ver = select_download_resource(download_options, auto_update)
-    if url_ver is None:
+    if not url_ver:
         print("无法找到最新版本，无法更新")
-        return None
+        return False
     print(f"本地版本:{file_ver}")
     print(f"网络最新版本:{url_ver}")
 
@@ -396,10 +1059,17 @@ def main(is_debug=False, is_delete=True):
     checked_version = not check_version(file_ver, url_ver)
     if checked_version or is_debug or not is_delete:
         print("\n当前版本与选中版本不符，需要更新\n")
+        target_dir = target_dir or ask_target_dir(interactive)
+        if not full and delta_update(url_ver, target_dir, workers=workers):
+            return True
         print("正在下载文件MaaFramework.zip")
-        download_file(url_ver)
+        asset = find_asset(download_options, url_ver) or {}
+        if not download_file(url_ver, digest=asset.get('digest'), workers=workers, chunk_size=chunk_size):
+            print("下载失败，无法更新")
+            return False
         print("正在解压文件")
-        unzip("MaaFramework.zip")
+        if not unzip("MaaFramework.zip", target_dir):
+            return False
         print("解压完成")
     else:
         print("已是最新版本，无需更新")
@@ -409,6 +1079,7 @@ def main(is_debug=False, is_delete=True):
     elif is_delete:
         print("正在删除文件MaaFramework.zip")
         delete_file("MaaFramework.zip")
+    return True
 
 
 def auto_update_check():
@@ -416,27 +1087,51 @@ def auto_update_check():
     return not auto_update
 
 
-print("正在切换工作路径至exe所在路径")
-os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
+_kernel32_lib = None
+
 
-kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
-kernel32.FreeLibrary.argtypes = [wintypes.HMODULE]
-dll_path = os.path.abspath("../../bin/MaaFramework.dll")
+def _kernel32():
+    """kernel32 只在 Windows 上卸载 DLL 时加载，使本模块可以在其它平台导入"""
+    global _kernel32_lib
+    if _kernel32_lib is None:
+        _kernel32_lib = ctypes.WinDLL('kernel32', use_last_error=True)
+        _kernel32_lib.FreeLibrary.argtypes = [wintypes.HMODULE]
+    return _kernel32_lib
+
+
+def _arg_value(name, default, convert=int):
+    """读取形如 --name 值 的参数"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return convert(sys.argv[index + 1])
+    return default
 
 
 if __name__ == "__main__":
+    print("正在切换工作路径至exe所在路径")
+    os.chdir(os.path.dirname(os.path.realpath(sys.argv[0])))
+    dll_path = os.path.abspath(DEFAULT_DLL_PATH)
+    # 非交互模式：不等待输入，以退出码表示结果，供脚本批量更新
+    interactive = "--non_interactive" not in sys.argv
+    target_dir = _arg_value("--target", None, str)  # 解压路径，未指定时询问(非交互模式为上两级目录)
+    ttl = _arg_value("--ttl", 3600)  # 发布信息缓存的有效期(秒)
+    ok = True
+
     if "--unzip" in sys.argv:  # 仅进行本地压缩包解压，不下载
         print("仅进行本地压缩包解压，不下载")
-        unzip("MaaFramework.zip")
+        ok = unzip("MaaFramework.zip", target_dir or ask_target_dir(interactive))
+    elif "--rollback" in sys.argv:  # 撤销上一次增量更新
+        ok = rollback(target_dir or ask_target_dir(interactive))
     elif "--check_version" in sys.argv:  # 仅进行版本检查,不下载
         print("仅进行版本检查,不下载")
         file_ver = get_local_version_from_dll(dll_path)
         print(file_ver)
         url_ver = select_download_resource(
-            get_github_download_options(), False)
+            get_github_download_options(ttl=ttl), not interactive)
         print(url_ver)
-        check_resalt = check_version(file_ver, url_ver)
-        print(check_resalt)
+        ok = bool(url_ver) and check_version(file_ver, url_ver)
+        print(ok)
     else:
         is_debug = False
         is_delete = True
@@ -446,5 +1141,11 @@ if __name__ == "__main__":
         if "--not_delete" in sys.argv:  # 解压完成后不删除压缩包
             print("--not_delete 解压完成后不删除压缩包")
             is_delete = False
-        main(is_debug=is_debug, is_delete=is_delete)
-    os.system("pause")
\ No newline at end of file
+        workers = _arg_value("--workers", 4)  # 并发下载连接数
+        chunk_size = _arg_value("--chunk_size", 64 * 1024)  # 每次读取写入的字节数
+        full = "--full" in sys.argv  # 不尝试增量更新，下载完整压缩包
+        ok = main(is_debug=is_debug, is_delete=is_delete, workers=workers, chunk_size=chunk_size, full=full,
+                  interactive=interactive, target_dir=target_dir, dll_path=dll_path, ttl=ttl)
+    if interactive:
+        os.system("pause")
+    sys.exit(0 if ok else 1)